@@ -0,0 +1,145 @@
+import argparse
+import logging
+
+from cwf2neo import CWF
+from cwf2neo.sinks import CypherScriptSink, JSONLinesSink
+
+
+def parse_args(args=None):
+    """Parse the command line arguments
+
+    :param args: arguments to parse, defaults to sys.argv
+    :type args: list, optional
+    :return: parsed arguments
+    :rtype: class 'argparse.Namespace'
+    """
+
+    parser = argparse.ArgumentParser(
+        prog='cwf2neo',
+        description='Download, parse and import the NICE Cybersecurity '
+        'Workforce Framework into a Neo4j graph database')
+
+    parser.add_argument('--host', default='localhost',
+                        help='Neo4j server hostname')
+    parser.add_argument('--port', type=int, default=7687,
+                        help='Neo4j bolt port')
+    parser.add_argument('--user', default='neo4j', help='Neo4j username')
+    parser.add_argument('--password', default='password',
+                        help='Neo4j password')
+    parser.add_argument('--target', action='append', dest='targets',
+                        metavar='HOST[:PORT][/DATABASE]',
+                        help='load this database, can be repeated to load '
+                        'several databases from a single parse')
+    parser.add_argument('--cache-dir',
+                        help='directory used to cache the data sources')
+    parser.add_argument('--incremental', action='store_true', default=None,
+                        help='only write what changed since the last import')
+    parser.add_argument('--prune', action='store_true', default=None,
+                        help='delete what was removed from the data sources '
+                        'when importing incrementally')
+    parser.add_argument('--fresh', action='store_true', default=None,
+                        help='CREATE everything without checking for existing '
+                        'nodes, the database must be empty')
+    parser.add_argument('--no-fresh', dest='fresh', action='store_false',
+                        help='MERGE everything even if the database is empty')
+    parser.add_argument('--no-model-cache', action='store_true',
+                        help='parse the data sources again even if the model '
+                        'parsed from them is cached')
+    parser.add_argument('--batch-size', type=int,
+                        help='number of rows sent to Neo4j per batch')
+    parser.add_argument('--adaptive-batch-size', action='store_true',
+                        default=None,
+                        help='adapt the batch size to the round trip latency')
+    parser.add_argument('--writers', type=int,
+                        help='number of batches written concurrently')
+    parser.add_argument('--parse-workers', type=int, metavar='N',
+                        help='parse the import stages in N worker processes')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='write the import stage metrics to FILE, in the '
+                        'Prometheus text format if it ends with .prom')
+    parser.add_argument('--export-csv', metavar='DIRECTORY',
+                        help='write CSV files for neo4j-admin import to '
+                        'DIRECTORY instead of importing into Neo4j')
+    parser.add_argument('--gzip', action='store_true',
+                        help='gzip the exported CSV files')
+    parser.add_argument('--export-cypher', metavar='FILE',
+                        help='write a Cypher script to FILE instead of '
+                        'importing into Neo4j')
+    parser.add_argument('--export-jsonl', metavar='FILE',
+                        help='write JSON lines to FILE instead of importing '
+                        'into Neo4j')
+    parser.add_argument('--export-snapshot', metavar='FILE',
+                        help='write a snapshot of the in-process graph to '
+                        'FILE instead of importing into Neo4j')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='verbose logging')
+
+    return parser.parse_args(args)
+
+
+def parse_target(target):
+    """Parse a target database given on the command line
+
+    :param target: 'HOST[:PORT][/DATABASE]'
+    :type target: str
+    :return: dict of target settings
+    :rtype: dict
+    """
+
+    address, _, database = target.partition('/')
+    host, _, port = address.partition(':')
+
+    settings = {'host': host}
+    if port:
+        settings['port'] = int(port)
+    if database:
+        settings['database'] = database
+    return settings
+
+
+def main(args=None):
+    args = parse_args(args)
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s\t%(message)s',
+                        level=logging.INFO if args.verbose else logging.WARN,
+                        datefmt='%Y-%m-%d %H:%M:%S')
+
+    cwf = CWF(
+        neo4j_host=args.host, neo4j_user=args.user,
+        neo4j_pass=args.password, neo4j_port=args.port,
+        cache_dir=args.cache_dir,
+        targets=[parse_target(target) for target in args.targets]
+        if args.targets else None)
+
+    if args.no_model_cache:
+        cwf.config['model_cache'].set(False)
+
+    bulk = cwf.config['bulk']
+    if args.batch_size is not None:
+        bulk['batch_size'].set(args.batch_size)
+    if args.adaptive_batch_size is not None:
+        bulk['adaptive_batch_size'].set(args.adaptive_batch_size)
+    if args.writers is not None:
+        bulk['writers'].set(args.writers)
+    if args.parse_workers is not None:
+        cwf.config['parse_workers'].set(args.parse_workers)
+
+    if args.metrics:
+        cwf.config['metrics_file'].set(args.metrics)
+
+    if args.export_csv:
+        cwf.export_csv(args.export_csv, compress=args.gzip)
+    elif args.export_cypher:
+        cwf.export(CypherScriptSink(
+            args.export_cypher, batch_size=bulk['batch_size'].get(int)))
+    elif args.export_jsonl:
+        cwf.export(JSONLinesSink(args.export_jsonl))
+    elif args.export_snapshot:
+        cwf.embedded_graph(snapshot=args.export_snapshot)
+    else:
+        cwf.initialize(incremental=args.incremental, prune=args.prune,
+                       fresh=args.fresh)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+log = logging.getLogger(__name__)
+
+
+class BatchSizer(object):
+    """Batch size for bulk writes, optionally adapting to the measured round
+    trip latency so each batch takes roughly `target_latency` seconds.
+    """
+
+    def __init__(self, batch_size=1000, adaptive=False, target_latency=0.5,
+                 min_size=100, max_size=20000):
+        """Constructor for initial setup
+
+        :param batch_size: initial batch size, defaults to 1000
+        :type batch_size: int, optional
+        :param adaptive: adapt the batch size to the measured latency,
+         defaults to False
+        :type adaptive: bool, optional
+        :param target_latency: seconds a batch should take when adaptive,
+         defaults to 0.5
+        :type target_latency: float, optional
+        :param min_size: smallest adaptive batch size, defaults to 100
+        :type min_size: int, optional
+        :param max_size: largest adaptive batch size, defaults to 20000
+        :type max_size: int, optional
+        """
+        self.size = batch_size
+        self.adaptive = adaptive
+        self.target_latency = target_latency
+        self.min_size = min_size
+        self.max_size = max_size
+        self.__lock = threading.Lock()
+
+    def record(self, rows, elapsed):
+        """Record the round trip latency of a batch
+
+        :param rows: number of rows in the batch
+        :type rows: int
+        :param elapsed: seconds the batch took to commit
+        :type elapsed: float
+        """
+
+        if not self.adaptive or rows < self.size or elapsed <= 0:
+            # Only full batches say anything about the right batch size
+            return
+
+        # Move halfway towards the size that would meet the target latency
+        ideal = rows * self.target_latency / elapsed
+        with self.__lock:
+            size = int((self.size + ideal) / 2)
+            self.size = max(self.min_size, min(self.max_size, size))
+
+        log.debug("Batch of {} rows took {:.3f}s, batch size now {}".format(
+            rows, elapsed, self.size))
+
+
+class WriterPool(object):
+    """Pool of writer threads sending independent batches concurrently. Each
+    `write_all` call returns only once every one of its batches committed, so
+    callers can order dependent writes one after another.
+    """
+
+    def __init__(self, writers=1, sizer=None, retries=5,
+                 retry_errors=(Exception,)):
+        """Constructor for initial setup
+
+        :param writers: number of batches written concurrently, defaults to 1
+        :type writers: int, optional
+        :param sizer: batch sizer, defaults to a fixed size of 1000
+        :type sizer: class 'cwf2neo.batching.BatchSizer', optional
+        :param retries: times a failed batch is retried, defaults to 5
+        :type retries: int, optional
+        :param retry_errors: exception types that cause a batch to be retried,
+         such as deadlocks, defaults to (Exception,)
+        :type retry_errors: tuple, optional
+        """
+        self.writers = writers
+        self.sizer = sizer or BatchSizer()
+        self.retries = retries
+        self.retry_errors = retry_errors
+        self.__executor = ThreadPoolExecutor(max_workers=writers)
+
+    def __write_batch(self, write, batch):
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                write(batch)
+            except self.retry_errors as err:
+                if attempt == self.retries:
+                    raise err
+                log.warning("Retrying batch of {} rows: {}".format(
+                    len(batch), err))
+                time.sleep(0.1 * 2 ** attempt)
+            else:
+                self.sizer.record(len(batch), time.perf_counter() - start)
+                return
+
+    def write_all(self, data, write):
+        """Split a stream of rows into batches and write them concurrently,
+        keeping at most two batches per writer in flight
+
+        :param data: rows to write
+        :type data: iterable
+        :param write: callable writing a single batch (list) of rows
+        :type write: callable
+        """
+
+        stream = iter(data)
+        pending = set()
+
+        try:
+            while True:
+                batch = list(islice(stream, self.sizer.size))
+                if not batch:
+                    break
+
+                pending.add(self.__executor.submit(
+                    self.__write_batch, write, batch))
+
+                if len(pending) >= self.writers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+
+            while pending:
+                pending.pop().result()
+        except BaseException:
+            # Nothing is still writing once the error is raised
+            for future in pending:
+                future.cancel()
+            wait(pending)
+            raise
+
+    def shutdown(self):
+        """Stop the writer threads once all pending batches are written
+        """
+
+        self.__executor.shutdown()
@@ -0,0 +1,524 @@
+"""Import benchmark using synthetic NIST/NICE workbooks
+
+Generates workbooks with the same sheet layouts as the real data sources at a
+multiple of their size, imports them into a sink and records how long each
+stage took, e.g.::
+
+    python -m cwf2neo.benchmark --scale 1 10 100 --output results.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import tempfile
+import time
+import zipfile
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+
+from cwf2neo.cwf2neo import CWF, NICE_Categories
+from cwf2neo.graph_objects import node_classes
+from cwf2neo.identity import IdentityMap
+from cwf2neo.sinks import MemorySink, Sink
+
+log = logging.getLogger(__name__)
+
+# Approximate size of the real data sources at scale 1
+BASE_COUNTS = {
+    'nist_categories': 23,
+    'nist_subcategories_per_category': 5,
+    'nist_references_per_subcategory': 5,
+    'specialty_areas': 33,
+    'workroles': 52,
+    'ksats': {'K': 630, 'S': 370, 'A': 180, 'T': 1000},
+    'ksats_per_workrole': 88,
+    'competencies': 53,
+    'competency_groups': 9,
+    'ksat_rows_per_competency': 62
+}
+
+NIST_Functions = [
+    ('IDENTIFY', 'ID'), ('PROTECT', 'PR'), ('DETECT', 'DE'),
+    ('RESPOND', 'RS'), ('RECOVER', 'RC')]
+
+# KSAT IDs have 4 digits, so the number of unique KSATs of each type can't
+# grow past this. Larger scales add more work roles referencing them instead.
+MAX_KSATS_PER_TYPE = 9999
+
+STAGES = ('parse', 'dedup', 'node_write', 'relationship_write', 'index')
+
+
+def column_name(index):
+    """Get the spreadsheet column name of a zero based column index
+
+    :param index: zero based column index
+    :type index: int
+    :return: column name, e.g. 'A' or 'AB'
+    :rtype: str
+    """
+
+    name = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(65 + remainder) + name
+    return name
+
+
+def write_xlsx(path, sheets):
+    """Write a minimal xlsx workbook of inline string cells
+
+    :param path: path of the workbook to write
+    :type path: str
+    :param sheets: list of (sheet name, list of rows) tuples
+    :type sheets: list
+    """
+
+    ns = 'http://schemas.openxmlformats.org/'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr(
+            '[Content_Types].xml',
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="{0}package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/'
+            'vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/'
+            'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"'
+            '/>{1}</Types>'.format(ns, ''.join(
+                '<Override PartName="/xl/worksheets/sheet{}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.'
+                'spreadsheetml.worksheet+xml"/>'.format(i + 1)
+                for i in range(len(sheets)))))
+        z.writestr(
+            '_rels/.rels',
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="{0}package/2006/relationships">'
+            '<Relationship Id="rId1" Type="{0}officeDocument/2006/'
+            'relationships/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'.format(ns))
+        z.writestr(
+            'xl/workbook.xml',
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<workbook xmlns="{0}spreadsheetml/2006/main" '
+            'xmlns:r="{0}officeDocument/2006/relationships"><sheets>{1}'
+            '</sheets></workbook>'.format(ns, ''.join(
+                '<sheet name="{}" sheetId="{}" r:id="rId{}"/>'.format(
+                    escape(name), i + 1, i + 1)
+                for i, (name, _) in enumerate(sheets))))
+        z.writestr(
+            'xl/_rels/workbook.xml.rels',
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="{0}package/2006/relationships">{1}'
+            '</Relationships>'.format(ns, ''.join(
+                '<Relationship Id="rId{0}" Type="{1}officeDocument/2006/'
+                'relationships/worksheet" Target="worksheets/sheet{0}.xml"/>'
+                .format(i + 1, ns) for i in range(len(sheets)))))
+
+        for i, (_, rows) in enumerate(sheets):
+            xml = [
+                '<?xml version="1.0" encoding="UTF-8"?><worksheet '
+                'xmlns="{}spreadsheetml/2006/main"><sheetData>'.format(ns)]
+            for rowx, row in enumerate(rows, 1):
+                xml.append('<row r="{}">'.format(rowx))
+                for colx, value in enumerate(row):
+                    if value is None or value == '':
+                        continue
+                    xml.append(
+                        '<c r="{}{}" t="inlineStr"><is><t>{}</t></is></c>'
+                        .format(column_name(colx), rowx, escape(str(value))))
+                xml.append('</row>')
+            xml.append('</sheetData></worksheet>')
+            z.writestr(
+                'xl/worksheets/sheet{}.xml'.format(i + 1), ''.join(xml))
+
+
+def letter_codes(count, length):
+    """Get unique upper case codes, e.g. 'AA', 'AB', ...
+
+    :param count: number of codes
+    :type count: int
+    :param length: letters per code
+    :type length: int
+    :return: list of codes
+    :rtype: list
+    """
+
+    codes = []
+    for n in range(count):
+        code = ''
+        for _ in range(length):
+            n, remainder = divmod(n, 26)
+            code = chr(65 + remainder) + code
+        codes.append(code)
+    return codes
+
+
+def scaled(count, scale):
+    return max(1, int(round(count * scale)))
+
+
+def nist_cf_sheet(scale, rng):
+    rows = [
+        ['Framework Core'],
+        ['Function', 'Category', 'Subcategory', 'Informative References']]
+
+    categories = scaled(BASE_COUNTS['nist_categories'], scale)
+    category_codes = letter_codes(categories, 2)
+
+    previous_function = None
+    for c in range(categories):
+        function_title, function_id = NIST_Functions[
+            c * len(NIST_Functions) // categories]
+        category_id = '{}.{}'.format(function_id, category_codes[c])
+        function = '{} ({})'.format(function_title, function_id) \
+            if function_id != previous_function else ''
+        previous_function = function_id
+        category = 'Synthetic Category {} ({}): Outcome of {}'.format(
+            category_codes[c], category_id, category_id)
+
+        for s in range(BASE_COUNTS['nist_subcategories_per_category']):
+            subcategory = '{}-{}: Synthetic outcome {}'.format(
+                category_id, s + 1, s + 1)
+            for _ in range(rng.randint(
+                    1, BASE_COUNTS['nist_references_per_subcategory'])):
+                rows.append([
+                    function, category, subcategory,
+                    'Synthetic Reference {}'.format(rng.randint(1, 500))])
+                function = category = subcategory = ''
+
+    return [('Sheet1', rows)]
+
+
+def ksat_ids(scale):
+    ids = []
+    for prefix, count in BASE_COUNTS['ksats'].items():
+        count = min(scaled(count, scale), MAX_KSATS_PER_TYPE)
+        ids.extend('{}{:04d}'.format(prefix, n + 1) for n in range(count))
+    return ids
+
+
+def nice_cwf_sheets(scale, rng, ksats):
+    categories = [category['id'] for category in NICE_Categories]
+    specialty_areas = letter_codes(
+        scaled(BASE_COUNTS['specialty_areas'], scale), 3)
+    workroles = scaled(BASE_COUNTS['workroles'], scale)
+
+    toc = [
+        ['NICE Cybersecurity Workforce Framework Work Roles'],
+        ['NICE Specialty Area', 'NICE Specialty Area Description',
+         'Work Role', 'Work Role ID', 'Work Role Description',
+         'OPM Code (Fed Use)']]
+    sheets = []
+
+    category = None
+    for w in range(workroles):
+        specialty_area = specialty_areas[w % len(specialty_areas)]
+        category_id = categories[
+            specialty_areas.index(specialty_area) % len(categories)]
+        workrole_id = '{}-{}-{:03d}'.format(
+            category_id, specialty_area, w // len(specialty_areas) + 1)
+
+        if category != category_id:
+            category = category_id
+            toc.append(['Category ({})'.format(category_id)])
+
+        if w < len(specialty_areas):
+            specialty_area_columns = [
+                'Synthetic Specialty Area ({})'.format(specialty_area),
+                'Specialty area {}'.format(specialty_area)]
+        else:
+            specialty_area_columns = ['', '']
+
+        toc.append(specialty_area_columns + [
+            'Synthetic Work Role {}'.format(workrole_id), workrole_id,
+            'Performs work role {}'.format(workrole_id),
+            str(rng.randint(100, 999))])
+
+        rows = [
+            ['Work Role Name', 'Synthetic Work Role {}'.format(workrole_id)],
+            ['KSA ID', 'Description']]
+        rows.extend(
+            [ksat, 'Synthetic description of {}'.format(ksat)]
+            for ksat in rng.sample(
+                ksats, min(len(ksats), BASE_COUNTS['ksats_per_workrole'])))
+        sheets.append((workrole_id, rows))
+
+    return [('Table of Contents', toc)] + sheets
+
+
+def nice_competency_sheets(scale, rng, ksats):
+    competencies = scaled(BASE_COUNTS['competencies'], scale)
+    groups = ['Synthetic Group {}'.format(g) for g in range(
+        BASE_COUNTS['competency_groups'])]
+
+    mapping = [
+        ['KSA ID', 'Competency Grouping', 'Competency ID', 'Competency']]
+    descriptions = [['Competency ID', 'Description']]
+
+    for c in range(competencies):
+        competency_id = 'C{:03d}'.format(c + 1)
+        group = groups[c % len(groups)]
+        for _ in range(BASE_COUNTS['ksat_rows_per_competency']):
+            mapping.append([
+                ', '.join(rng.sample(ksats, rng.randint(1, 3))),
+                group, competency_id,
+                'Synthetic Competency {}'.format(competency_id)])
+        descriptions.append([
+            competency_id, 'Description of {}'.format(competency_id)])
+
+    return [
+        ('KSAs mapped to Competency', mapping),
+        ('Competency Descriptions', descriptions)]
+
+
+def generate_workbooks(directory, filenames, scale=1, seed=0):
+    """Write synthetic NIST/NICE workbooks
+
+    :param directory: directory to write the workbooks to
+    :type directory: str
+    :param filenames: dict with the local filename of the 'cf', 'cwf' and
+     'competencies' data sources
+    :type filenames: dict
+    :param scale: size relative to the real data sources, defaults to 1
+    :type scale: float, optional
+    :param seed: random seed, defaults to 0
+    :type seed: int, optional
+    """
+
+    rng = random.Random(seed)
+    ksats = ksat_ids(scale)
+
+    os.makedirs(directory, exist_ok=True)
+
+    write_xlsx(
+        os.path.join(directory, filenames['cf']), nist_cf_sheet(scale, rng))
+    write_xlsx(
+        os.path.join(directory, filenames['cwf']),
+        nice_cwf_sheets(scale, rng, ksats))
+    write_xlsx(
+        os.path.join(directory, filenames['competencies']),
+        nice_competency_sheets(scale, rng, ksats))
+
+
+class TimedIdentityMap(IdentityMap):
+    """Identity map recording the time spent removing duplicates"""
+
+    def __init__(self, timings, previous=None):
+        super().__init__(previous)
+        self.timings = timings
+
+    def unique_nodes(self, nodes):
+        start = time.perf_counter()
+        nodes = super().unique_nodes(nodes)
+        self.timings['dedup'] += time.perf_counter() - start
+        return nodes
+
+    def unique_relationships(self, relationships):
+        start = time.perf_counter()
+        relationships = super().unique_relationships(relationships)
+        self.timings['dedup'] += time.perf_counter() - start
+        return relationships
+
+
+class TimedSink(Sink):
+    """Sink recording the time spent writing to another sink"""
+
+    def __init__(self, sink, timings):
+        self.sink = sink
+        self.timings = timings
+        self.nodes = 0
+        self.relationships = 0
+
+    def __timed(self, stage, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self.timings[stage] += time.perf_counter() - start
+
+    def create_schema(self, node_classes):
+        return self.__timed('index', self.sink.create_schema, node_classes)
+
+    def add_nodes(self, nodes):
+        nodes = list(nodes)
+        self.nodes += len(nodes)
+        return self.__timed('node_write', self.sink.add_nodes, nodes)
+
+    def add_relationships(self, relationships):
+        relationships = list(relationships)
+        self.relationships += len(relationships)
+        return self.__timed(
+            'relationship_write', self.sink.add_relationships, relationships)
+
+    def bulk_set(self, node_key, data):
+        return self.__timed(
+            'node_write', self.sink.bulk_set, node_key, list(data))
+
+    def close(self):
+        return self.sink.close()
+
+    def __getattr__(self, name):
+        return getattr(self.sink, name)
+
+
+def run(cwf, sink, name):
+    """Import the workbooks in the CWF data directory into a sink and time
+    each stage
+
+    :param cwf: CWF instance with the synthetic workbooks in its data
+     directory
+    :type cwf: class 'cwf2neo.CWF'
+    :param sink: sink to import into
+    :type sink: class 'cwf2neo.sinks.Sink'
+    :param name: name of the sink in the results
+    :type name: str
+    :return: benchmark results
+    :rtype: dict
+    """
+
+    timings = OrderedDict((stage, 0.0) for stage in STAGES)
+
+    cwf.identity_map = TimedIdentityMap(timings)
+    cwf.db = TimedSink(sink, timings)
+
+    start = time.perf_counter()
+
+    cwf.db.create_schema(node_classes())
+
+    import_start = time.perf_counter()
+    cwf.import_NIST_Cybersecurity_Framework()
+    cwf.import_NICE_CWF()
+    cwf.import_NICE_Competencies()
+    import_time = time.perf_counter() - import_start
+
+    if hasattr(sink, 'graph'):
+        index_start = time.perf_counter()
+        cwf.create_db_KSAT_index()
+        timings['index'] += time.perf_counter() - index_start
+
+    cwf.workbooks.close()
+    sink.close()
+
+    # Parsing is interleaved with the writes, so it gets the remaining time
+    timings['parse'] = import_time - sum(
+        timings[stage] for stage in ('dedup', 'node_write',
+                                     'relationship_write'))
+
+    return OrderedDict([
+        ('sink', name),
+        ('nodes', cwf.db.nodes),
+        ('relationships', cwf.db.relationships),
+        ('eliminated_nodes', cwf.identity_map.eliminated_nodes),
+        ('eliminated_relationships',
+         cwf.identity_map.eliminated_relationships),
+        ('stages', timings),
+        ('total', time.perf_counter() - start)
+    ])
+
+
+def benchmark(scales=(1,), neo4j=None, seed=0, directory=None):
+    """Run the benchmark at each scale against the in-memory sink and,
+    optionally, a Neo4j database
+
+    :param scales: sizes relative to the real data sources, defaults to (1,)
+    :type scales: iterable, optional
+    :param neo4j: dict of CWF Neo4j connection arguments, defaults to None
+     to skip the Neo4j benchmark
+    :type neo4j: dict, optional
+    :param seed: random seed of the synthetic workbooks, defaults to 0
+    :type seed: int, optional
+    :param directory: directory to generate the workbooks in, defaults to a
+     temporary directory
+    :type directory: str, optional
+    :return: benchmark results
+    :rtype: dict
+    """
+
+    results = OrderedDict([
+        ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%S%z')),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('seed', seed),
+        ('runs', [])
+    ])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            data_dir = os.path.join(directory or tmp, 'scale_{}'.format(scale))
+            cwf = CWF(cache_dir=data_dir, **(neo4j or {}))
+            sources = cwf.config['data_sources']
+
+            generate_start = time.perf_counter()
+            generate_workbooks(data_dir, {
+                'cf': sources['NIST']['cf']['local_filename'].get(),
+                'cwf': sources['NICE']['cwf']['local_filename'].get(),
+                'competencies':
+                    sources['NICE']['competencies']['local_filename'].get()
+            }, scale=scale, seed=seed)
+            generate_time = time.perf_counter() - generate_start
+
+            sinks = ['memory']
+            if neo4j is not None:
+                sinks.append('neo4j')
+
+            for name in sinks:
+                if name == 'neo4j':
+                    cwf.setup_neo4j_connection()
+                    sink = cwf.db
+                else:
+                    sink = MemorySink()
+                log.info("Benchmarking scale %s against %s", scale, name)
+                result = run(cwf, sink, name)
+                result['scale'] = scale
+                result['generate'] = generate_time
+                results['runs'].append(result)
+
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m cwf2neo.benchmark',
+        description='Benchmark importing synthetic NIST/NICE workbooks')
+    parser.add_argument('--scale', type=float, nargs='+', default=[1],
+                        help='sizes relative to the real data sources')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed of the synthetic workbooks')
+    parser.add_argument('--neo4j', action='store_true',
+                        help='also benchmark importing into Neo4j')
+    parser.add_argument('--host', default='localhost',
+                        help='Neo4j server hostname')
+    parser.add_argument('--port', type=int, default=7687,
+                        help='Neo4j bolt port')
+    parser.add_argument('--user', default='neo4j', help='Neo4j username')
+    parser.add_argument('--password', default='password',
+                        help='Neo4j password')
+    parser.add_argument('--directory',
+                        help='directory to generate the workbooks in')
+    parser.add_argument('--output', help='write the results to a JSON file')
+    args = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.WARN)
+
+    neo4j = None
+    if args.neo4j:
+        neo4j = {
+            'neo4j_host': args.host, 'neo4j_port': args.port,
+            'neo4j_user': args.user, 'neo4j_pass': args.password}
+
+    results = benchmark(
+        [int(scale) if scale.is_integer() else scale for scale in args.scale],
+        neo4j=neo4j, seed=args.seed, directory=args.directory)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
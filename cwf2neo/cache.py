@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+METADATA_FILENAME = 'sources.json'
+
+
+def default_cache_directory():
+    """Get the default persistent cache directory, honouring XDG_CACHE_HOME
+
+    :return: absolute path to the default cache directory
+    :rtype: str
+    """
+
+    cache_home = os.getenv(
+        'XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'cwf2neo')
+
+
+def default_file_mode():
+    """Get the mode new files are created with under the current umask.
+    Reading the umask briefly changes it for the whole process, so call this
+    before starting any threads.
+
+    :return: file mode, e.g. 0o644 with a umask of 0o022
+    :rtype: int
+    """
+
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+class SourceCache(object):
+    """Persistent on-disk cache of downloaded data sources, keyed by URL.
+
+    Cached files are revalidated with the ETag and Last-Modified headers the
+    server sent with them, so a warm cache only transfers files that changed.
+    Downloads are written to a temporary file and atomically moved into place.
+    """
+
+    def __init__(self, cache_dir=None, timeout=60):
+        """Constructor for initial setup
+
+        :param cache_dir: directory to store the cached files in, defaults to
+         the user cache directory
+        :type cache_dir: str, optional
+        :param timeout: socket timeout in seconds, defaults to 60
+        :type timeout: int, optional
+        """
+        self.cache_dir = cache_dir or default_cache_directory()
+        self.timeout = timeout
+        self.__lock = threading.Lock()
+        # Read once, fetch_all downloads in several threads
+        self.file_mode = default_file_mode()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.__metadata = self.__load_metadata()
+
+    def __metadata_path(self):
+        return os.path.join(self.cache_dir, METADATA_FILENAME)
+
+    def __load_metadata(self):
+        try:
+            with open(self.__metadata_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def __replace(self, temp_path, path):
+        # Temporary files are only readable by their owner
+        os.chmod(temp_path, self.file_mode)
+        os.replace(temp_path, path)
+
+    def __save_metadata(self):
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.__metadata, f, indent=2, sort_keys=True)
+            self.__replace(temp_path, self.__metadata_path())
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def fetch(self, source_url, local_filename):
+        """Download a data source into the cache unless the cached copy is
+        still current
+
+        :param source_url: URL of the data source
+        :type source_url: str
+        :param local_filename: filename to store the data source as
+        :type local_filename: str
+        :return: tuple of (absolute path to the cached file, True if the file
+         was transferred)
+        :rtype: tuple
+        """
+
+        path = os.path.join(self.cache_dir, local_filename)
+        request = urllib.request.Request(source_url)
+
+        with self.__lock:
+            cached = self.__metadata.get(source_url)
+
+        if cached and cached['local_filename'] == local_filename \
+                and os.path.exists(path):
+            if cached.get('etag'):
+                request.add_header('If-None-Match', cached['etag'])
+            if cached.get('last_modified'):
+                request.add_header(
+                    'If-Modified-Since', cached['last_modified'])
+
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as err:
+            if err.code == 304:
+                log.info("Using cached copy of {}".format(source_url))
+                return path, False
+            raise err
+
+        with response:
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    shutil.copyfileobj(response, f)
+                self.__replace(temp_path, path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+
+            log.info("Downloaded {}".format(source_url))
+
+            with self.__lock:
+                self.__metadata[source_url] = {
+                    'local_filename': local_filename,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }
+                self.__save_metadata()
+
+        return path, True
+
+    def fetch_all(self, sources, max_workers=4):
+        """Concurrently fetch a list of data sources
+
+        :param sources: list of dicts containing ('source_url',
+         'local_filename')
+        :type sources: list
+        :param max_workers: maximum number of concurrent downloads,
+         defaults to 4
+        :type max_workers: int, optional
+        :return: list of (path, transferred) tuples in the order of `sources`
+        :rtype: list
+        """
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self.fetch, source['source_url'], source['local_filename'])
+                for source in sources]
+            return [future.result() for future in futures]
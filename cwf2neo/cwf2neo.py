@@ -1,18 +1,35 @@
 import logging
 import os
-import re
-import shutil
-import tempfile
+from collections import OrderedDict, namedtuple
+from functools import partial
 
 import confuse
-import xlrd
-from cwf2neo.graph_objects import (KSAT, NICECategory, NICECompetency,
-                                   NICECompetencyGroup, NICESpecialtyArea,
-                                   NICEWorkrole, NISTCategory, NISTFunction,
-                                   NISTReference, NISTSubCategory)
-from cwf2neo.neo4j import Neo4j
-from cwf2neo.utils import (file_download, list2dict,
-                           parse_ksats, ksat_id_to_type)
+from cwf2neo.graph_objects import (KSATRecord, NICECategoryRecord,
+                                   NICECompetencyGroupRecord,
+                                   NICECompetencyRecord,
+                                   NICESpecialtyAreaRecord,
+                                   NICEWorkroleRecord, NISTCategoryRecord,
+                                   NISTFunctionRecord, NISTReferenceRecord,
+                                   NISTSubCategoryRecord, Relationship,
+                                   node_classes)
+from cwf2neo.cache import SourceCache
+from cwf2neo.embedded import EmbeddedGraph
+from cwf2neo.export import CSVExporter
+from cwf2neo.identity import IdentityMap
+from cwf2neo.metrics import Metrics
+from cwf2neo.model import ModelCache
+from cwf2neo.neo4j import Neo4j, node_key, target_name
+from cwf2neo.pipeline import BatchWriter
+from cwf2neo.queries import FrameworkQueries
+from cwf2neo.scheduler import StageScheduler
+from cwf2neo.sinks import FanoutSink
+from cwf2neo.state import ImportState, file_fingerprint
+from cwf2neo.workbooks import WorkbookRegistry
+from cwf2neo.parsing import (NIST_CATEGORY_PATTERN, NIST_FUNCTION_PATTERN,
+                             NIST_SUBCATEGORY_PATTERN, SPECIALTY_AREA_PATTERN,
+                             WORKROLE_ID_PATTERN, WORKROLE_SHEET_PATTERN,
+                             find_ksats, parse_ksat_sheet)
+from progress import Infinite
 from progress.bar import IncrementalBar
 from progress.counter import Counter
 
@@ -82,6 +99,110 @@ NICE_Category_map = {
     'IN': ['DE', 'RS', 'RC']
 }
 
+# Records parsed by a worker process, and the number of rows they came from
+ParsedStage = namedtuple('ParsedStage', ['records', 'rows'])
+
+
+def quiet_progress():
+    """Hide the progress bars of a worker process, they would be drawn over
+    the progress bars of the parent process
+    """
+
+    Infinite.file = open(os.devnull, 'w')
+
+
+def parse_stage(settings, method, *args):
+    """Parse an import stage in a worker process
+
+    :param settings: dict with the 'cache_dir' and 'config' of the parent
+    :type settings: dict
+    :param method: name of the CWF method parsing the stage
+    :type method: str
+    :return: the parsed records
+    :rtype: class 'cwf2neo.cwf2neo.ParsedStage'
+    """
+
+    cwf = CWF(cache_dir=settings['cache_dir'])
+    cwf.config.set(settings['config'])
+    cwf.workbooks = WorkbookRegistry(
+        cwf.data_dir, reader=cwf.config['workbook_reader'].get(str))
+
+    try:
+        records = list(getattr(cwf, method)(*args))
+    finally:
+        cwf.workbooks.close()
+
+    return ParsedStage(
+        records, sum(stage.rows for stage in cwf.metrics.stages.values()))
+
+
+def parse_ksat_shard(settings, workbook_name, sheet_names):
+    """Parse a shard of the work role KSAT sheets in a worker process
+
+    :param settings: dict with the 'cache_dir' and 'config' of the parent
+    :type settings: dict
+    :param workbook_name: filename of the NICE CWF spreadsheet
+    :type workbook_name: str
+    :param sheet_names: names of the work role sheets to parse
+    :type sheet_names: list
+    :return: list of (work role ID, list of (KSAT ID, KSAT type,
+     description) tuples) for each sheet, and the number of KSAT rows
+    :rtype: class 'cwf2neo.cwf2neo.ParsedStage'
+    """
+
+    workbooks = WorkbookRegistry(
+        settings['cache_dir'], reader=settings['config']['workbook_reader'])
+
+    sheets = []
+    rows = 0
+    try:
+        for sheet_name in sheet_names:
+            ksats = parse_ksat_sheet(
+                list(workbooks.values(workbook_name, sheet_name)))
+            workbooks.release(workbook_name, sheet_name)
+
+            sheets.append((WORKROLE_ID_PATTERN.match(sheet_name)[0], ksats))
+            rows += len(ksats)
+    finally:
+        workbooks.close()
+
+    return ParsedStage(sheets, rows)
+
+
+def merge_ksat_shards(shards):
+    """Merge the parsed shards of the work role KSAT sheets into KSAT records
+    and their relationships with the work roles, dropping the duplicates of
+    KSATs shared by several work roles
+
+    :param shards: parsed shards, in the order of the sheets
+    :type shards: list
+    :return: the KSAT records and relationships
+    :rtype: class 'cwf2neo.cwf2neo.ParsedStage'
+    """
+
+    seen = set()
+    records = []
+
+    for shard in shards:
+        for workrole_id, ksats in shard.records:
+            workrole_node = NICEWorkroleRecord.ref(workrole_id)
+
+            for ksat in ksats:
+                ksat_node = KSATRecord(
+                    id=ksat[0], type=ksat[1], description=ksat[2],
+                    labels=(ksat[1],))
+
+                if ksat not in seen:
+                    seen.add(ksat)
+                    records.append(ksat_node)
+
+                if (ksat[0], workrole_id) not in seen:
+                    seen.add((ksat[0], workrole_id))
+                    records.append(Relationship(
+                        ksat_node, 'NICE_WORKROLE', workrole_node))
+
+    return ParsedStage(records, sum(shard.rows for shard in shards))
+
 
 class CWF(object):
     """Main class used to parse the NICE cybersecurity Workforce Framework (CWF)
@@ -90,7 +211,8 @@ class CWF(object):
 
     def __init__(
         self, neo4j_host='localhost', neo4j_user='neo4j',
-            neo4j_pass='password', neo4j_port=7687):
+            neo4j_pass='password', neo4j_port=7687, cache_dir=None,
+            targets=None):
         """Constructor for initial setup
 
         :param neo4j_host: Neo4j server hostname, defaults to 'localhost'
@@ -101,84 +223,415 @@ class CWF(object):
         :type neo4j_pass: str, optional
         :param neo4j_port: Neo4j port to connect to, defaults to 7687
         :type neo4j_port: int, optional
+        :param cache_dir: directory used to cache the downloaded data sources,
+         defaults to the 'cache_dir' config setting or the user cache directory
+        :type cache_dir: str, optional
+        :param targets: databases to load concurrently from a single parse,
+         as dicts of 'host', 'port', 'user', 'pass' and 'database' settings.
+         Missing settings default to the settings above. Defaults to the
+         'targets' config setting, or only the database above if empty.
+        :type targets: list, optional
         """
-        self.temp_dir = self.__create_temp_directory()
         self.db = None
+        self.query_api = None
+        self.identity_map = IdentityMap()
+        self.metrics = Metrics()
+        self.model = None
         self.config = confuse.LazyConfig('cwf2neo', __name__)
         self.neo4j_host = os.getenv('NEO4J_HOST', neo4j_host)
         self.neo4j_user = os.getenv('NEO4J_USER', neo4j_user)
         self.neo4j_pass = os.getenv('NEO4J_PASS', neo4j_pass)
         self.neo4j_port = os.getenv('NEO4J_BOLT_PORT', neo4j_port)
         self.neo4j_secure = os.getenv('NEO4J_SECURE', 'False').lower() in ('true', '1')
-
-    def __del__(self):
-        """Destructor for cleanup
-        """
-
-        self.__cleanup_temp_directory()
-
-    def __create_temp_directory(self):
-        """Private function used to create a temporary directory
-
-        :return: absolute path to the temporary directory
-        :rtype: str
+        self.targets = targets if targets is not None \
+            else self.config['targets'].get(list)
+        self.source_cache = SourceCache(
+            os.getenv('CWF2NEO_CACHE_DIR', cache_dir)
+            or self.config['cache_dir'].get())
+        self.data_dir = self.source_cache.cache_dir
+        self.model_cache = ModelCache(os.path.join(self.data_dir, 'model'))
+        self.workbooks = WorkbookRegistry(
+            self.data_dir, reader=self.config['workbook_reader'].get(str))
+        log.info("Using cache directory: %s", self.data_dir)
+
+    @property
+    def temp_dir(self):
+        """Directory the data sources are stored in, kept for backwards
+        compatibility now that the data sources are cached persistently
         """
 
-        self.temp_dir = tempfile.mkdtemp()
-        log.info("Using temp directory: %s", self.temp_dir)
-        return self.temp_dir
+        return self.data_dir
 
-    def __cleanup_temp_directory(self):
-        """Private function used to recursively remove the temporary directory
-        """
-
-        log.info("Cleaning up. Removing temp directory: %s", self.temp_dir)
-        shutil.rmtree(self.temp_dir)
-
-    def __download_source(self, source):
-        """Private function used to recursively download data sources
-         and store them in the temporary directory
+    def __find_sources(self, source):
+        """Private function used to recursively find the data sources in
+         the configuration
 
         :param source: dict containing ('source_url', 'local_filename'),
          or dict of dicts.
         :type source: dict
+        :return: generator of dicts containing ('source_url', 'local_filename')
+        :rtype: generator
         """
 
         if isinstance(source, dict):
             if set(['source_url', 'local_filename']).issubset(source.keys()):
-                # Valid source, download the file
-                log.info("Downloading {}".format(source['source_url']))
-                file_download(
-                    source['source_url'],
-                    self.temp_dir,
-                    source['local_filename'])
+                # Valid source
+                yield source
             else:
                 # Not a valid source yet, use recursion to find the next
                 # valid source
                 for next_source in source.items():
-                    self.__download_source(next_source[1])
+                    yield from self.__find_sources(next_source[1])
+
+    def __add_nodes(self, nodes):
+        """Private function used to send nodes to the database, skipping any
+        duplicates already sent during this run
+
+        :param nodes: node records of the same type
+        :type nodes: list
+        """
+
+        self.db.add_nodes(self.identity_map.unique_nodes(nodes))
+
+    def __add_relationships(self, relationships):
+        """Private function used to send relationships to the database,
+        skipping any duplicates already sent during this run
 
-    def initialize(self):
+        :param relationships: relationships between node records
+        :type relationships: list
+        """
+
+        self.db.add_relationships(
+            self.identity_map.unique_relationships(relationships))
+
+    def __source_fingerprints(self):
+        """Private function used to fingerprint the downloaded data sources
+
+        :return: dict of local filename to file fingerprint
+        :rtype: dict
+        """
+
+        return {
+            source['local_filename']: file_fingerprint(
+                os.path.join(self.data_dir, source['local_filename']))
+            for source in self.__find_sources(
+                self.config['data_sources'].get())}
+
+    def __prune_removed(self):
+        """Private function used to delete the nodes and relationships
+        written by the previous import that no longer exist in the data
+        sources
+        """
+
+        node_keys = {
+            node_class.__primarylabel__: (
+                node_class.__primarylabel__, node_class.__primarykey__)
+            for node_class in node_classes()}
+
+        relationships = {}
+        for start, rel_type, end in self.identity_map.removed_relationships():
+            relationships.setdefault(
+                (rel_type, start[0], end[0]), []).append((start[1], end[1]))
+
+        for (rel_type, start_label, end_label), data in relationships.items():
+            self.db.delete_relationships(
+                rel_type, node_keys[start_label], node_keys[end_label], data)
+
+        nodes = {}
+        for label, value in self.identity_map.removed_nodes():
+            nodes.setdefault(label, []).append(value)
+
+        for label, values in nodes.items():
+            self.db.delete_nodes(node_keys[label], values)
+
+    def initialize(self, incremental=None, prune=None, fresh=None):
         """Initialize the NICE CWF Neo4j Database
+
+        :param incremental: only write the nodes and relationships that
+         changed since the last import into the same database, defaults to
+         the 'incremental' config setting
+        :type incremental: bool, optional
+        :param prune: when importing incrementally, delete nodes and
+         relationships that were removed from the data sources, defaults to
+         the 'prune' config setting
+        :type prune: bool, optional
+        :param fresh: CREATE nodes and relationships instead of merging them,
+         True if the database is known to be empty, None to check if it is,
+         False to always merge. Ignored when importing incrementally.
+         Defaults to the 'fresh' config setting.
+        :type fresh: bool, optional
         """
 
+        if incremental is None:
+            incremental = self.config['incremental'].get(bool)
+        if prune is None:
+            prune = self.config['prune'].get(bool)
+        if fresh is None:
+            fresh = self.config['fresh'].get()
+
         # Setup Neo4j Connection
         self.setup_neo4j_connection()
 
+        # Create the constraints and indexes used by the bulk imports
+        self.create_db_schema()
+
+        # Download the official sources of data from NIST/NICE
+        with self.metrics.stage('download'):
+            self.download_data_sources()
+
+        # Compare the data sources with the last import into each database
+        states = OrderedDict(
+            (name, ImportState.for_target(
+                os.path.join(self.data_dir, 'state'), name))
+            for name in self.target_names())
+        sources = self.__source_fingerprints()
+
+        # A single write to every target can only be incremental if the
+        # last import left every target in the same state
+        state = next(iter(states.values()))
+        incremental = incremental and all(
+            other.exists and other.sources == state.sources
+            and other.nodes == state.nodes
+            and other.relationships == state.relationships
+            for other in states.values())
+
+        if incremental and state.sources == sources:
+            log.info("Data sources unchanged since the last import")
+            return
+
+        # Start with an identity map for this run, seeded with everything the
+        # last import already wrote when importing incrementally
+        self.identity_map = IdentityMap(state if incremental else None)
+
+        # Incremental imports update existing nodes, they always merge
+        self.db.set_fresh(False if incremental else fresh)
+
+        # Import the Cybersecurity Framework, Cybersecurity Workforce
+        # Framework and KSA Competencies
+        self.import_sources(sources)
+
+        # Remove everything that is no longer in the data sources
+        if incremental and prune:
+            with self.metrics.stage('prune'):
+                self.__prune_removed()
+
+        # Create an index for fulltext searches across all KSATs
+        self.create_db_KSAT_index()
+
+        self.identity_map.report()
+
+        self.report_metrics()
+
+        if isinstance(self.db, FanoutSink):
+            self.db.report()
+
+        self.workbooks.close()
+
+        # Store the fingerprints for the next incremental import into every
+        # target that was fully loaded
+        for name in self.target_names():
+            states[name].sources = sources
+            self.identity_map.update_state(states[name])
+            states[name].save()
+
+        # Cached query results are stale now
+        self.db.import_completed()
+
+    def import_sources(self, sources):
+        """Import every data source. When the model parsed from the same data
+        sources is cached it is replayed instead of parsing the workbooks
+        again, otherwise the parsed model is cached for the next run.
+
+        :param sources: dict of local filename to file fingerprint
+        :type sources: dict
+        """
+
+        use_cache = self.config['model_cache'].get(bool)
+
+        model = self.model_cache.load(sources) if use_cache else None
+        if model is not None:
+            with model:
+                self.__replay(model)
+            return
+
+        # Recorded into the cache directory while the stages are written
+        self.model = self.model_cache.create() if use_cache else None
+        try:
+            # Import the Cybersecurity Framework, Cybersecurity Workforce
+            # Framework and KSA Competencies
+            self.__import_stages().run()
+
+            if self.model is not None:
+                self.model_cache.save(sources, self.model)
+                self.model = None
+        finally:
+            if self.model is not None:
+                self.model_cache.discard(self.model)
+            self.model = None
+
+    def __import_stages(self):
+        """Private function used to declare the import stages and the stages
+        each one has to be written after: nodes have to exist before the
+        relationships ending at them are written
+
+        :return: scheduler of the import stages
+        :rtype: class 'cwf2neo.scheduler.StageScheduler'
+        """
+
+        processes = self.config['parse_workers'].get(int)
+        scheduler = StageScheduler(
+            processes=processes, initializer=quiet_progress)
+
+        workbook_name = os.path.basename(
+            self.config['data_sources']['NICE']['cwf']['local_filename'].get())
+        settings = {
+            'cache_dir': self.data_dir,
+            'config': self.config.flatten()
+        }
+
+        stages = [
+            ('NIST_Cybersecurity_Framework',
+             'parse_NIST_Cybersecurity_Framework', (), ()),
+            ('NICE_Categories', 'parse_NICE_Categories', (),
+             ('NIST_Cybersecurity_Framework',)),
+            ('NICE_Workroles', 'parse_NICE_Workroles', (workbook_name,),
+             ('NICE_Categories',)),
+            ('NICE_KSAT', 'parse_NICE_KSAT', (workbook_name,),
+             ('NICE_Workroles',)),
+            ('NICE_Competencies', 'parse_NICE_Competencies', (),
+             ('NICE_KSAT',)),
+            ('NICE_Competency_descriptions',
+             'parse_NICE_Competency_descriptions', (), ('NICE_Competencies',))
+        ]
+
+        for name, method, args, depends in stages:
+            if processes > 0 and name == 'NICE_KSAT':
+                # Split the work role sheets across the worker processes
+                scheduler.add(
+                    name, partial(self.__write_stage, name),
+                    parse=parse_ksat_shard,
+                    shards=[
+                        (settings, workbook_name, sheet_names)
+                        for sheet_names in self.ksat_shards(
+                            workbook_name, processes * 4)],
+                    merge=merge_ksat_shards, depends=depends)
+            elif processes > 0:
+                scheduler.add(
+                    name, partial(self.__write_stage, name), parse=parse_stage,
+                    args=(settings, method) + args, depends=depends)
+            else:
+                scheduler.add(
+                    name, partial(self.__write_stage, name),
+                    parse=getattr(self, method), args=args, depends=depends)
+
+        return scheduler
+
+    def __write_stage(self, name, parsed):
+        """Private function used to write a parsed import stage
+
+        :param name: stage name
+        :type name: str
+        :param parsed: generator of the records being parsed, or the records
+         parsed by a worker process
+        """
+
+        with self.metrics.stage(name):
+            if isinstance(parsed, ParsedStage):
+                self.metrics.count(parsed.rows)
+                parsed = parsed.records
+
+            if name == 'NICE_Competency_descriptions':
+                self.__set_NICE_Competency_descriptions(parsed)
+            else:
+                self.write(parsed)
+
+    def __replay(self, model):
+        """Private function used to write a cached parsed model, stage by
+        stage, the same way it was written when it was parsed
+
+        :param model: the parsed model
+        :type model: class 'cwf2neo.model.ParsedModel'
+        """
+
+        for stage, kind, payload in model.operations():
+            with self.metrics.stage(stage):
+                if kind == 'write':
+                    self.write(payload)
+                else:
+                    matched, unmatched = self.db.bulk_set(*payload)
+                    log.info("Updated %d %s nodes, %d not found",
+                             len(matched), payload[0][0], len(unmatched))
+
+        log.info("Replayed %d cached nodes and relationships", len(model))
+
+    def export(self, sink):
+        """Parse the NIST/NICE data sources into a sink other than the Neo4j
+        database, e.g. an export file or an in-memory graph
+
+        :param sink: sink to write the nodes and relationships to
+        :type sink: class 'cwf2neo.sinks.Sink'
+        :return: whatever the sink returns when it is closed
+        """
+
         # Download the official sources of data from NIST/NICE
         self.download_data_sources()
 
-        # Import the Cybersecurity Framework
-        self.import_NIST_Cybersecurity_Framework()
+        self.identity_map = IdentityMap()
+        self.db = sink
 
-        # Import the Cybersecurity Workforce Framework
-        self.import_NICE_CWF()
+        self.db.create_schema(node_classes())
 
-        # Import the KSA Competencies
-        self.import_NICE_Competencies()
+        self.import_sources(self.__source_fingerprints())
 
-        # Create an index for fulltext searches across all KSATs
-        self.create_db_KSAT_index()
+        self.identity_map.report()
+
+        self.report_metrics()
+
+        self.workbooks.close()
+
+        return self.db.close()
+
+    def export_csv(self, directory, compress=False):
+        """Export the NICE CWF as CSV files for an offline
+        `neo4j-admin database import` instead of importing over Bolt
+
+        :param directory: directory to write the CSV files to
+        :type directory: str
+        :param compress: gzip the CSV files, defaults to False
+        :type compress: bool, optional
+        :return: dict with the lists of 'nodes' and 'relationships' files
+        :rtype: dict
+        """
+
+        return self.export(CSVExporter(directory, compress=compress))
+
+    def embedded_graph(self, snapshot=None):
+        """Build the NICE CWF as an in-process graph for lookups without a
+        database
+
+        :param snapshot: file to save a snapshot of the graph to, which can be
+         loaded with `EmbeddedGraph.load` at startup, defaults to None
+        :type snapshot: str, optional
+        :return: the graph
+        :rtype: class 'cwf2neo.embedded.EmbeddedGraph'
+        """
+
+        graph = self.export(EmbeddedGraph())
+        if snapshot:
+            graph.save(snapshot)
+        return graph
+
+    def report_metrics(self):
+        """Log the import stage metrics and write them to the 'metrics_file'
+        config setting, if set
+        """
+
+        self.metrics.report()
+
+        metrics_file = self.config['metrics_file'].get()
+        if metrics_file:
+            self.metrics.write(metrics_file)
+            log.info("Wrote import metrics to %s", metrics_file)
 
     def setup_neo4j_connection(self):
         """Configure the Neo4j connection and store an instance in the class
@@ -186,287 +639,394 @@ class CWF(object):
 
         log.info('Configuring Neo4j connection')
 
-        self.db = Neo4j(
-            host=self.neo4j_host,
-            port=self.neo4j_port,
+        # Stop the writer threads of the previous connection
+        if isinstance(self.db, (Neo4j, FanoutSink)):
+            self.db.close()
+
+        self.query_api = None
+
+        if not self.targets:
+            self.db = self.__connect(self.__default_target())
+            return
+
+        sinks = OrderedDict()
+        for target in self.targets:
+            name = target_name(target)
+            try:
+                sinks[name] = self.__connect(target)
+            except Exception as err:
+                # Keep loading the other targets
+                log.error("Unable to connect to {}: {}".format(name, err))
+
+        if not sinks:
+            raise ConnectionError("Unable to connect to any target")
+
+        self.db = FanoutSink(sinks)
+
+    def __default_target(self):
+        return {
+            'host': self.neo4j_host,
+            'port': self.neo4j_port,
+            'user': self.neo4j_user,
+            'pass': self.neo4j_pass
+        }
+
+    def __connect(self, target):
+        """Private function used to connect to a target database
+
+        :param target: dict of connection settings, any setting missing
+         defaults to the CWF connection settings
+        :type target: dict
+        :return: the connected sink
+        :rtype: class 'cwf2neo.neo4j.Neo4j'
+        """
+
+        settings = dict(self.__default_target(), **target)
+        bulk = self.config['bulk']
+
+        kwargs = {}
+        if settings.get('database'):
+            kwargs['name'] = settings['database']
+
+        return Neo4j(
+            host=settings['host'],
+            port=settings['port'],
             auth=(
-                self.neo4j_user,
-                self.neo4j_pass),
-            secure=self.neo4j_secure
+                settings['user'],
+                settings['pass']),
+            secure=self.neo4j_secure,
+            batch_size=bulk['batch_size'].get(int),
+            adaptive_batch_size=bulk['adaptive_batch_size'].get(bool),
+            target_latency=bulk['target_latency'].as_number(),
+            writers=bulk['writers'].get(int),
+            metrics=self.metrics,
+            resolve_node_ids=bulk['resolve_node_ids'].get(bool),
+            **kwargs
         )
 
+    def queries(self):
+        """Get the cached read queries of the imported framework, using the
+        first target database that hasn't failed when loading several
+
+        :return: the framework queries
+        :rtype: class 'cwf2neo.queries.FrameworkQueries'
+        """
+
+        if self.db is None:
+            self.setup_neo4j_connection()
+
+        if self.query_api is None:
+            db = self.db
+            if isinstance(db, FanoutSink):
+                db = db.sinks[db.healthy[0]]
+            self.query_api = FrameworkQueries(
+                db,
+                cache_size=self.config['queries']['cache_size'].get(int),
+                ttl=self.config['queries']['ttl'].as_number())
+
+        return self.query_api
+
+    def target_names(self):
+        """Get the names of the connected target databases that haven't
+        failed, e.g. 'localhost:7687'
+
+        :return: list of target names
+        :rtype: list
+        """
+
+        if isinstance(self.db, FanoutSink):
+            return self.db.healthy
+        return [target_name(self.__default_target())]
+
     def get_temp_directory(self):
-        """Get the current temp directory in use
+        """Get the directory the data sources are stored in
 
-        :return: Absolute path to the current temporary directory in use
+        :return: Absolute path to the data source cache directory in use
         :rtype: str
         """
 
-        return self.temp_dir
+        return self.data_dir
 
     def download_data_sources(self):
-        """Download all the data sources listed in config.yaml
+        """Download all the data sources listed in config.yaml. Sources that
+        are already cached are only downloaded again if they changed.
         """
 
         log.info('Downloading data sources')
 
-        for data_source in self.config['data_sources'].get():
-            self.__download_source(
-                self.config['data_sources'][data_source].get())
+        sources = list(self.__find_sources(self.config['data_sources'].get()))
+
+        results = self.source_cache.fetch_all(
+            sources, max_workers=self.config['download_workers'].get(int))
+
+        log.info(
+            "%d of %d data sources downloaded, the rest were cached",
+            sum(transferred for _, transferred in results), len(results))
+
+    def write(self, records):
+        """Write a stream of parsed nodes and relationships to the database in
+        batches, while the stream is still being parsed
+
+        :param records: iterable of node records and relationships
+        :type records: iterable
+        """
+
+        batch_size = self.config['bulk']['batch_size'].get(int)
+
+        if self.model is not None:
+            records = self.model.write(self.metrics.current.name, records)
+
+        with BatchWriter(
+                self.__add_nodes, self.__add_relationships,
+                batch_size=batch_size) as writer:
+            writer.write(records)
 
     def import_NIST_Cybersecurity_Framework(self):
         """Import the NIST Cybersecurity Framework into the neo4j database
         """
 
-        nist_function_nodes = []
-        nist_category_nodes = []
-        nist_subcategory_nodes = []
-        nist_reference_nodes = []
-        nist_category_relationships = []
-        nist_subcategory_relationships = []
-        nist_reference_node_relationships = []
-
         log.info("Importing NIST Cybersecurity Framework")
 
-        workbook_name = \
-            self.config['data_sources']['NIST']['cf']['local_filename'].get()
-        workbook = xlrd.open_workbook(
-            filename=os.path.join(self.temp_dir, workbook_name))
+        with self.metrics.stage('NIST_Cybersecurity_Framework'):
+            self.write(self.parse_NIST_Cybersecurity_Framework())
+
+        log.info("Done importing NIST Cybersecurity Framework")
 
-        sheet = workbook.sheet_by_name('Sheet1')
+    def parse_NIST_Cybersecurity_Framework(self):
+        """Parse the NIST Cybersecurity Framework spreadsheet
 
-        mapped_data = list2dict(sheet._cell_values[sheet._first_full_rowx:])
+        :return: generator of node records and relationships
+        :rtype: generator
+        """
+
+        workbook_name = \
+            self.config['data_sources']['NIST']['cf']['local_filename'].get()
+        sheet_name = 'Sheet1'
 
         bar = IncrementalBar(
             'Importing NIST Cybersecurity Framework ',
-            max=len(mapped_data),
+            max=self.workbooks.row_count(workbook_name, sheet_name),
             suffix='%(percent)d%% (%(index)d/%(max)d) [%(elapsed_td)s]')
 
-        graph = self.db.graph
-
-        for data in mapped_data:
+        for data in self.workbooks.rows(workbook_name, sheet_name):
 
             if data['Function']:
-                nist_function_node = NISTFunction()
-                m = re.match(r"([A-Z]+) \(([A-Z][A-Z])\)", data['Function'])
-                nist_function_node.title = m[1]
-                nist_function_node.id = m[2]
+                m = NIST_FUNCTION_PATTERN.match(data['Function'])
+                nist_function_node = NISTFunctionRecord(id=m[2], title=m[1])
 
                 # Create the node if it doesn't exist
-                nist_function_nodes.append(nist_function_node)
+                yield nist_function_node
 
             if data['Category']:
-                m = re.match(
-                    r"([a-zA-Z, ]+) \(([\S.]+)\):[ \n]?(.*)",
-                    data['Category'])
+                m = NIST_CATEGORY_PATTERN.match(data['Category'])
 
-                nist_category_node = NISTCategory()
-                nist_category_node.title = m[1]
-                nist_category_node.id = m[2]
-                nist_category_node.description = m[3]
+                nist_category_node = NISTCategoryRecord(
+                    id=m[2], title=m[1], description=m[3])
 
                 # Create the node if it doesn't exist
-                nist_category_nodes.append(nist_category_node)
+                yield nist_category_node
 
                 # add the category to function relationship
-                nist_category_relationships.append((nist_category_node, 'NIST_FUNCTION', nist_function_node))
+                yield Relationship(nist_category_node,
+                                   'NIST_FUNCTION', nist_function_node)
 
             if data['Subcategory']:
-                m = re.match(
-                    r"([A-Z][A-Z].[A-Z][A-Z]-[0-9]+): (.*)",
-                    data['Subcategory'])
+                m = NIST_SUBCATEGORY_PATTERN.match(data['Subcategory'])
 
-                nist_subcategory_node = NISTSubCategory()
-                nist_subcategory_node.id = m[1]
-                nist_subcategory_node.description = m[2]
+                nist_subcategory_node = NISTSubCategoryRecord(
+                    id=m[1], description=m[2])
 
                 # Create the node if it doesn't exist
-                nist_subcategory_nodes.append(nist_subcategory_node)
+                yield nist_subcategory_node
 
                 # add the category to subcategory relationship
-                nist_subcategory_relationships.append((nist_subcategory_node, 'NIST_CATEGORY', nist_category_node))
+                yield Relationship(nist_subcategory_node,
+                                   'NIST_CATEGORY', nist_category_node)
 
             if data['Informative References']:
-                nist_reference_node = NISTReference()
-
                 # Remove non-ascii characters
                 ref = data['Informative References']
                 ref = ref.encode("ascii", errors="ignore").decode()
 
-                nist_reference_node.reference = ref.strip()
+                nist_reference_node = NISTReferenceRecord(
+                    reference=ref.strip())
 
                 # Create the node if it doesn't exist
-                nist_reference_nodes.append(nist_reference_node)
+                yield nist_reference_node
 
                 # add the reference to subcategory relationship
-                nist_reference_node_relationships.append((nist_reference_node, 'NIST_SUBCATEGORY', nist_subcategory_node))
+                yield Relationship(nist_reference_node,
+                                   'NIST_SUBCATEGORY', nist_subcategory_node)
 
             bar.next()
+            self.metrics.count()
 
         bar.finish()
 
-        self.db.add_nodes(nist_function_nodes)
-        self.db.add_nodes(nist_category_nodes)
-        self.db.add_nodes(nist_subcategory_nodes)
-        self.db.add_nodes(nist_reference_nodes)
-        self.db.add_relationships(nist_category_relationships)
-        self.db.add_relationships(nist_subcategory_relationships)
-        self.db.add_relationships(nist_reference_node_relationships)
-
-        log.info("Done importing NIST Cybersecurity Framework")
+        self.workbooks.release(workbook_name)
 
-    def import_NICE_Workroles(self, workbook):
+    def import_NICE_Workroles(self, workbook_name):
         """Import the NICE CWF workroles
 
-        :param workbook: NICE CWF spreadsheet represented as a python class
-        :type workbook: class 'xlrd.book.Book'
+        :param workbook_name: filename of the NICE CWF spreadsheet
+        :type workbook_name: str
         """
 
         log.info("Importing NICE CWF Specialty Areas and Workroles")
 
-        toc_sheet = workbook.sheet_by_name('Table of Contents')
-        rows = list2dict(toc_sheet._cell_values[toc_sheet._first_full_rowx:])
+        with self.metrics.stage('NICE_Workroles'):
+            self.write(self.parse_NICE_Workroles(workbook_name))
 
-        number_of_categories = 7
+        log.info("Done Importing NICE CWF Specialty Areas and Workroles")
 
-        specialty_area_nodes = []
-        workrole_nodes = []
-        category_relationships = []
-        specialty_area_relationships = []
+    def parse_NICE_Workroles(self, workbook_name):
+        """Parse the NICE CWF specialty areas and workroles from the NICE CWF
+        spreadsheet table of contents
+
+        :param workbook_name: filename of the NICE CWF spreadsheet
+        :type workbook_name: str
+        :return: generator of node records and relationships
+        :rtype: generator
+        """
+
+        toc_sheet_name = 'Table of Contents'
+
+        number_of_categories = 7
 
         bar = IncrementalBar(
             'Importing NICE CWF Specialty Areas and Workroles ',
-            max=len(rows) - number_of_categories,
+            max=self.workbooks.row_count(workbook_name, toc_sheet_name)
+            - number_of_categories,
             suffix='%(percent)d%% (%(index)d/%(max)d) [%(elapsed_td)s]')
 
-        for data in rows:
+        for data in self.workbooks.rows(workbook_name, toc_sheet_name):
             if data['NICE Specialty Area']:
-                m = re.search(
-                    r"([a-zA-Z &,/-]+) \(([A-Z]{3})\)",
-                    data['NICE Specialty Area'])
+                m = SPECIALTY_AREA_PATTERN.search(data['NICE Specialty Area'])
                 if not m:
                     continue
-                specialty_area_node = NICESpecialtyArea()
-                specialty_area_node.id = m[2]
-                specialty_area_node.title = m[1]
-
-                if data['NICE Specialty Area Description']:
-                    specialty_area_node.description = \
-                        data['NICE Specialty Area Description']
+                specialty_area_node = NICESpecialtyAreaRecord(
+                    id=m[2], title=m[1],
+                    description=data['NICE Specialty Area Description']
+                    or None)
 
                 # create the node if it doesn't exist
-                specialty_area_nodes.append(specialty_area_node)
+                yield specialty_area_node
 
             if data['Work Role']:
-                workrole_node = NICEWorkrole()
-                workrole_node.title = data['Work Role'].strip()
+                workrole_id = None
 
-                log.debug("Adding {}".format(workrole_node.title))
+                log.debug("Adding {}".format(data['Work Role'].strip()))
 
                 if data['Work Role ID']:
-                    m = re.search(
-                        r"([A-Z]{2})-[A-Z]{3}-[0-9]{3}",
-                        data['Work Role ID'])
-                    workrole_node.id = m[0]
+                    m = WORKROLE_ID_PATTERN.search(data['Work Role ID'])
+                    workrole_id = m[0]
 
                     # add the specialty area to nice category relationship
-                    nice_category_node = NICECategory()
-                    nice_category_node.id = m[1]
-
-                    category_relationships.append((specialty_area_node, 'NICE_SPECIALTY_AREA', nice_category_node))
+                    yield Relationship(specialty_area_node,
+                                       'NICE_SPECIALTY_AREA',
+                                       NICECategoryRecord.ref(m[1]))
 
-                if data['Work Role Description']:
-                    workrole_node.description = data['Work Role Description']
-
-                if data['OPM Code (Fed Use)']:
-                    workrole_node.opm_code = data['OPM Code (Fed Use)']
+                workrole_node = NICEWorkroleRecord(
+                    id=workrole_id,
+                    title=data['Work Role'].strip(),
+                    description=data['Work Role Description'] or None,
+                    opm_code=data['OPM Code (Fed Use)'] or None)
 
                 # create the node if it doesn't exist
-                workrole_nodes.append(workrole_node)
+                yield workrole_node
 
                 # add the workrole to specialty area relationship
-                specialty_area_relationships.append((workrole_node, 'NICE_SPECIALTY_AREA', specialty_area_node))
+                yield Relationship(workrole_node,
+                                   'NICE_SPECIALTY_AREA', specialty_area_node)
 
             bar.next()
+            self.metrics.count()
 
         bar.finish()
 
-        self.db.add_nodes(specialty_area_nodes)
-        self.db.add_nodes(workrole_nodes)
-        self.db.add_relationships(category_relationships)
-        self.db.add_relationships(specialty_area_relationships)
-
-        log.info("Done Importing NICE CWF Specialty Areas and Workroles")
+        self.workbooks.release(workbook_name, toc_sheet_name)
 
-    def import_NICE_KSAT(self, workbook):
+    def import_NICE_KSAT(self, workbook_name):
         """Import the NICE KSATs and their relationships with Workroles
 
-        :param workbook: NICE CWF spreadsheet represented as a python class
-        :type workbook: class 'xlrd.book.Book'
+        :param workbook_name: filename of the NICE CWF spreadsheet
+        :type workbook_name: str
         """
 
         log.info("Parsing NICE CWF KSATs")
+
+        with self.metrics.stage('NICE_KSAT'):
+            self.write(self.parse_NICE_KSAT(workbook_name))
+
+        log.info("Done Parsing NICE CWF KSATs")
+
+    def parse_NICE_KSAT(self, workbook_name):
+        """Parse the NICE KSATs and their relationships with Workroles from
+        every work role sheet of the NICE CWF spreadsheet
+
+        :param workbook_name: filename of the NICE CWF spreadsheet
+        :type workbook_name: str
+        :return: generator of node records and relationships
+        :rtype: generator
+        """
+
         bar = Counter(
             'Parsing NICE CWF KSATs ',
             suffix='%(percent)d%% (%(index)d/%(max)d) [%(elapsed_td)s]')
 
-        all_sheets = workbook.sheets()
-
-        knowledge_nodes = []
-        skill_nodes = []
-        ability_nodes = []
-        task_nodes = []
-        workrole_relationships = []
-
-        for sheet in all_sheets:
-            if not re.match(r"[A-Z]+-[A-Z]+-[0-9]+", sheet.name):
+        for sheet_name in self.workbooks.sheet_names(workbook_name):
+            if not WORKROLE_SHEET_PATTERN.match(sheet_name):
                 continue
 
-            workrole_id = re.match(
-                r"([A-Z]{2}-[A-Z]{3}-[0-9]{3})",
-                sheet.name)[1]
+            workrole_node = NICEWorkroleRecord.ref(
+                WORKROLE_ID_PATTERN.match(sheet_name)[0])
 
-            for row in sheet._cell_values:
-                # capture and store the KSAT unless it's a header row
-                try:
-                    ksat = parse_ksats(row[0])[0]
-                except Exception:
-                    # Ignore header rows that don't contain KSATs
-                    continue
+            rows = list(self.workbooks.values(workbook_name, sheet_name))
 
-                ksat_type = ksat_id_to_type(ksat)
-                ksat_node = KSAT()
-                ksat_node.id = ksat
-                ksat_node.description = row[1]
-                ksat_node.type = ksat_type
-                ksat_node.__node__.add_label(ksat_type)
+            for ksat, ksat_type, description in parse_ksat_sheet(rows):
+                ksat_node = KSATRecord(
+                    id=ksat, type=ksat_type, description=description,
+                    labels=(ksat_type,))
 
                 # create the node if it doesn't exist
-                if ksat_type == "Knowledge":
-                    knowledge_nodes.append(ksat_node)
-                elif ksat_type == "Skill":
-                    skill_nodes.append(ksat_node)
-                elif ksat_type == "Ability":
-                    ability_nodes.append(ksat_node)
-                elif ksat_type == "Task":
-                    task_nodes.append(ksat_node)
+                yield ksat_node
 
-                workrole_node = NICEWorkrole()
-                workrole_node.id = workrole_id
-
-                workrole_relationships.append((ksat_node, 'NICE_WORKROLE', workrole_node))
+                yield Relationship(ksat_node, 'NICE_WORKROLE', workrole_node)
 
                 bar.next()
+                self.metrics.count()
+
+            self.workbooks.release(workbook_name, sheet_name)
 
         bar.finish()
 
-        self.db.add_nodes(knowledge_nodes)
-        self.db.add_nodes(skill_nodes)
-        self.db.add_nodes(ability_nodes)
-        self.db.add_nodes(task_nodes)
-        self.db.add_relationships(workrole_relationships)
+    def ksat_shards(self, workbook_name, count):
+        """Split the work role KSAT sheets of the NICE CWF spreadsheet into
+        shards of consecutive sheets
 
-        log.info("Done Parsing NICE CWF KSATs")
+        :param workbook_name: filename of the NICE CWF spreadsheet
+        :type workbook_name: str
+        :param count: number of shards, fewer if there are fewer sheets
+        :type count: int
+        :return: list of lists of sheet names
+        :rtype: list
+        """
+
+        sheet_names = [
+            sheet_name for sheet_name in self.workbooks.sheet_names(
+                workbook_name)
+            if WORKROLE_SHEET_PATTERN.match(sheet_name)]
+
+        count = max(min(count, len(sheet_names)), 1)
+        size, extra = divmod(len(sheet_names), count)
+
+        shards = []
+        start = 0
+        for index in range(count):
+            end = start + size + (index < extra)
+            shards.append(sheet_names[start:end])
+            start = end
+        return shards
 
     def import_NICE_CWF(self):
         """Import the NICE Cybersecurity Workforce Framework into the neo4j database
@@ -476,138 +1036,162 @@ class CWF(object):
 
         workbook_name = os.path.basename(
             self.config['data_sources']['NICE']['cwf']['local_filename'].get())
-        workbook = xlrd.open_workbook(
-            filename=os.path.join(self.temp_dir, workbook_name))
 
         # Parse the Workroles from the NICE CWF spreadsheet table of contents
-        self.import_NICE_Workroles(workbook)
+        self.import_NICE_Workroles(workbook_name)
 
         # Parse all work role KSAT sheets
-        self.import_NICE_KSAT(workbook)
+        self.import_NICE_KSAT(workbook_name)
+
+        self.workbooks.release(workbook_name)
 
     def import_NICE_Competencies(self):
         """Read the NICE CWF Competencies from the pivot table and
         import into the neo4j database
         """
 
+        log.info("Importing NICE Competencies")
+
+        with self.metrics.stage('NICE_Competencies'):
+            self.write(self.parse_NICE_Competencies())
+
+        # Import the competency definitions
+        self.__import_NICE_Competency_descriptions()
+
         NICE_ref = self.config['data_sources']['NICE']
-        workbook_name = NICE_ref['competencies']['local_filename'].get()
-        sheet_name = 'KSAs mapped to Competency'
+        self.workbooks.release(
+            NICE_ref['competencies']['local_filename'].get())
 
-        workbook = xlrd.open_workbook(
-            filename=os.path.join(self.temp_dir, workbook_name))
-        sheet = workbook.sheet_by_name(sheet_name)
+        log.info("Done Importing NICE Competencies")
 
-        rows = list2dict(sheet._cell_values[sheet._first_full_rowx:])
+    def parse_NICE_Competencies(self):
+        """Parse the NICE CWF Competencies and their relationships with KSATs
+        from the pivot table
 
-        competencygroup_nodes = []
-        competency_nodes = []
-        ksat_nodes = []
-        competencygroup_relationships = []
-        competency_relationships = []
+        :return: generator of node records and relationships
+        :rtype: generator
+        """
+
+        NICE_ref = self.config['data_sources']['NICE']
+        workbook_name = NICE_ref['competencies']['local_filename'].get()
+        sheet_name = 'KSAs mapped to Competency'
 
-        log.info("Importing NICE Competencies")
         bar = IncrementalBar(
             'Importing NICE Competencies ',
-            max=len(rows),
+            max=self.workbooks.row_count(workbook_name, sheet_name),
             suffix='%(percent)d%% (%(index)d/%(max)d) [%(elapsed_td)s]')
 
-        for row in rows:
-            try:
-                ksats = parse_ksats(row['KSA ID'])
-            except Exception as err:
-                log.error("YY %s" % err)
+        for row in self.workbooks.rows(workbook_name, sheet_name):
+            ksats = find_ksats(row['KSA ID'])
+            if not ksats:
+                log.error("No KSATs found: %s", row['KSA ID'])
+                bar.next()
+                self.metrics.count()
+                continue
 
             for ksat in ksats:
                 # Get the db node matching the ksat id
-                ksat_node = KSAT()
-                ksat_node.id = ksat
+                ksat_node = KSATRecord.ref(ksat)
 
                 # Add the Competency Group
-                competencygroup_node = NICECompetencyGroup()
                 # Competency Group ID removed in 30 June 2020 update
-                # competencygroup_node.id = row['Competency Group ID']
                 # Competency Group changed to Competency Grouping in 30 June 2020 update
-                competencygroup_node.name = row['Competency Grouping']
+                competencygroup_node = NICECompetencyGroupRecord(
+                    name=row['Competency Grouping'])
 
-                competencygroup_nodes.append(competencygroup_node)
+                yield competencygroup_node
 
                 # Add the Competency
-                competency_node = NICECompetency()
-                competency_node.id = row['Competency ID']
-                competency_node.name = row['Competency']
+                competency_node = NICECompetencyRecord(
+                    id=row['Competency ID'], name=row['Competency'])
 
-                competency_nodes.append(competency_node)
+                yield competency_node
 
-                #competency_node.nice_competency_group.add(competencygroup_node)
-                competencygroup_relationships.append((competency_node, 'NICE_COMPETENCY_GROUP', competencygroup_node))
+                yield ksat_node
+
+                yield Relationship(competency_node,
+                                   'NICE_COMPETENCY_GROUP',
+                                   competencygroup_node)
 
                 # Add the KSA to Competency relationship
-                competency_relationships.append((ksat_node, 'NICE_COMPETENCY', competency_node))
+                yield Relationship(ksat_node,
+                                   'NICE_COMPETENCY', competency_node)
 
-                ksat_nodes.append(ksat_node)
             bar.next()
-
-        self.db.add_nodes(competencygroup_nodes)
-        self.db.add_nodes(competency_nodes)
-        self.db.add_nodes(ksat_nodes)
-        self.db.add_relationships(competencygroup_relationships)
-        self.db.add_relationships(competency_relationships)
-
-        # Import the competency definitions
-        self.__import_NICE_Competency_descriptions()
+            self.metrics.count()
 
         bar.finish()
-        log.info("Done Importing NICE Competencies")
+
+        self.workbooks.release(workbook_name, sheet_name)
 
     def __import_NICE_Competency_descriptions(self):
         """Read the NICE CWF Competency descriptions from the pivot table and
         import into the neo4j database
         """
 
+        with self.metrics.stage('NICE_Competency_descriptions'):
+            self.__set_NICE_Competency_descriptions(
+                self.parse_NICE_Competency_descriptions())
+
+    def parse_NICE_Competency_descriptions(self):
+        """Parse the NICE CWF Competency descriptions from the pivot table
+
+        :return: generator of (competency ID, dict of properties) tuples
+        :rtype: generator
+        """
+
         NICE_ref = self.config['data_sources']['NICE']
         workbook_name = NICE_ref['competencies']['local_filename'].get()
         sheet_name = 'Competency Descriptions'
 
-        workbook = xlrd.open_workbook(
-            filename=os.path.join(self.temp_dir, workbook_name))
-        sheet = workbook.sheet_by_name(sheet_name)
+        for row in self.workbooks.rows(workbook_name, sheet_name):
+            yield (row['Competency ID'], {'description': row['Description']})
 
-        rows = list2dict(sheet._cell_values[sheet._first_full_rowx:])
+        self.workbooks.release(workbook_name, sheet_name)
 
-        # start the graph transaction
-        tx = self.db.graph.begin()
+    def __set_NICE_Competency_descriptions(self, descriptions):
+        """Private function used to set the parsed descriptions on the
+        competencies in the current stage
 
-        for row in rows:
+        :param descriptions: (competency ID, dict of properties) tuples
+        :type descriptions: iterable
+        """
+
+        if self.model is not None:
+            descriptions = self.model.bulk_set(
+                self.metrics.current.name, node_key(NICECompetencyRecord),
+                descriptions)
 
-            # Cypher query to update the Competency description
-            statement = """MATCH (n:NICECompetency)
-                        WHERE n.id = $n
-                        SET n.description = $d"""
+        matched, unmatched = self.db.bulk_set(
+            node_key(NICECompetencyRecord), descriptions)
 
-            # Add to the transaction
-            tx.run(statement, n=row['Competency ID'], d=row['Description'])
+        log.info(
+            "Updated %d competency descriptions, %d competencies not found",
+            len(matched), len(unmatched))
+
+    def create_db_schema(self):
+        """Create the uniqueness constraints and lookup indexes on the primary
+        key of every graph object, so bulk merges don't scan whole labels
+        """
 
-        # Commit the transactions to the databse
-        tx.commit()
+        log.info("Creating database constraints and indexes")
+
+        with self.metrics.stage('schema'):
+            self.db.create_schema(node_classes())
+
+        log.info("Done Creating database constraints and indexes")
 
     def create_db_KSAT_index(self):
         """Create a fulltext search index for KSATs
         """
-        graph = self.db.graph
 
         log.info("Creating database index for KSATs")
-        try:
-            graph.run(
-                r'CALL db.index.fulltext.createNodeIndex('
-                r'"ksat_index",'
-                r'["Knowledge", "Skill", "Ability", "Task"],'
-                r'["id", "description"])')
-        except Exception as err:
-            if err.code == 'Neo.ClientError.Procedure.ProcedureCallFailed':
-                log.info('KSAT Index already exists')
-            else:
-                raise err
+
+        with self.metrics.stage('KSAT_index'):
+            self.db.create_fulltext_index(
+                'ksat_index',
+                ['Knowledge', 'Skill', 'Ability', 'Task'],
+                ['id', 'description'])
 
         log.info("Done Creating database index for KSATs")
 
@@ -618,32 +1202,38 @@ class CWF(object):
         """
 
         log.info("Adding NICE CWF Categories")
+
+        with self.metrics.stage('NICE_Categories'):
+            self.write(self.parse_NICE_Categories())
+
+        log.info("Done Adding NICE CWF Categories")
+
+    def parse_NICE_Categories(self):
+        """Build the NICE CWF Categories from the static list within this
+        package
+
+        :return: generator of node records and relationships
+        :rtype: generator
+        """
+
         bar = IncrementalBar(
             'Adding NICE CWF Categories ',
             max=len(NICE_Categories),
             suffix='%(percent)d%% (%(index)d/%(max)d) [%(elapsed_td)s]')
 
-        category_nodes = []
-        category_relationships = []
-
         for category in NICE_Categories:
-            category_node = NICECategory()
-            category_node.id = category['id']
-            category_node.title = category['title']
-            category_node.description = category['description']
+            category_node = NICECategoryRecord(
+                id=category['id'], title=category['title'],
+                description=category['description'])
+
+            yield category_node
 
             for nist_function in NICE_Category_map[category['id']]:
-                nist_function_node = NISTFunction()
-                nist_function_node.id = nist_function
-                category_relationships.append((category_node, 'NIST_Function', nist_function_node))
-            
-            category_nodes.append(category_node)
+                yield Relationship(category_node,
+                                   'NIST_Function',
+                                   NISTFunctionRecord.ref(nist_function))
 
             bar.next()
+            self.metrics.count()
 
         bar.finish()
-
-        self.db.add_nodes(category_nodes)
-        self.db.add_relationships(category_relationships)
-
-        log.info("Done Adding NICE CWF Categories")
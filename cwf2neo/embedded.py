@@ -0,0 +1,406 @@
+import logging
+import os
+import pickle
+import re
+import tempfile
+from array import array
+
+from cwf2neo.graph_objects import as_record, as_relationship
+from cwf2neo.sinks import Sink
+
+log = logging.getLogger(__name__)
+
+# Bump whenever the layout of the snapshot changes
+SNAPSHOT_VERSION = 1
+
+PICKLE_PROTOCOL = min(5, pickle.HIGHEST_PROTOCOL)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset((
+    'a', 'an', 'and', 'as', 'at', 'be', 'by', 'e', 'for', 'g', 'in', 'into',
+    'is', 'it', 'of', 'on', 'or', 'that', 'the', 'their', 'to', 'with'))
+
+KSAT_TYPE_LABELS = ('Knowledge', 'Skill', 'Ability', 'Task')
+
+
+def tokenize(text):
+    """Split text into the lower case words used by the token index
+
+    :param text: text to split
+    :type text: str
+    :return: list of words, without stopwords
+    :rtype: list
+    """
+
+    if not isinstance(text, str):
+        return []
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS]
+
+
+class EmbeddedGraph(Sink):
+    """Compact, read only copy of the framework graph for in-process lookups
+    without a database.
+
+    Nodes are numbered from 0 in the order they are added, with a hash index
+    from the primary key of each label to the node number. Once loaded, the
+    relationships of each type are packed into arrays of node numbers indexed
+    by per-node offsets, in both directions, and the KSAT descriptions into a
+    token index. Both are built when the sink is closed, or by the first
+    lookup after the graph changed.
+    """
+
+    def __init__(self):
+        # node number -> frozenset of labels
+        self.labels = []
+        # node number -> dict of properties
+        self.properties = []
+        # primary label -> {primary key value -> node number}
+        self.index = {}
+        # relationship type -> (outgoing offsets, outgoing node numbers,
+        # incoming offsets, incoming node numbers)
+        self.adjacency = {}
+        # (relationship type, start, end) -> properties, only if it has any
+        self.relationship_properties = {}
+        # token -> array of KSAT node numbers
+        self.tokens = {}
+        # (start key, relationship type, end key) waiting to be packed
+        self.__pending = []
+        self.__packed = False
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add_nodes(self, nodes):
+        for node in map(as_record, nodes):
+            if node.__primaryvalue__ is None:
+                continue
+
+            label_index = self.index.setdefault(node.__primarylabel__, {})
+            node_id = label_index.get(node.__primaryvalue__)
+            if node_id is None:
+                node_id = label_index[node.__primaryvalue__] = len(self.labels)
+                self.labels.append(frozenset())
+                self.properties.append({})
+
+            self.labels[node_id] |= node.all_labels()
+            self.properties[node_id].update(node.properties())
+            self.__packed = False
+
+    def add_relationships(self, relationships):
+        # Endpoints are resolved when packing, the end node may be added later
+        for relationship in map(as_relationship, relationships):
+            self.__pending.append((
+                (relationship.start.__primarylabel__,
+                 relationship.start.__primaryvalue__),
+                relationship.type,
+                (relationship.end.__primarylabel__,
+                 relationship.end.__primaryvalue__),
+                relationship.properties))
+            self.__packed = False
+
+    def bulk_set(self, node_key, data):
+        label_index = self.index.get(node_key[0], {})
+        matched = []
+        unmatched = []
+
+        for value, properties in data:
+            node_id = label_index.get(value)
+            if node_id is None:
+                unmatched.append(value)
+                continue
+            self.properties[node_id].update(properties)
+            matched.append(value)
+
+        self.__packed = False
+        return matched, unmatched
+
+    def close(self):
+        """Pack the graph for lookups
+
+        :return: the graph
+        :rtype: class 'cwf2neo.embedded.EmbeddedGraph'
+        """
+
+        self.pack()
+        return self
+
+    def node_id(self, label, value):
+        """Get the number of a node by its primary key
+
+        :param label: primary label, e.g. 'NICEWorkrole'
+        :type label: str
+        :param value: primary key value, e.g. 'SP-RSK-001'
+        :return: node number, None if there is no such node
+        :rtype: int
+        """
+
+        return self.index.get(label, {}).get(value)
+
+    def __edges(self):
+        """Every relationship already packed, as (type, start, end) tuples"""
+
+        for rel_type, (offsets, targets, _, _) in self.adjacency.items():
+            for start in range(len(offsets) - 1):
+                for position in range(offsets[start], offsets[start + 1]):
+                    yield rel_type, start, targets[position]
+
+    def pack(self):
+        """Pack the relationships into adjacency arrays and rebuild the token
+        index. Relationships whose endpoints don't exist are dropped.
+        """
+
+        if self.__packed:
+            return
+
+        edges = {}
+        for rel_type, start, end in self.__edges():
+            edges.setdefault(rel_type, set()).add((start, end))
+
+        dropped = 0
+        for start_key, rel_type, end_key, properties in self.__pending:
+            start = self.node_id(*start_key)
+            end = self.node_id(*end_key)
+            if start is None or end is None:
+                dropped += 1
+                continue
+            edges.setdefault(rel_type, set()).add((start, end))
+            if properties:
+                self.relationship_properties.setdefault(
+                    (rel_type, start, end), {}).update(properties)
+        self.__pending = []
+
+        if dropped:
+            log.warning("Dropped {} relationships to missing nodes".format(
+                dropped))
+
+        self.adjacency = {
+            rel_type: self.__pack_edges(pairs)
+            for rel_type, pairs in edges.items()}
+
+        self.tokens = {}
+        for node_id in self.index.get('KSAT', {}).values():
+            for token in set(tokenize(
+                    self.properties[node_id].get('description'))):
+                self.tokens.setdefault(token, array('i')).append(node_id)
+
+        self.__packed = True
+
+    def __pack_edges(self, pairs):
+        count = len(self.labels)
+        packed = []
+
+        for direction in (sorted(pairs), sorted((e, s) for s, e in pairs)):
+            offsets = array('i', [0] * (count + 1))
+            for start, _ in direction:
+                offsets[start + 1] += 1
+            for node_id in range(count):
+                offsets[node_id + 1] += offsets[node_id]
+            packed += [offsets, array('i', (end for _, end in direction))]
+
+        return tuple(packed)
+
+    def neighbours(self, node_id, rel_type, direction='out'):
+        """Get the nodes related to a node by relationships of a type
+
+        :param node_id: node number
+        :type node_id: int
+        :param rel_type: relationship type
+        :type rel_type: str
+        :param direction: 'out' for end nodes of the relationships starting
+         at the node, 'in' for start nodes of the relationships ending at it,
+         defaults to 'out'
+        :type direction: str, optional
+        :return: array of node numbers
+        :rtype: array
+        """
+
+        self.pack()
+
+        adjacency = self.adjacency.get(rel_type)
+        if adjacency is None or node_id is None:
+            return array('i')
+
+        offsets, targets = adjacency[:2] if direction == 'out' \
+            else adjacency[2:]
+        if node_id >= len(offsets) - 1:
+            return array('i')
+        return targets[offsets[node_id]:offsets[node_id + 1]]
+
+    def __related(self, node_ids, rel_type, direction, label):
+        related = set()
+        for node_id in node_ids:
+            related.update(
+                other
+                for other in self.neighbours(node_id, rel_type, direction)
+                if label in self.labels[other])
+        return related
+
+    def __sorted(self, node_ids, keys):
+        return sorted(
+            ({key: self.properties[node_id].get(key) for key in keys}
+             for node_id in node_ids),
+            key=lambda node: str(node[keys[0]]))
+
+    def __ksat(self, node_id):
+        return {
+            'id': self.properties[node_id].get('id'),
+            'description': self.properties[node_id].get('description'),
+            'type': next((
+                label for label in KSAT_TYPE_LABELS
+                if label in self.labels[node_id]), None)
+        }
+
+    def ksats_for_workrole(self, workrole_id):
+        """Get the KSATs of a work role
+
+        :param workrole_id: work role ID, e.g. 'SP-RSK-001'
+        :type workrole_id: str
+        :return: list of KSAT dicts with 'id', 'description' and 'type' keys,
+         ordered by KSAT ID
+        :rtype: list
+        """
+
+        ksats = self.__related(
+            [self.node_id('NICEWorkrole', workrole_id)], 'NICE_WORKROLE',
+            'in', 'KSAT')
+        return sorted(map(self.__ksat, ksats), key=lambda ksat: ksat['id'])
+
+    def workroles_for_ksat(self, ksat_id):
+        """Get the work roles requiring a KSAT
+
+        :param ksat_id: KSAT ID, e.g. 'K0001'
+        :type ksat_id: str
+        :return: list of work role dicts with 'id', 'title', 'description'
+         and 'opm_code' keys, ordered by work role ID
+        :rtype: list
+        """
+
+        workroles = self.__related(
+            [self.node_id('KSAT', ksat_id)], 'NICE_WORKROLE', 'out',
+            'NICEWorkrole')
+        return self.__sorted(
+            workroles, ('id', 'title', 'description', 'opm_code'))
+
+    def competencies_for_workrole(self, workrole_id):
+        """Get the competencies of the KSATs of a work role
+
+        :param workrole_id: work role ID, e.g. 'SP-RSK-001'
+        :type workrole_id: str
+        :return: list of competency dicts with 'id', 'name' and 'description'
+         keys, ordered by competency ID
+        :rtype: list
+        """
+
+        ksats = self.__related(
+            [self.node_id('NICEWorkrole', workrole_id)], 'NICE_WORKROLE',
+            'in', 'KSAT')
+        competencies = self.__related(
+            ksats, 'NICE_COMPETENCY', 'out', 'NICECompetency')
+        return self.__sorted(competencies, ('id', 'name', 'description'))
+
+    def nist_functions_for_workrole(self, workrole_id):
+        """Get the NIST Cybersecurity Framework functions a work role falls
+        under, through its specialty area and NICE category
+
+        :param workrole_id: work role ID, e.g. 'SP-RSK-001'
+        :type workrole_id: str
+        :return: list of NIST function dicts with 'id' and 'title' keys,
+         ordered by function ID
+        :rtype: list
+        """
+
+        specialty_areas = self.__related(
+            [self.node_id('NICEWorkrole', workrole_id)],
+            'NICE_SPECIALTY_AREA', 'out', 'NICESpecialtyArea')
+        categories = self.__related(
+            specialty_areas, 'NICE_SPECIALTY_AREA', 'out', 'NICECategory')
+        functions = self.__related(
+            categories, 'NIST_Function', 'out', 'NISTFunction')
+        return self.__sorted(functions, ('id', 'title'))
+
+    def search_ksats(self, text, limit=10):
+        """Search the KSAT descriptions with the token index. KSATs are
+        ranked by the number of words of the text their description contains.
+
+        :param text: words to search for
+        :type text: str
+        :param limit: maximum number of KSATs, defaults to 10
+        :type limit: int, optional
+        :return: list of dicts with 'id', 'description' and 'score' keys, most
+         relevant first, where the score is the fraction of the words found
+        :rtype: list
+        """
+
+        self.pack()
+
+        words = set(tokenize(text))
+        scores = {}
+        for word in words:
+            for node_id in self.tokens.get(word, ()):
+                scores[node_id] = scores.get(node_id, 0) + 1
+
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (-item[1], str(self.properties[item[0]]['id'])))
+
+        return [
+            {'id': self.properties[node_id].get('id'),
+             'description': self.properties[node_id].get('description'),
+             'score': score / len(words)}
+            for node_id, score in ranked[:limit]]
+
+    def save(self, path):
+        """Atomically write a snapshot of the packed graph to a file
+
+        :param path: path of the snapshot file
+        :type path: str
+        """
+
+        self.pack()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((SNAPSHOT_VERSION, {
+                'labels': self.labels,
+                'properties': self.properties,
+                'index': self.index,
+                'adjacency': self.adjacency,
+                'relationship_properties': self.relationship_properties,
+                'tokens': self.tokens
+            }), f, protocol=PICKLE_PROTOCOL)
+        os.replace(temp_path, path)
+
+        log.info("Saved graph snapshot of {} nodes to {}".format(
+            len(self), path))
+
+    @classmethod
+    def load(cls, path):
+        """Load a graph from a snapshot file. The snapshot is a pickle file,
+        so it must only be loaded from a file the user trusts.
+
+        :param path: path of the snapshot file
+        :type path: str
+        :return: the packed graph
+        :rtype: class 'cwf2neo.embedded.EmbeddedGraph'
+        """
+
+        with open(path, 'rb') as f:
+            version, state = pickle.load(f)
+
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(
+                "Unsupported graph snapshot version {} in {}".format(
+                    version, path))
+
+        graph = cls()
+        for name, value in state.items():
+            setattr(graph, name, value)
+        graph.__packed = True
+
+        log.info("Loaded graph snapshot of {} nodes from {}".format(
+            len(graph), path))
+        return graph
@@ -0,0 +1,225 @@
+import csv
+import gzip
+import logging
+import os
+from collections import OrderedDict
+
+from cwf2neo.graph_objects import as_record, as_relationship
+from cwf2neo.sinks import Sink
+
+log = logging.getLogger(__name__)
+
+# Python types to neo4j-admin import header types
+CSV_TYPES = OrderedDict([
+    (bool, 'boolean'),
+    (int, 'long'),
+    (float, 'double'),
+    (str, 'string')
+])
+
+
+def csv_type(values):
+    """Get the neo4j-admin import header type of a column
+
+    :param values: column values
+    :type values: iterable
+    :return: header type, defaults to 'string'
+    :rtype: str
+    """
+
+    for value in values:
+        if value is None:
+            continue
+        for python_type, header_type in CSV_TYPES.items():
+            if isinstance(value, python_type):
+                return header_type
+    return 'string'
+
+
+class CSVExporter(Sink):
+    """Sink writing the parsed graph as header typed node and
+    relationship CSV files for `neo4j-admin database import`, so a database
+    can be built offline without a running server.
+
+    Nodes are held in memory until `close` since the columns of each file are
+    only known once every node was parsed. Relationships with an endpoint that
+    was never exported are dropped, matching the Bolt import which only
+    merges relationships between existing nodes.
+    """
+
+    def __init__(self, directory, compress=False):
+        """Constructor for initial setup
+
+        :param directory: directory to write the CSV files to
+        :type directory: str
+        :param compress: gzip the CSV files, defaults to False
+        :type compress: bool, optional
+        """
+        self.directory = directory
+        self.compress = compress
+        self.__nodes = OrderedDict()
+        self.__relationships = OrderedDict()
+
+        os.makedirs(directory, exist_ok=True)
+
+    def add_nodes(self, nodes):
+        """Add nodes to export, merging nodes with the same primary key
+
+        :param nodes: node records
+        :type nodes: iterable
+        """
+
+        for node in map(as_record, nodes):
+            if node.__primaryvalue__ is None:
+                continue
+            label_nodes = self.__nodes.setdefault(
+                (node.__primarylabel__, node.__primarykey__), OrderedDict())
+            properties, labels = label_nodes.get(
+                node.__primaryvalue__, ({}, set()))
+            properties.update(node.properties())
+            labels.update(node.all_labels())
+            label_nodes[node.__primaryvalue__] = (properties, labels)
+
+    def add_relationships(self, relationships):
+        """Add relationships to export
+
+        :param relationships: relationships between node records
+        :type relationships: iterable
+        """
+
+        for relationship in map(as_relationship, relationships):
+            group = (
+                relationship.type,
+                relationship.start.__primarylabel__,
+                relationship.end.__primarylabel__)
+            self.__relationships.setdefault(group, OrderedDict())[
+                (relationship.start.__primaryvalue__,
+                 relationship.end.__primaryvalue__)] = \
+                relationship.properties or {}
+
+    def bulk_set(self, node_key, data):
+        """Set properties on nodes already added by primary key
+
+        :param node_key: tuple of (label, primary key)
+        :type node_key: tuple
+        :param data: (primary key value, dict of properties) tuples
+        :type data: iterable
+        :return: tuple of (matched, unmatched) lists of primary key values
+        :rtype: tuple
+        """
+
+        label_nodes = self.__nodes.get(tuple(node_key), {})
+        matched = []
+        unmatched = []
+
+        for value, properties in data:
+            if value in label_nodes:
+                label_nodes[value][0].update(properties)
+                matched.append(value)
+            else:
+                unmatched.append(value)
+
+        return matched, unmatched
+
+    def __open(self, filename):
+        path = os.path.join(self.directory, filename)
+        if self.compress:
+            path += '.gz'
+            return path, gzip.open(path, 'wt', newline='', encoding='utf-8')
+        return path, open(path, 'w', newline='', encoding='utf-8')
+
+    def __write_nodes(self, label, key, nodes):
+        columns = OrderedDict([(key, None)])
+        for properties, _ in nodes.values():
+            columns.update((column, None) for column in properties)
+        del columns[key]
+
+        header = ['{}:ID({})'.format(key, label)] + [
+            '{}:{}'.format(column, csv_type(
+                p.get(column) for p, _ in nodes.values()))
+            for column in columns] + [':LABEL']
+
+        path, f = self.__open('nodes_{}.csv'.format(label))
+        with f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for value, (properties, labels) in nodes.items():
+                writer.writerow(
+                    [value] + [properties.get(column) for column in columns]
+                    + [';'.join(sorted(labels))])
+
+        log.info("Exported {} {} nodes to {}".format(len(nodes), label, path))
+        return path
+
+    def __write_relationships(self, rel_type, start_label, end_label, data):
+        start_ids = self.__ids(start_label)
+        end_ids = self.__ids(end_label)
+
+        rows = OrderedDict(
+            (endpoints, properties) for endpoints, properties in data.items()
+            if endpoints[0] in start_ids and endpoints[1] in end_ids)
+
+        if len(rows) < len(data):
+            log.warning(
+                "Dropped {} {} relationships without exported "
+                "endpoints".format(len(data) - len(rows), rel_type))
+
+        columns = OrderedDict()
+        for properties in rows.values():
+            columns.update((column, None) for column in properties)
+
+        header = [
+            ':START_ID({})'.format(start_label),
+            ':END_ID({})'.format(end_label)] + [
+            '{}:{}'.format(column, csv_type(
+                p.get(column) for p in rows.values()))
+            for column in columns] + [':TYPE']
+
+        path, f = self.__open('relationships_{}_{}_{}.csv'.format(
+            rel_type, start_label, end_label))
+        with f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for (start, end), properties in rows.items():
+                writer.writerow(
+                    [start, end]
+                    + [properties.get(column) for column in columns]
+                    + [rel_type])
+
+        log.info("Exported {} {} relationships to {}".format(
+            len(rows), rel_type, path))
+        return path
+
+    def __ids(self, label):
+        for (node_label, _), nodes in self.__nodes.items():
+            if node_label == label:
+                return nodes
+        return {}
+
+    def close(self):
+        """Write all CSV files
+
+        :return: dict with the lists of 'nodes' and 'relationships' files
+        :rtype: dict
+        """
+
+        files = {
+            'nodes': [
+                self.__write_nodes(label, key, nodes)
+                for (label, key), nodes in self.__nodes.items()],
+            'relationships': [
+                self.__write_relationships(
+                    rel_type, start_label, end_label, data)
+                for (rel_type, start_label, end_label), data
+                in self.__relationships.items()]
+        }
+
+        log.info(
+            "Import with: neo4j-admin database import full "
+            "--multiline-fields=true %s",
+            ' '.join(
+                ['--nodes={}'.format(path) for path in files['nodes']]
+                + ['--relationships={}'.format(path)
+                   for path in files['relationships']]))
+
+        return files
@@ -1,3 +1,5 @@
+from collections import namedtuple
+
 from py2neo.ogm import GraphObject, Property, Related
 
 
@@ -81,9 +83,10 @@ class NICEWorkrole(GraphObject):
 class NICECompetencyGroup(GraphObject):
     """Neo4j Graph Object (node) representing a NICE Competency Group
     """
-    #__primarykey__ = "id"
+    # Competency Group ID removed in 30 June 2020 update, groups are now
+    # identified by name
+    __primarykey__ = "name"
 
-    # Competency Group ID removed in 30 June 2020 update
     # id = Property()
     name = Property()
 
@@ -111,3 +114,159 @@ class KSAT(GraphObject):
 
     nice_workrole = Related(NICEWorkrole)
     nice_competency = Related(NICECompetency)
+
+
+def node_classes():
+    """Get all of the Neo4j Graph Object (node) classes defined in this module
+
+    :return: list of GraphObject subclasses
+    :rtype: list
+    """
+
+    return [
+        obj for obj in globals().values()
+        if isinstance(obj, type) and issubclass(obj, GraphObject)
+        and obj is not GraphObject]
+
+
+class NodeRecord(tuple):
+    """Base class of the compact, immutable node records generated from the
+    graph object classes by `record_type`. Records carry the same primary
+    label and primary key as their graph object class, without the cost of
+    building a py2neo node per row.
+    """
+    __slots__ = ()
+
+    @property
+    def __primaryvalue__(self):
+        return getattr(self, self.__primarykey__)
+
+    @classmethod
+    def ref(cls, value):
+        """Get a record carrying only the primary key, used to reference an
+        existing node as a relationship endpoint
+
+        :param value: primary key value
+        :return: record of this type
+        """
+
+        return cls(**{cls.__primarykey__: value})
+
+    def properties(self):
+        """Get the properties of the node that are set
+
+        :return: dict of property name to value
+        :rtype: dict
+        """
+
+        return {
+            key: value for key, value in zip(self._fields[:-1], self)
+            if value is not None}
+
+    def all_labels(self):
+        """Get the primary label and any additional labels of the node
+
+        :return: set of labels
+        :rtype: frozenset
+        """
+
+        return frozenset((self.__primarylabel__,) + tuple(self.labels))
+
+    def merge(self, other):
+        """Get a copy of this record updated with every property and label set
+        on another record of the same node
+
+        :param other: record of the same type
+        :return: merged record
+        """
+
+        return self._replace(
+            labels=tuple(sorted(set(self.labels) | set(other.labels))),
+            **other.properties())
+
+
+def record_type(node_class):
+    """Generate a node record type from a graph object class. The primary key
+    is the first field, followed by every other property and a final
+    `labels` field holding additional labels.
+
+    :param node_class: GraphObject subclass
+    :type node_class: type
+    :return: NodeRecord subclass
+    :rtype: type
+    """
+
+    keys = [
+        attr.key or name for name, attr in vars(node_class).items()
+        if isinstance(attr, Property)]
+    keys.remove(node_class.__primarykey__)
+    fields = [node_class.__primarykey__] + keys + ['labels']
+
+    name = node_class.__name__ + 'Record'
+    base = namedtuple(
+        name, fields, defaults=(None,) * (len(fields) - 1) + ((),),
+        module=__name__)
+
+    return type(name, (base, NodeRecord), {
+        '__slots__': (),
+        '__primarylabel__': node_class.__primarylabel__,
+        '__primarykey__': node_class.__primarykey__
+    })
+
+
+class Relationship(namedtuple(
+        'Relationship', ['start', 'type', 'end', 'properties'],
+        defaults=(None,))):
+    """Relationship between two node records, with optional properties
+    """
+    __slots__ = ()
+
+
+record_types = {node_class: record_type(node_class)
+                for node_class in node_classes()}
+
+NISTFunctionRecord = record_types[NISTFunction]
+NISTCategoryRecord = record_types[NISTCategory]
+NISTSubCategoryRecord = record_types[NISTSubCategory]
+NISTReferenceRecord = record_types[NISTReference]
+NICECategoryRecord = record_types[NICECategory]
+NICESpecialtyAreaRecord = record_types[NICESpecialtyArea]
+NICEWorkroleRecord = record_types[NICEWorkrole]
+NICECompetencyGroupRecord = record_types[NICECompetencyGroup]
+NICECompetencyRecord = record_types[NICECompetency]
+KSATRecord = record_types[KSAT]
+
+
+def as_record(node):
+    """Convert a graph object into a node record, records are returned as is
+
+    :param node: GraphObject or NodeRecord instance
+    :return: node record
+    :rtype: class 'cwf2neo.graph_objects.NodeRecord'
+    """
+
+    if isinstance(node, NodeRecord):
+        return node
+
+    record = record_types[type(node)]
+    labels = set(node.__node__.labels) - {record.__primarylabel__}
+    return record(labels=tuple(sorted(labels)), **dict(node.__node__))
+
+
+def as_relationship(relationship):
+    """Convert a relationship tuple of (start, type, end) with optional
+    properties into a relationship between node records
+
+    :param relationship: relationship tuple
+    :type relationship: tuple
+    :return: relationship between node records
+    :rtype: class 'cwf2neo.graph_objects.Relationship'
+    """
+
+    if isinstance(relationship, Relationship):
+        return relationship
+
+    return Relationship(
+        as_record(relationship[0]), relationship[1],
+        as_record(relationship[2]),
+        relationship[3] if len(relationship) == 4 else None)
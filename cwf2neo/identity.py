@@ -0,0 +1,165 @@
+import logging
+from collections import OrderedDict
+
+from cwf2neo.state import node_fingerprint
+
+log = logging.getLogger(__name__)
+
+
+def node_identity(node):
+    """Get the identity of a node, unique across all node classes
+
+    :param node: node record
+    :type node: class 'cwf2neo.graph_objects.NodeRecord'
+    :return: tuple of (primary label, primary value)
+    :rtype: tuple
+    """
+
+    return (node.__primarylabel__, node.__primaryvalue__)
+
+
+class IdentityMap(object):
+    """Per-run map of every node and relationship already sent to the
+    database, used to collapse duplicates on the client before they become
+    redundant MERGE work on the server.
+
+    When given the state of a previous import, nodes and relationships that
+    were already written by that import are skipped as well.
+    """
+
+    def __init__(self, previous=None):
+        """Constructor for initial setup
+
+        :param previous: state of the last import into the same database,
+         defaults to None for a full import
+        :type previous: class 'cwf2neo.state.ImportState', optional
+        """
+        self.__nodes = {}
+        self.__payloads = {}
+        self.__relationships = set()
+        self.__previous_nodes = previous.nodes if previous else {}
+        self.__previous_relationships = \
+            previous.relationships if previous else set()
+        self.eliminated_nodes = 0
+        self.eliminated_relationships = 0
+        self.unchanged_nodes = 0
+        self.unchanged_relationships = 0
+
+    def unique_nodes(self, nodes):
+        """Remove duplicate nodes and nodes that were already sent with the
+        same properties. Duplicates within `nodes` are collapsed into the
+        first occurrence, which receives the union of their properties and
+        labels.
+
+        :param nodes: node records
+        :type nodes: list
+        :return: nodes that still need to be sent to the database
+        :rtype: list
+        """
+
+        unique = OrderedDict()
+
+        for node in nodes:
+            identity = node_identity(node)
+            properties = node.properties()
+            sent = self.__nodes.setdefault(identity, {})
+
+            if identity in unique:
+                unique[identity] = unique[identity].merge(node)
+                self.eliminated_nodes += 1
+            elif sent and properties.items() <= sent.items():
+                self.eliminated_nodes += 1
+            else:
+                unique[identity] = node
+
+            sent.update(properties)
+
+        changed = []
+
+        for identity, node in unique.items():
+            fingerprint = node_fingerprint(
+                node.properties(), node.all_labels())
+            self.__payloads.setdefault(identity, set()).add(fingerprint)
+
+            if fingerprint in self.__previous_nodes.get(identity, ()):
+                self.unchanged_nodes += 1
+            else:
+                changed.append(node)
+
+        return changed
+
+    def unique_relationships(self, relationships):
+        """Remove relationships with a (start, type, end) that was already
+        seen during this run
+
+        :param relationships: relationships between node records
+        :type relationships: list
+        :return: relationships that still need to be sent to the database
+        :rtype: list
+        """
+
+        unique = []
+
+        for relationship in relationships:
+            identity = (
+                node_identity(relationship[0]),
+                relationship[1],
+                node_identity(relationship[2]))
+
+            if identity in self.__relationships:
+                self.eliminated_relationships += 1
+                continue
+
+            self.__relationships.add(identity)
+
+            if identity in self.__previous_relationships:
+                self.unchanged_relationships += 1
+            else:
+                unique.append(relationship)
+
+        return unique
+
+    def removed_nodes(self):
+        """Get the identities of nodes written by the previous import that
+        were not seen during this run
+
+        :return: set of (primary label, primary value) tuples
+        :rtype: set
+        """
+
+        return set(self.__previous_nodes) - set(self.__payloads)
+
+    def removed_relationships(self):
+        """Get the identities of relationships written by the previous import
+        that were not seen during this run
+
+        :return: set of (start identity, relationship type, end identity)
+         tuples
+        :rtype: set
+        """
+
+        return self.__previous_relationships - self.__relationships
+
+    def update_state(self, state):
+        """Record every node and relationship seen during this run in an
+        import state
+
+        :param state: import state to update
+        :type state: class 'cwf2neo.state.ImportState'
+        """
+
+        state.nodes = self.__payloads
+        state.relationships = self.__relationships
+
+    def report(self):
+        """Log how many duplicate rows were eliminated
+        """
+
+        log.info(
+            "Eliminated %d duplicate nodes and %d duplicate relationships",
+            self.eliminated_nodes, self.eliminated_relationships)
+
+        if self.__previous_nodes or self.__previous_relationships:
+            log.info(
+                "Skipped %d unchanged nodes and %d unchanged relationships",
+                self.unchanged_nodes, self.unchanged_relationships)
@@ -0,0 +1,223 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+
+class StageMetrics(object):
+    """Metrics recorded for a single import stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.elapsed = 0.0
+        self.rows = 0
+        # batch kind ('nodes', 'relationships', ...) -> batch metrics
+        self.batches = OrderedDict()
+        # py2neo summary counters, e.g. 'nodes_created', 'properties_set'
+        self.counters = OrderedDict()
+
+    def as_dict(self):
+        """Get the stage metrics as a dict, including derived rates
+
+        :return: stage metrics
+        :rtype: dict
+        """
+
+        batches = OrderedDict()
+        for kind, batch in self.batches.items():
+            batches[kind] = OrderedDict(batch)
+            batches[kind]['rows_per_second'] = \
+                batch['rows'] / batch['seconds'] if batch['seconds'] else 0.0
+            batches[kind]['mean_latency'] = \
+                batch['seconds'] / batch['count'] if batch['count'] else 0.0
+
+        return OrderedDict([
+            ('elapsed', self.elapsed),
+            ('rows', self.rows),
+            ('rows_per_second',
+             self.rows / self.elapsed if self.elapsed else 0.0),
+            ('batches', batches),
+            ('counters', OrderedDict(self.counters))
+        ])
+
+
+class Metrics(object):
+    """Timings and throughput of the import stages.
+
+    Stages run one after another, so rows and batches are recorded against
+    the stage that is currently running. Batches may be recorded from the
+    concurrent writer threads of that stage.
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.current = None
+        self.__lock = threading.Lock()
+
+    def __stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = StageMetrics(name)
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager timing an import stage. Stages can be nested, the
+        inner stage is current until it exits.
+
+        :param name: stage name
+        :type name: str
+        :return: the stage metrics
+        :rtype: class 'cwf2neo.metrics.StageMetrics'
+        """
+
+        with self.__lock:
+            stage = self.__stage(name)
+        previous = self.current
+        self.current = stage
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.elapsed += time.perf_counter() - start
+            self.current = previous
+            log.info("Stage {} took {:.3f}s".format(name, stage.elapsed))
+
+    def __current(self):
+        return self.current or self.__stage('other')
+
+    def count(self, rows=1):
+        """Count rows parsed by the current stage
+
+        :param rows: number of rows, defaults to 1
+        :type rows: int, optional
+        """
+
+        with self.__lock:
+            self.__current().rows += rows
+
+    def batch(self, kind, rows, seconds, stats=None):
+        """Record a batch sent to the database by the current stage
+
+        :param kind: kind of batch, e.g. 'nodes' or 'relationships'
+        :type kind: str
+        :param rows: rows in the batch
+        :type rows: int
+        :param seconds: server round trip time
+        :type seconds: float
+        :param stats: py2neo query statistics, defaults to None
+        :type stats: dict, optional
+        """
+
+        with self.__lock:
+            stage = self.__current()
+            batch = stage.batches.setdefault(kind, OrderedDict([
+                ('count', 0), ('rows', 0), ('seconds', 0.0),
+                ('max_latency', 0.0)]))
+            batch['count'] += 1
+            batch['rows'] += rows
+            batch['seconds'] += seconds
+            batch['max_latency'] = max(batch['max_latency'], seconds)
+
+            for key, value in (stats or {}).items():
+                if isinstance(value, bool) or not isinstance(value, int):
+                    continue
+                stage.counters[key] = stage.counters.get(key, 0) + value
+
+    def as_dict(self):
+        """Get all stage metrics as a dict
+
+        :return: stage name -> stage metrics
+        :rtype: dict
+        """
+
+        return OrderedDict(
+            (name, stage.as_dict()) for name, stage in self.stages.items())
+
+    def to_json(self):
+        """Export the metrics as JSON
+
+        :return: JSON document
+        :rtype: str
+        """
+
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self):
+        """Export the metrics in the Prometheus text exposition format
+
+        :return: Prometheus metrics
+        :rtype: str
+        """
+
+        metrics = OrderedDict()
+
+        def add(name, help_text, labels, value):
+            samples = metrics.setdefault(name, (help_text, []))[1]
+            samples.append((labels, value))
+
+        for name, stage in self.stages.items():
+            labels = [('stage', name)]
+            add('cwf2neo_stage_seconds', 'Time spent in the import stage',
+                labels, stage.elapsed)
+            add('cwf2neo_stage_rows_total', 'Rows parsed by the import stage',
+                labels, stage.rows)
+            for kind, batch in stage.batches.items():
+                batch_labels = labels + [('kind', kind)]
+                add('cwf2neo_batches_total', 'Batches sent to the database',
+                    batch_labels, batch['count'])
+                add('cwf2neo_batch_rows_total',
+                    'Rows sent to the database in batches',
+                    batch_labels, batch['rows'])
+                add('cwf2neo_batch_seconds_total',
+                    'Database round trip time of the batches',
+                    batch_labels, batch['seconds'])
+                add('cwf2neo_batch_seconds_max',
+                    'Slowest database round trip of a batch',
+                    batch_labels, batch['max_latency'])
+            for key, value in stage.counters.items():
+                add('cwf2neo_db_{}_total'.format(key),
+                    'Database {} reported by the query statistics'.format(
+                        key.replace('_', ' ')),
+                    labels, value)
+
+        lines = []
+        for name, (help_text, samples) in metrics.items():
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(
+                name, 'counter' if name.endswith('_total') else 'gauge'))
+            for labels, value in samples:
+                lines.append('{}{{{}}} {}'.format(name, ','.join(
+                    '{}="{}"'.format(label, text.replace('"', '\\"'))
+                    for label, text in labels), value))
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the metrics to a file, in the Prometheus text format if the
+        filename ends with '.prom' and as JSON otherwise
+
+        :param path: path of the file to write
+        :type path: str
+        """
+
+        with open(path, 'w') as f:
+            f.write(
+                self.to_prometheus() if path.endswith('.prom')
+                else self.to_json())
+
+    def report(self):
+        """Log a summary of the stage metrics"""
+
+        for name, stage in self.stages.items():
+            log.info("{}: {:.3f}s, {} rows ({:.0f} rows/s), {}".format(
+                name, stage.elapsed, stage.rows,
+                stage.rows / stage.elapsed if stage.elapsed else 0,
+                ', '.join(
+                    "{} {} batches ({:.3f}s)".format(
+                        batch['count'], kind, batch['seconds'])
+                    for kind, batch in stage.batches.items())
+                or 'no batches'))
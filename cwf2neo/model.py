@@ -0,0 +1,241 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+
+log = logging.getLogger(__name__)
+
+# Bump whenever the parsers change what they produce, so models parsed by an
+# older version are not replayed
+MODEL_VERSION = 2
+
+PICKLE_PROTOCOL = min(5, pickle.HIGHEST_PROTOCOL)
+
+# First frame of every cached model
+MODEL_HEADER = ('cwf2neo-model', MODEL_VERSION)
+
+
+class ParsedModel(object):
+    """Normalised output of parsing the data sources: the node records and
+    relationships written by each import stage and the node properties set
+    by key, in the order the stages produced them.
+
+    The model is a stream of pickle frames in a file, each holding a batch
+    of records, so neither recording nor replaying it keeps the whole model
+    in memory.
+    """
+
+    def __init__(self, file, path=None, batch_size=1000):
+        """Constructor for initial setup
+
+        :param file: binary file the frames are written to or read from
+        :type file: file object
+        :param path: path of the file, defaults to None
+        :type path: str, optional
+        :param batch_size: number of records per frame, defaults to 1000
+        :type batch_size: int, optional
+        """
+        self.file = file
+        self.path = path
+        self.batch_size = batch_size
+        # Records written or replayed so far
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Close the file of the model"""
+
+        self.file.close()
+
+    def __dump(self, frame):
+        pickle.dump(frame, self.file, protocol=PICKLE_PROTOCOL)
+
+    def write(self, stage, records):
+        """Record the node records and relationships of a write while they
+        are streamed through
+
+        :param stage: import stage name
+        :type stage: str
+        :param records: node records and relationships
+        :type records: iterable
+        :return: generator of the same records
+        :rtype: generator
+        """
+
+        batch = []
+        for record in records:
+            batch.append(record)
+            self.count += 1
+            if len(batch) >= self.batch_size:
+                self.__dump((stage, 'records', batch))
+                batch = []
+            yield record
+
+        # The last frame of a write ends it
+        self.__dump((stage, 'write', batch))
+
+    def bulk_set(self, stage, node_key, data):
+        """Record properties set on nodes by primary key
+
+        :param stage: import stage name
+        :type stage: str
+        :param node_key: tuple of (label, primary key)
+        :type node_key: tuple
+        :param data: (primary key value, dict of properties) tuples
+        :type data: iterable
+        :return: list of the same tuples
+        :rtype: list
+        """
+
+        data = list(data)
+        self.count += len(data)
+        self.__dump((stage, 'bulk_set', (tuple(node_key), data)))
+        return data
+
+    def operations(self):
+        """Read the recorded operations back, in the order they were
+        recorded. The records of each write have to be consumed before the
+        next operation is read.
+
+        :return: generator of (stage, 'write', generator of records) and
+         (stage, 'bulk_set', (node key, data)) tuples
+        :rtype: generator
+        """
+
+        while True:
+            try:
+                stage, kind, payload = pickle.load(self.file)
+            except EOFError:
+                return
+
+            if kind == 'bulk_set':
+                self.count += len(payload[1])
+                yield stage, kind, payload
+            else:
+                yield stage, 'write', self.__records(kind, payload)
+
+    def __records(self, kind, batch):
+        while True:
+            self.count += len(batch)
+            yield from batch
+            if kind == 'write':
+                return
+            _, kind, batch = pickle.load(self.file)
+
+    def __len__(self):
+        return self.count
+
+
+class ModelCache(object):
+    """Cache of the parsed model, keyed by the fingerprints of the data
+    sources it was parsed from. Only the model of the latest data sources is
+    kept.
+
+    The cache is a pickle file, so it must only be read from a directory
+    the user trusts, such as their own cache directory.
+    """
+
+    def __init__(self, directory):
+        """Constructor for initial setup
+
+        :param directory: directory the cache is stored in
+        :type directory: str
+        """
+        self.directory = directory
+
+    def path(self, sources):
+        """Get the cache file of the model parsed from the data sources
+
+        :param sources: dict of local filename to file fingerprint
+        :type sources: dict
+        :return: absolute path to the cache file
+        :rtype: str
+        """
+
+        key = hashlib.sha256(json.dumps(
+            [MODEL_VERSION, sources], sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.directory, '{}.pickle'.format(key))
+
+    def create(self):
+        """Start recording a model into a temporary file in the cache
+        directory, stored with `save` or removed with `discard`
+
+        :return: the model being recorded
+        :rtype: class 'cwf2neo.model.ParsedModel'
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory)
+        model = ParsedModel(os.fdopen(fd, 'wb'), temp_path)
+        pickle.dump(MODEL_HEADER, model.file, protocol=PICKLE_PROTOCOL)
+        return model
+
+    def load(self, sources):
+        """Open the model parsed from the data sources, to be replayed and
+        closed by the caller
+
+        :param sources: dict of local filename to file fingerprint
+        :type sources: dict
+        :return: the parsed model, or None if it isn't cached
+        :rtype: class 'cwf2neo.model.ParsedModel'
+        """
+
+        path = self.path(sources)
+
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+
+        try:
+            header = pickle.load(f)
+        except Exception as err:
+            header = err
+        if header != MODEL_HEADER:
+            f.close()
+            log.warning("Ignoring unreadable model cache {}: {}".format(
+                path, header))
+            return None
+
+        log.info("Loaded parsed model from {}".format(path))
+        return ParsedModel(f, path)
+
+    def save(self, sources, model):
+        """Atomically store the model recorded from the data sources,
+        removing models of older data sources
+
+        :param sources: dict of local filename to file fingerprint
+        :type sources: dict
+        :param model: the model returned by `create`
+        :type model: class 'cwf2neo.model.ParsedModel'
+        """
+
+        path = self.path(sources)
+
+        model.close()
+        os.replace(model.path, path)
+        model.path = path
+
+        for old_path in glob.glob(os.path.join(self.directory, '*.pickle')):
+            if old_path != path:
+                os.remove(old_path)
+
+        log.info("Saved parsed model to {}".format(path))
+
+    def discard(self, model):
+        """Remove a model that wasn't completely recorded
+
+        :param model: the model returned by `create`
+        :type model: class 'cwf2neo.model.ParsedModel'
+        """
+
+        model.close()
+        os.unlink(model.path)
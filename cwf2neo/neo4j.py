@@ -1,74 +1,519 @@
 import os
 import logging
+import threading
+import time
 
 from py2neo import Graph
-from py2neo.bulk import merge_nodes, merge_relationships
+from py2neo.cypher import cypher_escape
+from py2neo.cypher.queries import (unwind_create_nodes_query,
+                                   unwind_create_relationships_query,
+                                   unwind_merge_nodes_query,
+                                   unwind_merge_relationships_query)
 from py2neo.errors import *
-from itertools import islice
+from cwf2neo.graph_objects import as_record
+from cwf2neo.batching import BatchSizer, WriterPool
+from cwf2neo.metrics import Metrics
+from cwf2neo.pipeline import group_relationships
+from cwf2neo.sinks import Sink
+from itertools import chain
 
 log = logging.getLogger(__name__)
 
 
-class Neo4j(object):
+def node_key(node):
+    """Get the (label, primary key) tuple used to match a node
 
-    def __init__(self, **kwargs):
+    :param node: node record or GraphObject instance
+    :return: tuple of (primary label, primary key)
+    :rtype: tuple
+    """
+
+    return (node.__primarylabel__, node.__primarykey__)
+
+
+def target_name(target):
+    """Get the name of a target database, used to keep its import state
+
+    :param target: dict with the 'host', 'port' and optional 'database' of
+     the target
+    :type target: dict
+    :return: e.g. 'localhost:7687' or 'localhost:7687/staging'
+    :rtype: str
+    """
+
+    name = '{}:{}'.format(target['host'], target['port'])
+    if target.get('database'):
+        name += '/' + target['database']
+    return name
+
+
+class Neo4j(Sink):
+    """Sink merging the parsed NICE CWF into a Neo4j database over Bolt"""
+
+    def __init__(self, batch_size=1000, adaptive_batch_size=False,
+                 target_latency=0.5, writers=1, metrics=None,
+                 resolve_node_ids=True, **kwargs):
         log.info("Neo4j connection settings: {}".format(kwargs))
         self.graph = Graph(**kwargs)
+        self.metrics = metrics or Metrics()
+        # Number of imports completed through this connection, read by the
+        # query cache to know when its results are stale
+        self.generation = 0
+        # CREATE instead of MERGE, see set_fresh
+        self.fresh = False
+        # node key -> primary key values of the nodes created by this load
+        self.__created = {}
+        # Match relationship endpoints by node id instead of by primary key
+        self.resolve_node_ids = resolve_node_ids
+        # node key -> {primary key value -> node id}, for the node keys in
+        # __prefetched complete with every node in the database
+        self.__node_ids = {}
+        self.__prefetched = set()
+        self.__lock = threading.Lock()
+        self.writer_pool = WriterPool(
+            writers=writers,
+            sizer=BatchSizer(
+                batch_size=batch_size,
+                adaptive=adaptive_batch_size,
+                target_latency=target_latency),
+            retry_errors=(TransientError,))
+
+    def create_schema(self, node_classes, timeout=300):
+        """Create a uniqueness constraint (and its backing index) on the
+        primary key of each node class, then wait for all indexes to come
+        online. Safe to run against a database that already has the schema.
+
+        :param node_classes: GraphObject classes to create the schema for
+        :type node_classes: list
+        :param timeout: seconds to wait for the indexes to come online,
+         defaults to 300
+        :type timeout: int, optional
+        """
+
+        for node_class in node_classes:
+            label = node_class.__primarylabel__
+            key = node_class.__primarykey__
+
+            if key == '__id__':
+                raise ValueError(
+                    "Node class {} has no primary key to index".format(
+                        node_class.__name__))
+
+            log.info("Creating schema for {}.{}".format(label, key))
+
+            try:
+                self.__create_constraint(label, key)
+            except DatabaseError as err:
+                # Existing data violates the constraint, settle for an index
+                log.warning(
+                    "Unable to create constraint on {}.{}, creating an index "
+                    "instead: {}".format(label, key, err))
+                self.__create_index(label, key)
+
+        self.graph.run("CALL db.awaitIndexes($timeout)", timeout=timeout)
+
+    def __create_constraint(self, label, key):
+        name = "{}_{}_unique".format(label, key).lower()
+        try:
+            self.graph.run(
+                "CREATE CONSTRAINT {} IF NOT EXISTS FOR (n:{}) "
+                "REQUIRE n.{} IS UNIQUE".format(
+                    name, cypher_escape(label), cypher_escape(key)))
+        except ClientError as err:
+            if err.code != 'Neo.ClientError.Statement.SyntaxError':
+                raise err
+            # Neo4j < 4.4 syntax
+            self.graph.run(
+                "CREATE CONSTRAINT {} IF NOT EXISTS ON (n:{}) "
+                "ASSERT n.{} IS UNIQUE".format(
+                    name, cypher_escape(label), cypher_escape(key)))
+
+    def __create_index(self, label, key):
+        name = "{}_{}_index".format(label, key).lower()
+        self.graph.run(
+            "CREATE INDEX {} IF NOT EXISTS FOR (n:{}) ON (n.{})".format(
+                name, cypher_escape(label), cypher_escape(key)))
+
+    def create_fulltext_index(self, name, labels, properties):
+        """Create a fulltext index on the properties of nodes with any of the
+        labels, unless an index with the same name already exists
+
+        :param name: index name
+        :type name: str
+        :param labels: node labels
+        :type labels: list
+        :param properties: node properties
+        :type properties: list
+        """
+
+        try:
+            self.graph.run(
+                "CALL db.index.fulltext.createNodeIndex("
+                "$name, $labels, $properties)",
+                name=name, labels=labels, properties=properties)
+        except ClientError as err:
+            if err.code == 'Neo.ClientError.Procedure.ProcedureCallFailed':
+                log.info('{} index already exists'.format(name))
+            else:
+                raise err
+
+    def is_empty(self):
+        """Check if the database has no nodes at all
+
+        :return: True if the database is empty
+        :rtype: bool
+        """
+
+        return self.graph.run("MATCH (n) RETURN id(n) LIMIT 1").evaluate() \
+            is None
+
+    def set_fresh(self, fresh=None):
+        """Choose how nodes and relationships are written. A fresh load
+        CREATEs them instead of paying for the lookups of MERGE on every row,
+        which is only correct when the database starts out empty and every
+        relationship is written once, as the identity map ensures.
+
+        :param fresh: True to CREATE, False to MERGE, defaults to None to
+         CREATE only if the database is empty
+        :type fresh: bool, optional
+        :return: True if nodes and relationships are created
+        :rtype: bool
+        """
+
+        if fresh is None:
+            fresh = self.is_empty()
+
+        self.fresh = fresh
+        self.__created = {}
+
+        log.info("Writing to {} with {}".format(
+            self.graph.name, 'CREATE' if fresh else 'MERGE'))
+        return fresh
+
+    def import_completed(self):
+        """Mark an import into the database as completed, invalidating the
+        cached results of queries made through this connection and the
+        cached node ids. Later writes merge, the database is no longer empty.
+        """
+
+        self.generation += 1
+        self.fresh = False
+
+        with self.__lock:
+            self.__node_ids = {}
+            self.__prefetched = set()
+
+    def close(self):
+        """Stop the writer threads once all pending batches are written"""
+
+        self.writer_pool.shutdown()
+
+    def node_ids(self, node_key):
+        """Get the ids of every node of a label by primary key. The ids are
+        fetched in one streaming query the first time, then kept up to date
+        with the nodes written through this connection.
+
+        :param node_key: tuple of (label, primary key)
+        :type node_key: tuple
+        :return: dict of primary key value to node id
+        :rtype: dict
+        """
+
+        with self.__lock:
+            if node_key in self.__prefetched:
+                return self.__node_ids[node_key]
+
+        label, key = node_key
+        cursor = self.graph.run(
+            "MATCH (n:{0}) WHERE n.{1} IS NOT NULL "
+            "RETURN n.{1}, id(n)".format(
+                cypher_escape(label), cypher_escape(key)))
+
+        ids = {}
+        for value, node_id in cursor:
+            ids[value] = node_id
+
+        with self.__lock:
+            # Ids returned by node writes meanwhile are just as current
+            ids.update(self.__node_ids.get(node_key, {}))
+            self.__node_ids[node_key] = ids
+            self.__prefetched.add(node_key)
+
+        log.info("Fetched {} {} node ids".format(len(ids), label))
+        return ids
+
+    def __remember_node_ids(self, node_key, records):
+        with self.__lock:
+            ids = self.__node_ids.setdefault(node_key, {})
+            for record in records:
+                ids[record['key']] = record['id']
+
+    def __node_query(self, node_key, query):
+        """Return the primary key and id of every node written by a query,
+        when relationship endpoints are resolved by node id
+        """
+
+        statement, parameters = query
+        if self.resolve_node_ids:
+            statement += "\nRETURN _.{} AS key, id(_) AS id".format(
+                cypher_escape(node_key[1]))
+        return statement, parameters
 
     def add_nodes(self, nodes):
-        data = []
+        """Merge nodes of the same class into the database. Nodes are matched
+        on their primary key and all other properties are set. The nodes are
+        streamed to the database in batches as they are consumed.
+
+        :param nodes: node records of the same type and labels
+        :type nodes: iterable
+        """
+
+        nodes = map(as_record, nodes)
+        first = next(nodes, None)
+
+        if first is None:
+            return
 
         log.info("Sending bulk nodes to the database")
 
+        merge_key = node_key(first)
+        labels = set(first.labels)
+        self.__merge_nodes(
+            self.__node_data(chain([first], nodes)), merge_key, labels=labels)
+
+    def __node_data(self, nodes):
         for node in nodes:
-            data.append(dict(node.__node__))
-        
-        if data:
-            merge_key = tuple([list(nodes[0].__node__._labels)[0]] + list(nodes[0].__node__.keys()))
-            self.__merge_nodes(data, merge_key, labels=nodes[0].__node__._labels)
-    
+            if node.__primaryvalue__ is None:
+                log.warning("Skipping node without a primary key: {}".format(
+                    node.properties()))
+                continue
+            yield node.properties()
+
+    def __run(self, kind, batch, statement, parameters=None):
+        """Run a batch statement, recording its round trip time and query
+        statistics against the current import stage
+
+        :return: list of the returned records
+        :rtype: list
+        """
+        start = time.perf_counter()
+        cursor = self.graph.auto().run(statement, parameters)
+        records = list(cursor)
+        self.metrics.batch(
+            kind, len(batch), time.perf_counter() - start, cursor.stats())
+        return records
+
     def __merge_nodes(self, data, merge_key=('pk'), labels=None):
-        stream = iter(data)
-        batch_size = 1000
+        def write(batch):
+            if self.fresh:
+                batch = self.__create_nodes(batch, merge_key, labels)
+                if not batch:
+                    return
+            records = self.__run('nodes', batch, *self.__node_query(
+                merge_key, unwind_merge_nodes_query(batch, merge_key, labels)))
+            self.__remember_node_ids(merge_key, records)
 
-        while True:
-            batch = list(islice(stream, batch_size))
-            if batch:
-                merge_nodes(self.graph.auto(), batch, merge_key, labels)
-            else:
-                break
+        self.writer_pool.write_all(data, write)
 
-    def add_relationships(self, relationships):
-        data = []
+    def __create_nodes(self, batch, merge_key, labels=None):
+        """Create the nodes of a batch that weren't created yet by this load
+
+        :return: the nodes that were already created, to be merged
+        :rtype: list
+        """
+
+        label, key = merge_key
+        new = []
+        existing = []
+
+        with self.__lock:
+            created = self.__created.setdefault(merge_key, set())
+            for properties in batch:
+                if properties[key] in created:
+                    existing.append(properties)
+                else:
+                    created.add(properties[key])
+                    new.append(properties)
+
+        if new:
+            records = self.__run('nodes', new, *self.__node_query(
+                merge_key, unwind_create_nodes_query(
+                    new, labels={label} | set(labels or ()))))
+            self.__remember_node_ids(merge_key, records)
+
+        return existing
+
+    def bulk_set(self, node_key, data):
+        """Set properties on existing nodes matched by primary key, sent in
+        UNWIND batches instead of one query per node
+
+        :param node_key: tuple of (label, primary key)
+        :type node_key: tuple
+        :param data: (primary key value, dict of properties) tuples
+        :type data: iterable
+        :return: tuple of (matched, unmatched) lists of primary key values
+        :rtype: tuple
+        """
+
+        label, key = node_key
+        statement = "UNWIND $data AS r MATCH (n:{} {{{}: r[0]}}) " \
+            "SET n += r[1] RETURN r[0] AS key".format(
+                cypher_escape(label), cypher_escape(key))
+
+        matched = []
+        unmatched = []
+
+        log.info("Sending bulk {} updates to the database".format(label))
+
+        def write(batch):
+            found = set(
+                record['key'] for record in self.__run(
+                    'set', batch, statement,
+                    {'data': [list(r) for r in batch]}))
+            for value, _ in batch:
+                (matched if value in found else unmatched).append(value)
+
+        self.writer_pool.write_all(data, write)
 
-        for relationship in relationships:
-            relationship_details = relationship[3] if len(relationship) == 4 else {}
+        if unmatched:
+            log.warning("No {} nodes found with {}: {}".format(
+                label, key, ', '.join(map(str, unmatched))))
 
-            data.append((tuple(relationship[0].__node__.values()), relationship_details, tuple(relationship[2].__node__.values())))
+        return matched, unmatched
 
-        if data:
-            start_node_key = [list(relationships[0][0].__node__._labels)[0],] + list(relationships[0][0].__node__.keys())
-            end_node_key = [list(relationships[0][2].__node__._labels)[0],] + list(relationships[0][2].__node__.keys())
+    def delete_nodes(self, node_key, values):
+        """Delete nodes, and their relationships, by primary key
 
-            self.__merge_relationships(data, relationships[0][1], tuple(start_node_key), tuple(end_node_key))
+        :param node_key: tuple of (label, primary key)
+        :type node_key: tuple
+        :param values: primary key values of the nodes to delete
+        :type values: list
+        """
 
-    def __merge_relationships(self, data, merge_key, start_node_key, end_node_key):
-        stream = iter(data)
-        batch_size = 1000
+        label, key = node_key
+        statement = "UNWIND $data AS r MATCH (n:{} {{{}: r}}) " \
+            "DETACH DELETE n".format(cypher_escape(label), cypher_escape(key))
 
+        log.info("Deleting {} {} nodes".format(len(values), label))
+
+        def write(batch):
+            self.__run('delete_nodes', batch, statement, {'data': batch})
+            with self.__lock:
+                ids = self.__node_ids.get(node_key, {})
+                for value in batch:
+                    ids.pop(value, None)
+
+        self.writer_pool.write_all(values, write)
+
+    def delete_relationships(self, rel_type, start_node_key, end_node_key,
+                             data):
+        """Delete relationships of a single type by the primary keys of their
+        endpoints
+
+        :param rel_type: relationship type
+        :type rel_type: str
+        :param start_node_key: tuple of (label, primary key) of the start node
+        :type start_node_key: tuple
+        :param end_node_key: tuple of (label, primary key) of the end node
+        :type end_node_key: tuple
+        :param data: (start value, end value) tuples
+        :type data: list
+        """
+
+        statement = "UNWIND $data AS r " \
+            "MATCH (a:{} {{{}: r[0]}})-[x:{}]->(b:{} {{{}: r[1]}}) " \
+            "DELETE x".format(
+                cypher_escape(start_node_key[0]),
+                cypher_escape(start_node_key[1]),
+                cypher_escape(rel_type),
+                cypher_escape(end_node_key[0]),
+                cypher_escape(end_node_key[1]))
+
+        log.info("Deleting {} {} relationships".format(len(data), rel_type))
+
+        def write(batch):
+            self.__run('delete_relationships', batch, statement,
+                       {'data': [list(r) for r in batch]})
+
+        self.writer_pool.write_all(data, write)
+
+    def add_relationships(self, relationships):
+        """Merge relationships into the database. Relationships of any types
+        are partitioned in one pass into groups of the same type and endpoint
+        labels, and each group is streamed to the database in batches of its
+        own. Relationship endpoints are matched on their primary key only.
+
+        :param relationships: relationships between node records, or tuples
+         of (start node, relationship type, end node) with an optional dict
+         of relationship properties
+        :type relationships: iterable
+        """
+
+        # Fill every writer before a group is sent
+        group_size = self.writer_pool.sizer.size * self.writer_pool.writers
+
+        for (rel_type, start_node_key, end_node_key), group in \
+                group_relationships(relationships, group_size):
+            data = [
+                (relationship.start.__primaryvalue__,
+                 relationship.properties or {},
+                 relationship.end.__primaryvalue__)
+                for relationship in group]
+
+            self.__merge_relationships(
+                data, rel_type, start_node_key, end_node_key)
+
+    def __merge_relationships(self, data, merge_key, start_node_key,
+                              end_node_key):
         log.info("Sending bulk relationships to the database")
 
-        while True:
-            batch = list(islice(stream, batch_size))
-            if batch:
-                merge_relationships(
-                    self.graph.auto(),
+        query = unwind_create_relationships_query if self.fresh \
+            else unwind_merge_relationships_query
+
+        def writer(start_node_key, end_node_key):
+            def write(batch):
+                # Lock the endpoints in the same order in every concurrent
+                # batch to keep relationship MERGE deadlocks to a minimum
+                batch.sort(key=lambda r: (str(r[0]), str(r[2])))
+                self.__run('relationships', batch, *query(
                     batch,
                     merge_key,
                     start_node_key=start_node_key,
                     end_node_key=end_node_key
-                )
-            else:
-                break
+                ))
+            return write
+
+        if not self.resolve_node_ids:
+            self.writer_pool.write_all(
+                data, writer(start_node_key, end_node_key))
+            return
+
+        # Match the endpoints by node id instead of looking up the primary
+        # key index of both endpoints for every relationship
+        unresolved = []
+        self.writer_pool.write_all(
+            self.__by_node_id(
+                data, self.node_ids(start_node_key),
+                self.node_ids(end_node_key), unresolved),
+            writer(None, None))
+
+        if unresolved:
+            log.info("Matching {} relationships without known node ids by "
+                     "primary key".format(len(unresolved)))
+            self.writer_pool.write_all(
+                unresolved, writer(start_node_key, end_node_key))
+
+    def __by_node_id(self, data, start_ids, end_ids, unresolved):
+        """Replace the endpoint primary keys of relationship rows with node
+        ids. Rows with an endpoint without a known id, e.g. a node written
+        by another client since the ids were fetched, are added to
+        `unresolved` to be matched by primary key instead.
+        """
 
-        
\ No newline at end of file
+        for start, properties, end in data:
+            start_id = start_ids.get(start)
+            end_id = end_ids.get(end)
+            if start_id is None or end_id is None:
+                unresolved.append((start, properties, end))
+                continue
+            yield (start_id, properties, end_id)
@@ -0,0 +1,84 @@
+import re
+
+# Patterns are compiled once at import instead of on every spreadsheet row
+KSAT_PATTERN = re.compile(r"((?:K|S|A|T)[0-9]{4})", re.IGNORECASE)
+NIST_FUNCTION_PATTERN = re.compile(r"([A-Z]+) \(([A-Z][A-Z])\)")
+NIST_CATEGORY_PATTERN = re.compile(r"([a-zA-Z, ]+) \(([\S.]+)\):[ \n]?(.*)")
+NIST_SUBCATEGORY_PATTERN = re.compile(r"([A-Z][A-Z].[A-Z][A-Z]-[0-9]+): (.*)")
+SPECIALTY_AREA_PATTERN = re.compile(r"([a-zA-Z &,/-]+) \(([A-Z]{3})\)")
+WORKROLE_ID_PATTERN = re.compile(r"([A-Z]{2})-[A-Z]{3}-[0-9]{3}")
+WORKROLE_SHEET_PATTERN = re.compile(r"[A-Z]+-[A-Z]+-[0-9]+")
+
+KSAT_TYPES = {
+    'K': 'Knowledge',
+    'S': 'Skill',
+    'A': 'Ability',
+    'T': 'Task'
+}
+
+
+def find_ksats(value):
+    """Find all KSAT IDs in a cell value
+
+    :param value: spreadsheet cell value
+    :return: list of KSAT IDs, empty if the value contains none
+    :rtype: list
+    """
+
+    if not isinstance(value, str):
+        return []
+    return KSAT_PATTERN.findall(value)
+
+
+def ksat_type(ksat_id):
+    """Get the type of a KSAT from its ID
+
+    :param ksat_id: KSAT ID, e.g. 'K0001'
+    :type ksat_id: str
+    :return: 'Knowledge', 'Skill', 'Ability' or 'Task', None if the ID
+     isn't a KSAT ID
+    :rtype: str
+    """
+
+    return KSAT_TYPES.get(ksat_id[:1].upper())
+
+
+def classify_ksats(values):
+    """Find the first KSAT ID of each cell in a column
+
+    :param values: column of spreadsheet cell values
+    :type values: iterable
+    :return: list with a (KSAT ID, KSAT type) tuple for each value, or None
+     for values without a KSAT ID such as header rows
+    :rtype: list
+    """
+
+    search = KSAT_PATTERN.search
+    classified = []
+
+    for value in values:
+        m = search(value) if isinstance(value, str) else None
+        if m is None:
+            classified.append(None)
+        else:
+            ksat_id = m[1]
+            classified.append((ksat_id, KSAT_TYPES[ksat_id[0].upper()]))
+
+    return classified
+
+
+def parse_ksat_sheet(rows):
+    """Parse the KSATs of a work role sheet
+
+    :param rows: rows of the sheet, as lists of cell values
+    :type rows: list
+    :return: list of (KSAT ID, KSAT type, description) tuples, without the
+     header rows
+    :rtype: list
+    """
+
+    return [
+        classified + (row[1],)
+        for row, classified in zip(
+            rows, classify_ksats(row[0] for row in rows))
+        if classified is not None]
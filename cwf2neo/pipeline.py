@@ -0,0 +1,150 @@
+import logging
+from collections import OrderedDict
+
+from cwf2neo.graph_objects import NodeRecord, as_record, as_relationship
+
+log = logging.getLogger(__name__)
+
+
+def is_relationship(record):
+    """Check if a parsed record is a relationship rather than a node
+
+    :param record: node record, GraphObject instance or relationship tuple
+    :return: True if the record is a relationship tuple
+    :rtype: bool
+    """
+
+    return isinstance(record, tuple) and not isinstance(record, NodeRecord)
+
+
+def relationship_group(relationship):
+    """Get the key of the group of relationships a relationship is written
+    with: its type and the primary label and key of both endpoints
+
+    :param relationship: relationship between node records
+    :type relationship: class 'cwf2neo.graph_objects.Relationship'
+    :return: tuple of (relationship type, (start label, start key),
+     (end label, end key))
+    :rtype: tuple
+    """
+
+    return (
+        relationship.type,
+        (relationship.start.__primarylabel__,
+         relationship.start.__primarykey__),
+        (relationship.end.__primarylabel__, relationship.end.__primarykey__))
+
+
+def group_relationships(relationships, batch_size=1000):
+    """Partition a stream of relationships of any types, in one pass, into
+    groups of relationships that can be written by the same statement
+
+    :param relationships: relationships between node records, or tuples of
+     (start node, relationship type, end node) with an optional dict of
+     relationship properties, in any order
+    :type relationships: iterable
+    :param batch_size: largest group returned at once, defaults to 1000
+    :type batch_size: int, optional
+    :return: generator of (group key, list of relationships) tuples, a group
+     is returned as soon as it is full and the rest once the stream ends
+    :rtype: generator
+    """
+
+    groups = OrderedDict()
+
+    for relationship in map(as_relationship, relationships):
+        group = relationship_group(relationship)
+        batch = groups.setdefault(group, [])
+        batch.append(relationship)
+
+        if len(batch) >= batch_size:
+            yield group, groups.pop(group)
+
+    while groups:
+        yield groups.popitem(last=False)
+
+
+class BatchWriter(object):
+    """Consumes a stream of parsed nodes and relationships and writes them in
+    bounded batches, so parsing and database writes overlap and memory use
+    doesn't grow with the size of the source workbooks. GraphObject
+    instances are converted to node records as they are consumed.
+
+    Nodes are buffered per class and label set, relationships per type and
+    endpoint classes. All buffered nodes are written before any relationship
+    batch, so relationship endpoints always exist when they are matched.
+    """
+
+    def __init__(self, add_nodes, add_relationships, batch_size=1000):
+        """Constructor for initial setup
+
+        :param add_nodes: callable writing a list of nodes of the same class
+        :type add_nodes: callable
+        :param add_relationships: callable writing a list of relationships
+         of the same type
+        :type add_relationships: callable
+        :param batch_size: maximum number of records buffered per group,
+         defaults to 1000
+        :type batch_size: int, optional
+        """
+        self.add_nodes = add_nodes
+        self.add_relationships = add_relationships
+        self.batch_size = batch_size
+        self.__nodes = OrderedDict()
+        self.__relationships = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def write(self, records):
+        """Write every record of a stream
+
+        :param records: iterable of node records and relationships
+        :type records: iterable
+        """
+
+        for record in records:
+            if is_relationship(record):
+                self.add_relationship(record)
+            else:
+                self.add_node(record)
+
+    def add_node(self, node):
+        node = as_record(node)
+        group = (type(node), node.all_labels())
+        batch = self.__nodes.setdefault(group, [])
+        batch.append(node)
+
+        if len(batch) >= self.batch_size:
+            self.add_nodes(self.__nodes.pop(group))
+
+    def add_relationship(self, relationship):
+        relationship = as_relationship(relationship)
+        group = (relationship.type, type(relationship.start),
+                 type(relationship.end))
+        batch = self.__relationships.setdefault(group, [])
+        batch.append(relationship)
+
+        if len(batch) >= self.batch_size:
+            self.flush_nodes()
+            self.add_relationships(self.__relationships.pop(group))
+
+    def flush_nodes(self):
+        """Write all buffered nodes
+        """
+
+        while self.__nodes:
+            self.add_nodes(self.__nodes.popitem(last=False)[1])
+
+    def flush(self):
+        """Write all buffered nodes, then all buffered relationships
+        """
+
+        self.flush_nodes()
+
+        while self.__relationships:
+            self.add_relationships(self.__relationships.popitem(last=False)[1])
@@ -0,0 +1,259 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+KSATS_FOR_WORKROLES = """
+UNWIND $ids AS workrole_id
+MATCH (w:NICEWorkrole {id: workrole_id})<-[:NICE_WORKROLE]-(k:KSAT)
+WITH workrole_id, k ORDER BY k.id
+RETURN workrole_id, collect({
+    id: k.id,
+    description: k.description,
+    type: [label IN labels(k) WHERE label <> 'KSAT'][0]
+}) AS ksats
+"""
+
+WORKROLES_FOR_KSAT = """
+MATCH (k:KSAT {id: $id})-[:NICE_WORKROLE]->(w:NICEWorkrole)
+RETURN w.id AS id, w.title AS title, w.description AS description,
+    w.opm_code AS opm_code
+ORDER BY w.id
+"""
+
+COMPETENCIES_FOR_WORKROLE = """
+MATCH (w:NICEWorkrole {id: $id})<-[:NICE_WORKROLE]-(:KSAT)
+    -[:NICE_COMPETENCY]->(c:NICECompetency)
+RETURN DISTINCT c.id AS id, c.name AS name, c.description AS description
+ORDER BY c.id
+"""
+
+SEARCH_KSATS = """
+CALL db.index.fulltext.queryNodes($index, $text) YIELD node, score
+WHERE score >= $min_score
+RETURN node.id AS id, node.description AS description, score
+LIMIT $limit
+"""
+
+
+class QueryCache(object):
+    """Thread safe least recently used cache of query results, where each
+    result also expires a fixed number of seconds after it was fetched
+    """
+
+    def __init__(self, size=1024, ttl=300, clock=time.monotonic):
+        """Constructor for initial setup
+
+        :param size: maximum number of cached results, 0 disables caching,
+         defaults to 1024
+        :type size: int, optional
+        :param ttl: seconds a result is cached for, None to keep results until
+         they are evicted or invalidated, defaults to 300
+        :type ttl: float, optional
+        :param clock: function returning the current time in seconds,
+         defaults to time.monotonic
+        :type clock: function, optional
+        """
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        # key -> (expiry time, result), least recently used first
+        self.__results = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        """Get a cached result
+
+        :param key: query key
+        :type key: tuple
+        :return: tuple of (found, result)
+        :rtype: tuple
+        """
+
+        with self.__lock:
+            entry = self.__results.get(key)
+            if entry is not None and (
+                    entry[0] is None or entry[0] > self.clock()):
+                self.__results.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self.__results[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, result):
+        """Cache a result, evicting the least recently used results over the
+        size of the cache
+
+        :param key: query key
+        :type key: tuple
+        :param result: query result
+        """
+
+        if self.size <= 0:
+            return
+
+        expiry = self.clock() + self.ttl if self.ttl is not None else None
+        with self.__lock:
+            self.__results[key] = (expiry, result)
+            self.__results.move_to_end(key)
+            while len(self.__results) > self.size:
+                self.__results.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached result"""
+
+        with self.__lock:
+            self.__results.clear()
+
+    def __len__(self):
+        return len(self.__results)
+
+
+class FrameworkQueries(object):
+    """Read side of the imported framework: parameterised lookups backed by
+    the primary key constraints and the KSAT fulltext index, with the
+    results cached until an import into the same database completes
+    """
+
+    def __init__(self, db, cache_size=1024, ttl=300,
+                 fulltext_index='ksat_index'):
+        """Constructor for initial setup
+
+        :param db: connected database the framework was imported into
+        :type db: class 'cwf2neo.neo4j.Neo4j'
+        :param cache_size: maximum number of cached results, defaults to 1024
+        :type cache_size: int, optional
+        :param ttl: seconds a result is cached for, defaults to 300
+        :type ttl: float, optional
+        :param fulltext_index: name of the KSAT fulltext index, defaults to
+         'ksat_index'
+        :type fulltext_index: str, optional
+        """
+        self.db = db
+        self.fulltext_index = fulltext_index
+        self.cache = QueryCache(size=cache_size, ttl=ttl)
+        self.__generation = getattr(db, 'generation', 0)
+
+    def invalidate(self):
+        """Drop every cached result, e.g. after the database was imported
+        into by another process
+        """
+
+        log.debug("Invalidating the query cache")
+        self.cache.clear()
+
+    def __check_generation(self):
+        # The database counts the imports completed through it
+        generation = getattr(self.db, 'generation', 0)
+        if generation != self.__generation:
+            self.__generation = generation
+            self.invalidate()
+
+    def __data(self, statement, **parameters):
+        return self.db.graph.run(statement, **parameters).data()
+
+    def __cached(self, key, statement, **parameters):
+        self.__check_generation()
+        found, result = self.cache.get(key)
+        if not found:
+            result = self.__data(statement, **parameters)
+            self.cache.put(key, result)
+        return result
+
+    def ksats_for_workroles(self, workrole_ids):
+        """Get the KSATs of many work roles in a single round trip. Only the
+        work roles that aren't cached are sent to the database.
+
+        :param workrole_ids: work role IDs, e.g. ['SP-RSK-001']
+        :type workrole_ids: iterable
+        :return: dict of work role ID to a list of KSAT dicts with 'id',
+         'description' and 'type' keys, ordered by KSAT ID. Unknown work roles
+         have no KSATs.
+        :rtype: dict
+        """
+
+        self.__check_generation()
+
+        ksats = OrderedDict()
+        missing = []
+        for workrole_id in workrole_ids:
+            if workrole_id in ksats:
+                continue
+            found, result = self.cache.get(('ksats', workrole_id))
+            ksats[workrole_id] = result
+            if not found:
+                missing.append(workrole_id)
+
+        if missing:
+            fetched = dict(
+                (record['workrole_id'], record['ksats'])
+                for record in self.__data(KSATS_FOR_WORKROLES, ids=missing))
+            for workrole_id in missing:
+                ksats[workrole_id] = fetched.get(workrole_id, [])
+                self.cache.put(('ksats', workrole_id), ksats[workrole_id])
+
+        return ksats
+
+    def ksats_for_workrole(self, workrole_id):
+        """Get the KSATs of a work role
+
+        :param workrole_id: work role ID, e.g. 'SP-RSK-001'
+        :type workrole_id: str
+        :return: list of KSAT dicts with 'id', 'description' and 'type' keys,
+         ordered by KSAT ID
+        :rtype: list
+        """
+
+        return self.ksats_for_workroles([workrole_id])[workrole_id]
+
+    def workroles_for_ksat(self, ksat_id):
+        """Get the work roles requiring a KSAT
+
+        :param ksat_id: KSAT ID, e.g. 'K0001'
+        :type ksat_id: str
+        :return: list of work role dicts with 'id', 'title', 'description'
+         and 'opm_code' keys, ordered by work role ID
+        :rtype: list
+        """
+
+        return self.__cached(
+            ('workroles', ksat_id), WORKROLES_FOR_KSAT, id=ksat_id)
+
+    def competencies_for_workrole(self, workrole_id):
+        """Get the competencies of the KSATs of a work role
+
+        :param workrole_id: work role ID, e.g. 'SP-RSK-001'
+        :type workrole_id: str
+        :return: list of competency dicts with 'id', 'name' and 'description'
+         keys, ordered by competency ID
+        :rtype: list
+        """
+
+        return self.__cached(
+            ('competencies', workrole_id), COMPETENCIES_FOR_WORKROLE,
+            id=workrole_id)
+
+    def search_ksats(self, text, limit=10, min_score=0.0):
+        """Search the KSAT descriptions with the fulltext index
+
+        :param text: Lucene query, e.g. 'protecting Linux systems'
+        :type text: str
+        :param limit: maximum number of KSATs, defaults to 10
+        :type limit: int, optional
+        :param min_score: minimum relevance score, defaults to 0.0
+        :type min_score: float, optional
+        :return: list of dicts with 'id', 'description' and 'score' keys, most
+         relevant first
+        :rtype: list
+        """
+
+        return self.__cached(
+            ('search', text, limit, min_score), SEARCH_KSATS,
+            index=self.fulltext_index, text=text, limit=limit,
+            min_score=min_score)
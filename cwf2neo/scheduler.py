@@ -0,0 +1,227 @@
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+log = logging.getLogger(__name__)
+
+
+class Stage(object):
+    """Import stage: an optional parse step followed by a write step that
+    depends on the writes of other stages. The parse step can be split into
+    shards parsed separately and merged.
+    """
+
+    def __init__(self, name, write, parse=None, args=(), depends=(),
+                 shards=None, merge=None):
+        self.name = name
+        self.write = write
+        self.parse = parse
+        self.args = tuple(args)
+        self.depends = tuple(depends)
+        self.sharded = shards is not None
+        # Arguments of the parse function for each shard
+        self.shards = [tuple(shard) for shard in shards] \
+            if self.sharded else [self.args]
+        self.merge = merge or (lambda results: results[0])
+        self.parse_start = None
+        self.parse_end = None
+        self.write_start = None
+        self.write_end = None
+
+
+class StageScheduler(object):
+    """Runs import stages declared with the stages their writes depend on.
+
+    Parsing only reads the data sources, so every parse step is started at
+    once in a pool of worker processes, and each write is started as soon as
+    its stage is parsed and the writes it depends on have committed. Writes
+    run one at a time in the calling thread, each one can still send its
+    batches concurrently.
+
+    Without worker processes each stage is parsed while it is written, in
+    the order the stages were added.
+    """
+
+    def __init__(self, processes=0, initializer=None, clock=time.perf_counter):
+        """Constructor for initial setup
+
+        :param processes: number of worker processes parsing the stages, 0 to
+         parse in the calling thread, defaults to 0
+        :type processes: int, optional
+        :param initializer: function run by every worker process when it
+         starts, defaults to None
+        :type initializer: function, optional
+        :param clock: function returning the current time in seconds,
+         defaults to time.perf_counter
+        :type clock: function, optional
+        """
+        self.processes = processes
+        self.initializer = initializer
+        self.clock = clock
+        self.stages = OrderedDict()
+        self.start = None
+
+    def add(self, name, write, parse=None, args=(), depends=(), shards=None,
+            merge=None):
+        """Add a stage. Stages can only depend on stages added before them,
+        so the dependencies never form a cycle.
+
+        :param name: stage name
+        :type name: str
+        :param write: function writing the parsed stage, called with whatever
+         the parse function returned
+        :type write: function
+        :param parse: function parsing the stage, must be picklable when
+         parsing in worker processes, defaults to None
+        :type parse: function, optional
+        :param args: arguments of the parse function, defaults to ()
+        :type args: tuple, optional
+        :param depends: names of the stages to write first, defaults to ()
+        :type depends: tuple, optional
+        :param shards: arguments of the parse function for each shard of the
+         stage, parsed concurrently in the worker processes, instead of
+         `args`, defaults to None
+        :type shards: list, optional
+        :param merge: function merging the list of parsed shards, in the
+         order of the shards, into what is written, required with shards
+        :type merge: function, optional
+        """
+
+        if name in self.stages:
+            raise ValueError("Duplicate stage {}".format(name))
+        for dependency in depends:
+            if dependency not in self.stages:
+                raise ValueError("Stage {} depends on unknown stage {}".format(
+                    name, dependency))
+
+        if shards is not None and merge is None:
+            raise ValueError("Stage {} has shards but nothing to merge "
+                             "them".format(name))
+
+        self.stages[name] = Stage(
+            name, write, parse, args, depends, shards, merge)
+
+    def run(self):
+        """Run every stage"""
+
+        self.start = self.clock()
+
+        if self.processes <= 0:
+            for stage in self.stages.values():
+                # Parsed while it is written, the write includes the parse
+                stage.parse_start = stage.parse_end = \
+                    stage.write_start = self.clock()
+                stage.write(self.__parse(stage))
+                stage.write_end = self.clock()
+            self.report()
+            return
+
+        # Spawned workers don't inherit the locks of the writer threads
+        with ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=self.initializer) as executor:
+            self.__run(executor)
+
+        self.report()
+
+    def __parse(self, stage):
+        if stage.parse is None:
+            return None
+        if not stage.sharded:
+            return stage.parse(*stage.args)
+        return stage.merge([stage.parse(*shard) for shard in stage.shards])
+
+    def __parsed(self, stage):
+        def done(future):
+            stage.parse_end = max(stage.parse_end or 0, self.clock())
+        return done
+
+    def __run(self, executor):
+        # stage name -> futures of the parsed shards
+        futures = OrderedDict()
+        for stage in self.stages.values():
+            stage.parse_start = self.clock()
+            futures[stage.name] = []
+            if stage.parse is None:
+                stage.parse_end = stage.parse_start
+                continue
+            for shard in stage.shards:
+                future = executor.submit(stage.parse, *shard)
+                future.add_done_callback(self.__parsed(stage))
+                futures[stage.name].append(future)
+
+        written = set()
+        pending = list(self.stages.values())
+
+        while pending:
+            ready = [
+                stage for stage in pending
+                if all(dependency in written for dependency in stage.depends)]
+
+            # Write whichever ready stage was parsed first
+            stage = next((
+                stage for stage in ready
+                if all(future.done() for future in futures[stage.name])),
+                None)
+            if stage is None:
+                wait([
+                    future for stage in ready
+                    for future in futures[stage.name] if not future.done()],
+                    return_when=FIRST_COMPLETED)
+                continue
+
+            parsed = stage.merge([
+                future.result() for future in futures[stage.name]]) \
+                if stage.parse is not None else None
+
+            stage.write_start = self.clock()
+            stage.write(parsed)
+            stage.write_end = self.clock()
+
+            written.add(stage.name)
+            pending.remove(stage)
+
+    def critical_path(self):
+        """Get the chain of steps that determined how long the stages took.
+        Writes run one after another, so going back from the last write each
+        write either followed the previous write or waited for its own parse.
+
+        :return: tuple of (list of (stage name, 'parse' or 'write', seconds)
+         steps in the order they ran, total seconds)
+        :rtype: tuple
+        """
+
+        written = sorted(
+            (stage for stage in self.stages.values()
+             if stage.write_end is not None),
+            key=lambda stage: stage.write_start)
+        if not written:
+            return [], 0.0
+
+        path = []
+        for position in range(len(written) - 1, -1, -1):
+            stage = written[position]
+            path.append((stage.name, 'write',
+                         stage.write_end - stage.write_start))
+
+            previous_end = written[position - 1].write_end if position \
+                else self.start
+            if stage.parse_end > stage.parse_start \
+                    and stage.parse_end > previous_end:
+                path.append((stage.name, 'parse',
+                             stage.parse_end - stage.parse_start))
+                break
+
+        path.reverse()
+        return path, written[-1].write_end - self.start
+
+    def report(self):
+        """Log the critical path of the stages"""
+
+        path, total = self.critical_path()
+        log.info("Critical path {:.3f}s: {}".format(total, ' -> '.join(
+            "{} {} ({:.3f}s)".format(name, step, seconds)
+            for name, step, seconds in path)))
@@ -0,0 +1,411 @@
+import json
+import logging
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+
+from py2neo.cypher import cypher_escape, cypher_repr
+from cwf2neo.graph_objects import as_record, as_relationship
+from cwf2neo.pipeline import group_relationships
+
+log = logging.getLogger(__name__)
+
+
+class Sink(object):
+    """Base class of the backends the parsed NICE CWF is written to. The
+    import stages of `CWF` only depend on this interface, so the parse stage
+    can target a Neo4j database, an export file or an in-memory graph.
+    """
+
+    def create_schema(self, node_classes):
+        """Prepare the sink for the given node classes, nothing by default
+
+        :param node_classes: GraphObject classes that will be added
+        :type node_classes: list
+        """
+
+    def add_nodes(self, nodes):
+        """Merge nodes of the same class on their primary key
+
+        :param nodes: node records of the same type and labels
+        :type nodes: iterable
+        """
+
+        raise NotImplementedError
+
+    def add_relationships(self, relationships):
+        """Merge relationships between existing nodes. The relationships can
+        be of any types and endpoint labels, in any order.
+
+        :param relationships: relationships between node records, or tuples
+         of (start node, relationship type, end node) with an optional dict
+         of relationship properties
+        :type relationships: iterable
+        """
+
+        raise NotImplementedError
+
+    def bulk_set(self, node_key, data):
+        """Set properties on existing nodes matched by primary key
+
+        :param node_key: tuple of (label, primary key)
+        :type node_key: tuple
+        :param data: (primary key value, dict of properties) tuples
+        :type data: iterable
+        :return: tuple of (matched, unmatched) lists of primary key values
+        :rtype: tuple
+        """
+
+        raise NotImplementedError
+
+    def close(self):
+        """Flush anything still buffered, nothing by default"""
+
+
+class CypherScriptSink(Sink):
+    """Sink writing a Cypher script of UNWIND batches, which can be replayed
+    with `cypher-shell -f` without parsing the data sources again
+    """
+
+    def __init__(self, path, batch_size=1000):
+        """Constructor for initial setup
+
+        :param path: path of the script to write
+        :type path: str
+        :param batch_size: rows per UNWIND statement, defaults to 1000
+        :type batch_size: int, optional
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def __write(self, statement, rows):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.file.write("UNWIND {} AS r\n{};\n".format(
+                cypher_repr(batch), statement))
+
+    def create_schema(self, node_classes):
+        for node_class in node_classes:
+            if node_class.__primarykey__ == '__id__':
+                raise ValueError(
+                    "Node class {} has no primary key to index".format(
+                        node_class.__name__))
+            self.file.write(
+                "CREATE CONSTRAINT {} IF NOT EXISTS FOR (n:{}) "
+                "REQUIRE n.{} IS UNIQUE;\n".format(
+                    "{}_{}_unique".format(
+                        node_class.__primarylabel__,
+                        node_class.__primarykey__).lower(),
+                    cypher_escape(node_class.__primarylabel__),
+                    cypher_escape(node_class.__primarykey__)))
+
+    def add_nodes(self, nodes):
+        nodes = map(as_record, nodes)
+        first = next(nodes, None)
+
+        if first is None:
+            return
+
+        statement = "MERGE (n:{} {{{}: r.{}}}) SET n += r".format(
+            cypher_escape(first.__primarylabel__),
+            cypher_escape(first.__primarykey__),
+            cypher_escape(first.__primarykey__))
+        if first.labels:
+            statement += " SET n:{}".format(
+                ':'.join(map(cypher_escape, sorted(first.labels))))
+
+        self.__write(statement, (
+            node.properties() for node in chain([first], nodes)
+            if node.__primaryvalue__ is not None))
+
+    def add_relationships(self, relationships):
+        for (rel_type, start_node_key, end_node_key), group in \
+                group_relationships(relationships, self.batch_size):
+            statement = "MATCH (a:{} {{{}: r[0]}}) " \
+                "MATCH (b:{} {{{}: r[2]}}) " \
+                "MERGE (a)-[x:{}]->(b) SET x += r[1]".format(
+                    cypher_escape(start_node_key[0]),
+                    cypher_escape(start_node_key[1]),
+                    cypher_escape(end_node_key[0]),
+                    cypher_escape(end_node_key[1]),
+                    cypher_escape(rel_type))
+
+            self.__write(statement, (
+                [relationship.start.__primaryvalue__,
+                 relationship.properties or {},
+                 relationship.end.__primaryvalue__]
+                for relationship in group))
+
+    def bulk_set(self, node_key, data):
+        """Write the property updates to the script. Whether the nodes exist
+        is only known when replaying, so every key is reported as matched.
+        """
+        label, key = node_key
+        data = [[value, properties] for value, properties in data]
+
+        self.__write(
+            "MATCH (n:{} {{{}: r[0]}}) SET n += r[1]".format(
+                cypher_escape(label), cypher_escape(key)),
+            data)
+
+        return [value for value, _ in data], []
+
+    def close(self):
+        self.file.close()
+        log.info("Wrote Cypher script to {}".format(self.path))
+        return self.path
+
+
+class JSONLinesSink(Sink):
+    """Sink writing one JSON object per node, relationship or property
+    update, in the order they were parsed
+    """
+
+    def __init__(self, path):
+        """Constructor for initial setup
+
+        :param path: path of the JSON lines file to write
+        :type path: str
+        """
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def __write(self, obj):
+        self.file.write(json.dumps(obj, sort_keys=True))
+        self.file.write('\n')
+
+    def add_nodes(self, nodes):
+        for node in map(as_record, nodes):
+            if node.__primaryvalue__ is None:
+                continue
+            self.__write({
+                'type': 'node',
+                'labels': sorted(node.all_labels()),
+                'key': [node.__primarylabel__, node.__primarykey__],
+                'properties': node.properties()})
+
+    def add_relationships(self, relationships):
+        for relationship in map(as_relationship, relationships):
+            self.__write({
+                'type': 'relationship',
+                'rel_type': relationship.type,
+                'start': [relationship.start.__primarylabel__,
+                          relationship.start.__primaryvalue__],
+                'end': [relationship.end.__primarylabel__,
+                        relationship.end.__primaryvalue__],
+                'properties': relationship.properties or {}})
+
+    def bulk_set(self, node_key, data):
+        """Write the property updates. Whether the nodes exist is not checked,
+        so every key is reported as matched.
+        """
+        matched = []
+        for value, properties in data:
+            self.__write({
+                'type': 'set',
+                'key': list(node_key),
+                'value': value,
+                'properties': properties})
+            matched.append(value)
+
+        return matched, []
+
+    def close(self):
+        self.file.close()
+        log.info("Wrote JSON lines to {}".format(self.path))
+        return self.path
+
+
+class MemorySink(Sink):
+    """Sink building the graph in memory as dicts of nodes and adjacency
+    maps, used to run the parse stage without a database
+    """
+
+    def __init__(self):
+        # (label, primary key value) -> {'labels': set, 'properties': dict}
+        self.nodes = OrderedDict()
+        # (label, primary key value) -> {relationship type ->
+        # {(label, primary key value) -> properties}}
+        self.outgoing = {}
+        self.incoming = {}
+
+    def add_nodes(self, nodes):
+        for node in map(as_record, nodes):
+            if node.__primaryvalue__ is None:
+                continue
+            entry = self.nodes.setdefault(
+                (node.__primarylabel__, node.__primaryvalue__),
+                {'labels': set(), 'properties': {}})
+            entry['labels'].update(node.all_labels())
+            entry['properties'].update(node.properties())
+
+    def add_relationships(self, relationships):
+        for relationship in map(as_relationship, relationships):
+            start = (relationship.start.__primarylabel__,
+                     relationship.start.__primaryvalue__)
+            end = (relationship.end.__primarylabel__,
+                   relationship.end.__primaryvalue__)
+
+            # Relationships are only merged between existing nodes
+            if start not in self.nodes or end not in self.nodes:
+                continue
+
+            self.outgoing.setdefault(start, {}).setdefault(
+                relationship.type, {}).setdefault(end, {}).update(
+                    relationship.properties or {})
+            self.incoming.setdefault(end, {}).setdefault(
+                relationship.type, {}).setdefault(start, {}).update(
+                    relationship.properties or {})
+
+    def bulk_set(self, node_key, data):
+        label = node_key[0]
+        matched = []
+        unmatched = []
+
+        for value, properties in data:
+            entry = self.nodes.get((label, value))
+            if entry is None:
+                unmatched.append(value)
+                continue
+            entry['properties'].update(properties)
+            matched.append(value)
+
+        return matched, unmatched
+
+    def relationships(self):
+        """Get all relationships
+
+        :return: generator of (start, relationship type, end) tuples, where
+         each node is a (label, primary key value) tuple
+        :rtype: generator
+        """
+
+        for start, types in self.outgoing.items():
+            for rel_type, ends in types.items():
+                for end in ends:
+                    yield (start, rel_type, end)
+
+
+class FanoutSink(Sink):
+    """Sink writing everything to several target sinks concurrently, e.g.
+    staging and production databases loaded from a single parse.
+
+    Targets are isolated from each other: a target that fails is logged,
+    left out of every later write, and reported in `failed`, while the
+    other targets carry on. Each call waits for every target to finish, so
+    nodes are written to a target before the relationships depending on
+    them.
+    """
+
+    def __init__(self, sinks):
+        """Constructor for initial setup
+
+        :param sinks: dict of target name to sink
+        :type sinks: dict
+        """
+        self.sinks = OrderedDict(sinks)
+        self.failed = OrderedDict()
+        # target name -> number of rows written
+        self.progress = OrderedDict((name, 0) for name in self.sinks)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(len(self.sinks), 1),
+            thread_name_prefix='cwf2neo-fanout')
+
+    @property
+    def healthy(self):
+        """Names of the targets that haven't failed
+
+        :return: list of target names
+        :rtype: list
+        """
+
+        return [name for name in self.sinks if name not in self.failed]
+
+    def __fanout(self, method, *args):
+        # Iterators can only be consumed once, share a list between targets
+        args = [list(arg) if isinstance(arg, Iterator) else arg
+                for arg in args]
+        rows = next((len(arg) for arg in args if isinstance(arg, list)), 0)
+
+        futures = OrderedDict(
+            (name, self.executor.submit(
+                getattr(self.sinks[name], method), *args))
+            for name in self.healthy)
+
+        results = OrderedDict()
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as err:
+                log.error("Target {} failed, skipping it from now on: "
+                          "{}".format(name, err))
+                self.failed[name] = err
+                continue
+            self.progress[name] += rows
+            log.debug("Target {}: {} rows written".format(
+                name, self.progress[name]))
+
+        if not results:
+            raise RuntimeError("Every target failed: {}".format(', '.join(
+                "{} ({})".format(name, err)
+                for name, err in self.failed.items())))
+
+        return results
+
+    def create_schema(self, node_classes):
+        self.__fanout('create_schema', node_classes)
+
+    def add_nodes(self, nodes):
+        self.__fanout('add_nodes', nodes)
+
+    def add_relationships(self, relationships):
+        self.__fanout('add_relationships', relationships)
+
+    def bulk_set(self, node_key, data):
+        """Set properties on existing nodes matched by primary key on every
+        target
+
+        :return: tuple of (matched, unmatched) lists of primary key values of
+         the first target that didn't fail
+        :rtype: tuple
+        """
+        return next(iter(self.__fanout('bulk_set', node_key, data).values()))
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name in (
+                'sinks', 'failed', 'progress', 'executor'):
+            raise AttributeError(name)
+        if not all(hasattr(sink, name) for sink in self.sinks.values()):
+            raise AttributeError(name)
+
+        # Any other sink method, e.g. Neo4j.delete_nodes, is fanned out too
+        def fanout(*args):
+            return self.__fanout(name, *args)
+        return fanout
+
+    def report(self):
+        """Log the rows written to each target and the failed targets"""
+
+        for name, rows in self.progress.items():
+            if name in self.failed:
+                log.error("Target {} failed after {} rows: {}".format(
+                    name, rows, self.failed[name]))
+            else:
+                log.info("Target {}: {} rows written".format(name, rows))
+
+    def close(self):
+        """Close every target that didn't fail
+
+        :return: dict of target name to whatever the target returned
+        :rtype: dict
+        """
+
+        try:
+            return self.__fanout('close')
+        finally:
+            self.executor.shutdown()
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+
+log = logging.getLogger(__name__)
+
+
+def file_fingerprint(path):
+    """Get the sha256 fingerprint of a file's contents
+
+    :param path: absolute path to the file
+    :type path: str
+    :return: hex digest of the file contents
+    :rtype: str
+    """
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def node_fingerprint(properties, labels):
+    """Get the fingerprint of a node payload
+
+    :param properties: node properties
+    :type properties: dict
+    :param labels: node labels
+    :type labels: iterable
+    :return: hex digest of the node payload
+    :rtype: str
+    """
+
+    payload = json.dumps(
+        [properties, sorted(labels)], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class ImportState(object):
+    """Fingerprints of the data sources and of every node and relationship
+    written by the last successful import into a target database, stored in
+    a local state file.
+    """
+
+    def __init__(self, path):
+        """Constructor for initial setup
+
+        :param path: absolute path to the state file
+        :type path: str
+        """
+        self.path = path
+        self.sources = {}
+        self.nodes = {}
+        self.relationships = set()
+
+    @classmethod
+    def for_target(cls, state_dir, target):
+        """Get the state for a target database, loaded from disk if an
+        earlier import stored one
+
+        :param state_dir: directory the state files are stored in
+        :type state_dir: str
+        :param target: name of the target database, e.g. 'host:7687'
+        :type target: str
+        :return: state of the target database
+        :rtype: class 'cwf2neo.state.ImportState'
+        """
+
+        filename = re.sub(r'[^A-Za-z0-9_.-]', '_', target) + '.json'
+        state = cls(os.path.join(state_dir, filename))
+        state.load()
+        return state
+
+    @property
+    def exists(self):
+        return bool(self.sources)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        self.sources = data['sources']
+        self.nodes = {
+            (label, value): set(fingerprints)
+            for label, value, fingerprints in data['nodes']}
+        self.relationships = set(
+            ((start[0], start[1]), rel_type, (end[0], end[1]))
+            for start, rel_type, end in data['relationships'])
+
+    def save(self):
+        """Atomically write the state to disk
+        """
+
+        data = {
+            'sources': self.sources,
+            'nodes': [
+                [label, value, sorted(fingerprints)]
+                for (label, value), fingerprints in self.nodes.items()],
+            'relationships': [
+                [list(start), rel_type, list(end)]
+                for start, rel_type, end in self.relationships]
+        }
+
+        state_dir = os.path.dirname(self.path)
+        os.makedirs(state_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=state_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
+
+        log.info("Saved import state to {}".format(self.path))
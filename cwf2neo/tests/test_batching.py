@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+from cwf2neo.batching import BatchSizer, WriterPool
+
+
+def test_batch_sizer_fixed():
+    """Ensure the batch size doesn't change unless adaptive
+    """
+    sizer = BatchSizer(batch_size=1000)
+    sizer.record(1000, 10.0)
+
+    assert sizer.size == 1000
+
+
+def test_batch_sizer_adaptive():
+    """Ensure adaptive batch sizes move towards the target latency
+    """
+    sizer = BatchSizer(batch_size=1000, adaptive=True, target_latency=0.5)
+
+    # Fast batches grow the batch size
+    sizer.record(1000, 0.1)
+    assert sizer.size == 3000
+
+    # Slow batches shrink it, within the limits
+    for _ in range(20):
+        sizer.record(sizer.size, 100.0)
+    assert sizer.size == sizer.min_size
+
+
+def test_writer_pool():
+    """Ensure every row is written concurrently and failed batches retried
+    """
+    written = []
+    failures = []
+    lock = threading.Lock()
+
+    def write(batch):
+        with lock:
+            if batch[0] == 50 and not failures:
+                failures.append(batch[0])
+                raise ValueError('deadlock')
+            written.extend(batch)
+
+    pool = WriterPool(
+        writers=4, sizer=BatchSizer(batch_size=10), retry_errors=(ValueError,))
+    pool.write_all(range(100), write)
+
+    assert sorted(written) == list(range(100))
+    assert failures == [50]
+
+
+def test_writer_pool_error():
+    """Ensure errors that aren't retried are raised to the caller
+    """
+    def write(batch):
+        raise KeyError('failed')
+
+    pool = WriterPool(writers=2, retry_errors=(ValueError,))
+
+    with pytest.raises(KeyError):
+        pool.write_all(range(10), write)
+
+
+def test_writer_pool_error_waits():
+    """Ensure no batch is still being written once an error is raised
+    """
+    running = []
+
+    def write(batch):
+        if batch[0] == 0:
+            raise KeyError('failed')
+        running.append(batch[0])
+        time.sleep(0.05)
+        running.remove(batch[0])
+
+    pool = WriterPool(
+        writers=4, sizer=BatchSizer(batch_size=1), retry_errors=(ValueError,))
+
+    with pytest.raises(KeyError):
+        pool.write_all(range(20), write)
+    assert running == []
+
+    pool.shutdown()
@@ -0,0 +1,20 @@
+from cwf2neo.benchmark import STAGES, benchmark
+
+
+def test_benchmark(tmp_path):
+    """Run the benchmark against the in-memory sink with small synthetic
+    workbooks
+    """
+
+    results = benchmark(scales=[0.1, 0.2], directory=str(tmp_path))
+
+    assert [run['scale'] for run in results['runs']] == [0.1, 0.2]
+
+    for run in results['runs']:
+        assert run['sink'] == 'memory'
+        assert list(run['stages']) == list(STAGES)
+        assert all(seconds >= 0 for seconds in run['stages'].values())
+
+    small, large = results['runs']
+    assert 0 < small['nodes'] < large['nodes']
+    assert 0 < small['relationships'] < large['relationships']
@@ -0,0 +1,109 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from cwf2neo.cache import SourceCache
+
+CONTENT = b'workbook contents'
+ETAG = '"v1"'
+
+
+class SourceHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the NIST download server
+    """
+    transfers = 0
+
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        SourceHandler.transfers += 1
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(CONTENT)))
+        self.end_headers()
+        self.wfile.write(CONTENT)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    SourceHandler.transfers = 0
+    httpd = HTTPServer(('127.0.0.1', 0), SourceHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_port)
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_fetch_revalidates(server, tmp_path):
+    """Ensure cached sources are revalidated instead of downloaded again
+    """
+    cache = SourceCache(str(tmp_path))
+
+    path, transferred = cache.fetch(server + '/cf', 'cf.xlsx')
+
+    assert transferred
+    with open(path, 'rb') as f:
+        assert f.read() == CONTENT
+
+    # A warm restart uses the persisted ETag and transfers nothing
+    path, transferred = SourceCache(str(tmp_path)).fetch(
+        server + '/cf', 'cf.xlsx')
+
+    assert not transferred and os.path.exists(path)
+    assert SourceHandler.transfers == 1
+
+
+def test_fetch_all(server, tmp_path):
+    """Ensure all sources are downloaded concurrently into the cache
+    """
+    cache = SourceCache(str(tmp_path))
+    sources = [
+        {'source_url': server + '/' + name, 'local_filename': name}
+        for name in ('a.xlsx', 'b.xlsx', 'c.xlsx')]
+
+    results = cache.fetch_all(sources, max_workers=3)
+
+    assert [os.path.basename(path) for path, _ in results] == \
+        ['a.xlsx', 'b.xlsx', 'c.xlsx']
+    assert SourceHandler.transfers == 3
+
+
+def test_fetch_file_mode(server, tmp_path):
+    """Ensure cached files follow the umask instead of being owner-only
+    """
+    umask = os.umask(0o022)
+    try:
+        path, _ = SourceCache(str(tmp_path)).fetch(server + '/cf', 'cf.xlsx')
+    finally:
+        os.umask(umask)
+
+    assert os.stat(path).st_mode & 0o777 == 0o644
+    assert os.stat(str(tmp_path / 'sources.json')).st_mode & 0o777 == 0o644
+    assert sorted(os.listdir(str(tmp_path))) == ['cf.xlsx', 'sources.json']
+
+
+def test_fetch_all_file_mode(server, tmp_path):
+    """Ensure concurrent downloads follow the umask and leave it unchanged
+    """
+    umask = os.umask(0o022)
+    try:
+        cache = SourceCache(str(tmp_path))
+        cache.fetch_all([
+            {'source_url': server + '/{}'.format(i),
+             'local_filename': '{}.xlsx'.format(i)}
+            for i in range(16)], max_workers=8)
+        assert os.umask(0o022) == 0o022
+    finally:
+        os.umask(umask)
+
+    for name in os.listdir(str(tmp_path)):
+        assert os.stat(str(tmp_path / name)).st_mode & 0o777 == 0o644
+    assert len(os.listdir(str(tmp_path))) == 17
@@ -0,0 +1,91 @@
+from cwf2neo.embedded import EmbeddedGraph, tokenize
+from cwf2neo.graph_objects import (KSATRecord, NICECategoryRecord,
+                                   NICECompetencyRecord,
+                                   NICESpecialtyAreaRecord,
+                                   NICEWorkroleRecord, NISTFunctionRecord,
+                                   Relationship)
+
+
+def framework():
+    graph = EmbeddedGraph()
+
+    # Relationships can be added before their nodes
+    graph.add_relationships([
+        Relationship(KSATRecord.ref('K0002'), 'NICE_WORKROLE',
+                     NICEWorkroleRecord.ref('SP-RSK-001')),
+        Relationship(KSATRecord.ref('K0001'), 'NICE_WORKROLE',
+                     NICEWorkroleRecord.ref('SP-RSK-001')),
+        Relationship(KSATRecord.ref('K0001'), 'NICE_WORKROLE',
+                     NICEWorkroleRecord.ref('SP-XXX-999')),
+        Relationship(KSATRecord.ref('K0001'), 'NICE_COMPETENCY',
+                     NICECompetencyRecord.ref('C001')),
+        Relationship(NICEWorkroleRecord.ref('SP-RSK-001'),
+                     'NICE_SPECIALTY_AREA',
+                     NICESpecialtyAreaRecord.ref('RSK')),
+        Relationship(NICESpecialtyAreaRecord.ref('RSK'),
+                     'NICE_SPECIALTY_AREA', NICECategoryRecord.ref('SP')),
+        Relationship(NICECategoryRecord.ref('SP'), 'NIST_Function',
+                     NISTFunctionRecord.ref('ID'))])
+
+    graph.add_nodes([
+        KSATRecord(id='K0001', description='Knowledge of computer networks',
+                   labels=('Knowledge',)),
+        KSATRecord(id='K0002', description='Knowledge of risk management',
+                   labels=('Knowledge',)),
+        NICEWorkroleRecord(id='SP-RSK-001', title='Authorizing Official'),
+        NICECompetencyRecord(id='C001', name='Networks'),
+        NICESpecialtyAreaRecord(id='RSK', title='Risk Management'),
+        NICECategoryRecord(id='SP', title='Securely Provision'),
+        NISTFunctionRecord(id='ID', title='IDENTIFY')])
+
+    return graph.close()
+
+
+def test_tokenize():
+    """Test splitting descriptions into index tokens"""
+
+    assert tokenize('Knowledge of the OSI model (e.g., TCP/IP).') == [
+        'knowledge', 'osi', 'model', 'tcp', 'ip']
+    assert tokenize(None) == []
+
+
+def test_embedded_graph():
+    """Test traversing the framework in memory"""
+
+    graph = framework()
+
+    assert len(graph) == 7
+    assert [ksat['id'] for ksat in graph.ksats_for_workrole('SP-RSK-001')] \
+        == ['K0001', 'K0002']
+    assert graph.ksats_for_workrole('SP-RSK-001')[0]['type'] == 'Knowledge'
+    assert graph.ksats_for_workrole('SP-XXX-999') == []
+    assert [workrole['id'] for workrole in graph.workroles_for_ksat('K0001')] \
+        == ['SP-RSK-001']
+    assert graph.competencies_for_workrole('SP-RSK-001') == [
+        {'id': 'C001', 'name': 'Networks', 'description': None}]
+    assert graph.nist_functions_for_workrole('SP-RSK-001') == [
+        {'id': 'ID', 'title': 'IDENTIFY'}]
+
+    results = graph.search_ksats('computer networks management')
+    assert [(ksat['id'], ksat['score']) for ksat in results] == [
+        ('K0001', 2 / 3), ('K0002', 1 / 3)]
+
+
+def test_embedded_graph_snapshot(tmp_path):
+    """Test saving and loading a snapshot, and adding to a packed graph"""
+
+    path = str(tmp_path / 'cwf.snapshot')
+    framework().save(path)
+
+    graph = EmbeddedGraph.load(path)
+    assert [ksat['id'] for ksat in graph.ksats_for_workrole('SP-RSK-001')] \
+        == ['K0001', 'K0002']
+
+    graph.add_nodes([KSATRecord(id='T0001', description='Assess risk',
+                                labels=('Task',))])
+    graph.add_relationships([
+        Relationship(KSATRecord.ref('T0001'), 'NICE_WORKROLE',
+                     NICEWorkroleRecord.ref('SP-RSK-001'))])
+    assert [ksat['id'] for ksat in graph.ksats_for_workrole('SP-RSK-001')] \
+        == ['K0001', 'K0002', 'T0001']
+    assert graph.search_ksats('assess')[0]['id'] == 'T0001'
@@ -0,0 +1,63 @@
+import csv
+import gzip
+import os
+
+from cwf2neo.export import CSVExporter
+from cwf2neo.graph_objects import KSATRecord, NICEWorkroleRecord, Relationship
+
+
+def read_csv(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+
+def test_export_csv(tmp_path):
+    """Test exporting nodes and relationships as neo4j-admin import CSVs"""
+
+    exporter = CSVExporter(str(tmp_path))
+    exporter.add_nodes([
+        KSATRecord(id='K0001', description='Knowledge of networks',
+                   labels=('Knowledge',)),
+        KSATRecord(id='K0001', type='Knowledge'),
+        KSATRecord(id='S0001', description='Skill in\nscripting',
+                   labels=('Skill',))])
+    exporter.add_nodes([NICEWorkroleRecord(id='SP-RSK-001', title='Risk')])
+    exporter.add_relationships([
+        Relationship(NICEWorkroleRecord.ref('SP-RSK-001'), 'has',
+                     KSATRecord.ref('K0001')),
+        Relationship(NICEWorkroleRecord.ref('SP-RSK-001'), 'has',
+                     KSATRecord.ref('K9999'))])
+
+    matched, unmatched = exporter.bulk_set(
+        ('KSAT', 'id'), [('S0001', {'title': 'Scripting'}), ('X1', {})])
+    assert matched == ['S0001']
+    assert unmatched == ['X1']
+
+    files = exporter.close()
+
+    ksats = read_csv(os.path.join(str(tmp_path), 'nodes_KSAT.csv'))
+    assert ksats[0] == [
+        'id:ID(KSAT)', 'description:string', 'type:string', 'title:string',
+        ':LABEL']
+    assert ksats[1] == [
+        'K0001', 'Knowledge of networks', 'Knowledge', '', 'KSAT;Knowledge']
+    assert ksats[2] == ['S0001', 'Skill in\nscripting', '', 'Scripting',
+                        'KSAT;Skill']
+
+    assert len(files['relationships']) == 1
+    rels = read_csv(files['relationships'][0])
+    assert rels == [
+        [':START_ID(NICEWorkrole)', ':END_ID(KSAT)', ':TYPE'],
+        ['SP-RSK-001', 'K0001', 'has']]
+
+
+def test_export_csv_gzip(tmp_path):
+    """Test exporting gzipped CSVs"""
+
+    exporter = CSVExporter(str(tmp_path), compress=True)
+    exporter.add_nodes([NICEWorkroleRecord(id='SP-RSK-001', title='Risk')])
+    files = exporter.close()
+
+    assert files['nodes'][0].endswith('nodes_NICEWorkrole.csv.gz')
+    assert read_csv(files['nodes'][0])[1][0] == 'SP-RSK-001'
@@ -0,0 +1,35 @@
+def test_node_classes():
+    """Ensure every node class is found and has a primary key to index
+    """
+    from cwf2neo.graph_objects import KSAT, NICECompetencyGroup, node_classes
+
+    classes = node_classes()
+
+    assert KSAT in classes and NICECompetencyGroup in classes
+    assert all(c.__primarykey__ != '__id__' for c in classes)
+
+
+def test_record_types():
+    """Ensure node records mirror their graph object class
+    """
+    from cwf2neo.graph_objects import KSAT, KSATRecord, as_record
+
+    record = KSATRecord(
+        'K0001', type='Knowledge', description='Knowledge of networks',
+        labels=('Knowledge',))
+
+    assert record.__primarylabel__ == 'KSAT'
+    assert record.__primaryvalue__ == 'K0001'
+    assert record.properties() == {
+        'id': 'K0001', 'type': 'Knowledge',
+        'description': 'Knowledge of networks'}
+    assert record.all_labels() == {'KSAT', 'Knowledge'}
+
+    ksat = KSAT()
+    ksat.id = 'K0001'
+    ksat.type = 'Knowledge'
+    ksat.description = 'Knowledge of networks'
+    ksat.__node__.add_label('Knowledge')
+
+    assert as_record(ksat) == record
+    assert KSATRecord.ref('K0001').properties() == {'id': 'K0001'}
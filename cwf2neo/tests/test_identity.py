@@ -0,0 +1,79 @@
+from cwf2neo.graph_objects import KSATRecord, NICEWorkroleRecord
+from cwf2neo.identity import IdentityMap
+
+
+def make_ksat(ksat_id, description=None):
+    return KSATRecord(id=ksat_id, description=description)
+
+
+def test_unique_nodes():
+    """Ensure duplicate nodes are collapsed and already sent nodes skipped
+    """
+    identity_map = IdentityMap()
+
+    nodes = identity_map.unique_nodes([
+        make_ksat('K0001', 'Knowledge of networks'),
+        make_ksat('K0002', 'Knowledge of risk'),
+        make_ksat('K0001', 'Knowledge of networks')])
+
+    assert [n.id for n in nodes] == ['K0001', 'K0002']
+
+    # Already sent with a description, an id only node adds nothing new
+    assert identity_map.unique_nodes([make_ksat('K0001')]) == []
+
+    # New properties still need to be sent
+    assert len(identity_map.unique_nodes(
+        [make_ksat('K0002', 'Knowledge of risk management')])) == 1
+
+    assert identity_map.eliminated_nodes == 2
+
+
+def test_unique_relationships():
+    """Ensure duplicate (start, type, end) relationships are removed
+    """
+    identity_map = IdentityMap()
+    workrole = NICEWorkroleRecord.ref('SP-RSK-001')
+
+    relationships = identity_map.unique_relationships([
+        (make_ksat('K0001'), 'NICE_WORKROLE', workrole),
+        (make_ksat('K0001'), 'NICE_WORKROLE', workrole),
+        (make_ksat('K0002'), 'NICE_WORKROLE', workrole)])
+
+    assert len(relationships) == 2
+    assert identity_map.eliminated_relationships == 1
+
+
+def test_incremental_identity_map(tmp_path):
+    """Ensure nodes and relationships written by the previous import are
+    skipped and removed ones are reported
+    """
+    from cwf2neo.state import ImportState
+
+    workrole = NICEWorkroleRecord.ref('SP-RSK-001')
+
+    first_run = IdentityMap()
+    first_run.unique_nodes([
+        make_ksat('K0001', 'Knowledge of networks'),
+        make_ksat('K0002', 'Knowledge of risk')])
+    first_run.unique_relationships([
+        (make_ksat('K0001'), 'NICE_WORKROLE', workrole)])
+
+    state = ImportState.for_target(str(tmp_path), 'localhost:7687')
+    state.sources = {'cwf.xlsx': 'abc'}
+    first_run.update_state(state)
+    state.save()
+
+    previous = ImportState.for_target(str(tmp_path), 'localhost:7687')
+    second_run = IdentityMap(previous)
+
+    nodes = second_run.unique_nodes([
+        make_ksat('K0001', 'Knowledge of networks'),
+        make_ksat('K0003', 'Knowledge of cryptography')])
+    relationships = second_run.unique_relationships([
+        (make_ksat('K0001'), 'NICE_WORKROLE', workrole)])
+
+    assert [n.id for n in nodes] == ['K0003']
+    assert relationships == []
+    assert second_run.unchanged_nodes == 1
+    assert second_run.unchanged_relationships == 1
+    assert second_run.removed_nodes() == {('KSAT', 'K0002')}
@@ -0,0 +1,48 @@
+import json
+
+from cwf2neo.metrics import Metrics
+
+
+def test_metrics():
+    """Test recording stage timings, rows and batches"""
+
+    metrics = Metrics()
+
+    with metrics.stage('NICE_KSAT'):
+        metrics.count(10)
+        metrics.batch('nodes', 10, 0.5, {
+            'nodes_created': 8, 'properties_set': 24,
+            'contains_updates': True})
+        metrics.batch('nodes', 5, 0.25, {'nodes_created': 2})
+
+    metrics.count()
+
+    stages = metrics.as_dict()
+    assert list(stages) == ['NICE_KSAT', 'other']
+
+    ksat = stages['NICE_KSAT']
+    assert ksat['rows'] == 10
+    assert ksat['elapsed'] > 0
+    assert ksat['batches']['nodes']['count'] == 2
+    assert ksat['batches']['nodes']['rows'] == 15
+    assert ksat['batches']['nodes']['max_latency'] == 0.5
+    assert ksat['batches']['nodes']['rows_per_second'] == 20
+    assert ksat['counters'] == {'nodes_created': 10, 'properties_set': 24}
+    assert stages['other']['rows'] == 1
+
+    assert json.loads(metrics.to_json())['NICE_KSAT']['rows'] == 10
+
+
+def test_metrics_prometheus():
+    """Test exporting the metrics in the Prometheus text format"""
+
+    metrics = Metrics()
+
+    with metrics.stage('NICE_KSAT'):
+        metrics.batch('nodes', 10, 0.5, {'nodes_created': 8})
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert '# TYPE cwf2neo_stage_seconds gauge' in lines
+    assert 'cwf2neo_batches_total{stage="NICE_KSAT",kind="nodes"} 1' in lines
+    assert 'cwf2neo_db_nodes_created_total{stage="NICE_KSAT"} 8' in lines
@@ -0,0 +1,80 @@
+import os
+
+from cwf2neo.graph_objects import KSATRecord, NICEWorkroleRecord, Relationship
+from cwf2neo.model import ModelCache
+
+
+def replay(model):
+    return [
+        (stage, kind, list(payload) if kind == 'write' else payload)
+        for stage, kind, payload in model.operations()]
+
+
+def test_model_cache(tmp_path):
+    """Ensure a parsed model is cached per data source fingerprints"""
+
+    ksat = KSATRecord(id='K0001', type='Knowledge', labels=('Knowledge',))
+    relationship = Relationship(
+        ksat, 'NICE_WORKROLE', NICEWorkroleRecord.ref('SP-RSK-001'))
+
+    cache = ModelCache(str(tmp_path))
+    sources = {'cwf.xlsx': 'abc'}
+
+    assert cache.load(sources) is None
+
+    model = cache.create()
+    # Frames of a single record, the write spans several of them
+    model.batch_size = 1
+    assert list(model.write('NICE_KSAT', iter([ksat, relationship]))) == [
+        ksat, relationship]
+    assert model.bulk_set(
+        'NICE_Competency_descriptions', ('NICECompetency', 'id'),
+        iter([('C001', {'description': 'Networks'})])) == [
+        ('C001', {'description': 'Networks'})]
+    assert list(model.write('NICE_Workroles', [])) == []
+    assert len(model) == 3
+
+    cache.save(sources, model)
+
+    with cache.load(sources) as loaded:
+        operations = replay(loaded)
+        assert len(loaded) == 3
+
+    assert operations == [
+        ('NICE_KSAT', 'write', [ksat, relationship]),
+        ('NICE_Competency_descriptions', 'bulk_set', (
+            ('NICECompetency', 'id'),
+            [('C001', {'description': 'Networks'})])),
+        ('NICE_Workroles', 'write', [])]
+    assert type(operations[0][2][0]) is KSATRecord
+    assert cache.load({'cwf.xlsx': 'def'}) is None
+
+    # Only the model of the latest data sources is kept
+    model = cache.create()
+    list(model.write('NICE_KSAT', [ksat]))
+    cache.save({'cwf.xlsx': 'def'}, model)
+    assert cache.load(sources) is None
+    assert len(os.listdir(str(tmp_path))) == 1
+
+
+def test_model_cache_discard(tmp_path):
+    """Ensure a model that wasn't completely recorded isn't kept"""
+
+    cache = ModelCache(str(tmp_path))
+    model = cache.create()
+    list(model.write('NICE_KSAT', [KSATRecord(id='K0001')]))
+    cache.discard(model)
+
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_model_cache_unreadable(tmp_path):
+    """Ensure a corrupt cache file is ignored"""
+
+    cache = ModelCache(str(tmp_path))
+    sources = {'cwf.xlsx': 'abc'}
+
+    with open(cache.path(sources), 'wb') as f:
+        f.write(b'not a pickle')
+
+    assert cache.load(sources) is None
@@ -64,3 +64,118 @@ def test_db_connection_bad_host():
         db = Neo4j(host="invalidneo4jhostname")
 
         db.graph.database.name
+
+
+def test_bulk_set():
+    """Ensure bulk updates report matched and unmatched primary keys
+    """
+
+    from cwf2neo.graph_objects import NICECompetencyRecord
+    from cwf2neo.neo4j import Neo4j, node_key
+
+    db = Neo4j()
+
+    db.add_nodes([NICECompetencyRecord.ref('TEST-C001')])
+
+    matched, unmatched = db.bulk_set(
+        node_key(NICECompetencyRecord),
+        [('TEST-C001', {'description': 'test'}),
+         ('TEST-C999', {'description': 'missing'})])
+
+    db.delete_nodes(node_key(NICECompetencyRecord), ['TEST-C001'])
+
+    assert matched == ['TEST-C001']
+    assert unmatched == ['TEST-C999']
+
+
+def test_fresh_nodes():
+    """Ensure a fresh load creates each node once and merges later updates
+    """
+
+    from cwf2neo.graph_objects import NICECompetencyRecord
+    from cwf2neo.neo4j import Neo4j, node_key
+
+    db = Neo4j()
+    db.set_fresh(True)
+
+    db.add_nodes([
+        NICECompetencyRecord(id='TEST-C001', name='Test'),
+        NICECompetencyRecord(id='TEST-C001', description='test')])
+
+    count = db.graph.run(
+        "MATCH (n:NICECompetency {id: 'TEST-C001'}) RETURN count(n)"
+    ).evaluate()
+    description = db.graph.run(
+        "MATCH (n:NICECompetency {id: 'TEST-C001'}) RETURN n.description"
+    ).evaluate()
+
+    db.delete_nodes(node_key(NICECompetencyRecord), ['TEST-C001'])
+
+    assert count == 1
+    assert description == 'test'
+
+
+def test_relationships_by_node_id():
+    """Ensure relationships are written between nodes matched by node id
+    """
+
+    from cwf2neo.graph_objects import (KSATRecord, NICEWorkroleRecord,
+                                       Relationship)
+    from cwf2neo.neo4j import Neo4j, node_key
+
+    db = Neo4j()
+
+    db.add_nodes([NICEWorkroleRecord(id='TEST-W001', title='Test')])
+    db.add_nodes([KSATRecord(id='TEST-K001', labels=('Knowledge',))])
+    db.add_relationships([
+        Relationship(KSATRecord.ref('TEST-K001'), 'NICE_WORKROLE',
+                     NICEWorkroleRecord.ref('TEST-W001')),
+        Relationship(KSATRecord.ref('TEST-K001'), 'NICE_WORKROLE',
+                     NICEWorkroleRecord.ref('TEST-W999'))])
+
+    count = db.graph.run(
+        "MATCH (:KSAT {id: 'TEST-K001'})-[r:NICE_WORKROLE]->"
+        "(:NICEWorkrole {id: 'TEST-W001'}) RETURN count(r)").evaluate()
+    ids = db.node_ids(node_key(KSATRecord))
+
+    db.delete_nodes(node_key(KSATRecord), ['TEST-K001'])
+    db.delete_nodes(node_key(NICEWorkroleRecord), ['TEST-W001'])
+
+    assert count == 1
+    assert 'TEST-K001' in ids
+    assert 'TEST-K001' not in db.node_ids(node_key(KSATRecord))
+
+
+def test_mixed_relationships():
+    """Ensure relationships of different types and endpoint labels can be
+    written in one list
+    """
+
+    from cwf2neo.graph_objects import (KSATRecord, NICECompetencyRecord,
+                                       NICEWorkroleRecord)
+    from cwf2neo.neo4j import Neo4j, node_key
+
+    db = Neo4j()
+
+    ksat = KSATRecord(id='TEST-K001', labels=('Knowledge',))
+    workrole = NICEWorkroleRecord(id='TEST-W001', title='Test')
+    competency = NICECompetencyRecord(id='TEST-C001', name='Test')
+
+    db.add_nodes([ksat])
+    db.add_nodes([workrole])
+    db.add_nodes([competency])
+    db.add_relationships([
+        (ksat, 'NICE_WORKROLE', workrole),
+        (ksat, 'NICE_COMPETENCY', competency, {'weight': 1})])
+
+    types = db.graph.run(
+        "MATCH (:KSAT {id: 'TEST-K001'})-[r]->() "
+        "RETURN type(r) AS type, r.weight AS weight ORDER BY type").data()
+
+    db.delete_nodes(node_key(KSATRecord), ['TEST-K001'])
+    db.delete_nodes(node_key(NICEWorkroleRecord), ['TEST-W001'])
+    db.delete_nodes(node_key(NICECompetencyRecord), ['TEST-C001'])
+
+    assert types == [
+        {'type': 'NICE_COMPETENCY', 'weight': 1},
+        {'type': 'NICE_WORKROLE', 'weight': None}]
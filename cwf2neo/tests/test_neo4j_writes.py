@@ -0,0 +1,128 @@
+import re
+
+import pytest
+from cwf2neo import neo4j
+from cwf2neo.graph_objects import KSATRecord, NICEWorkroleRecord
+from cwf2neo.neo4j import Neo4j
+
+NODE_KEY_PATTERN = re.compile(r"RETURN _\.(\w+) AS key, id\(_\) AS id$")
+
+
+class Cursor(object):
+    def __init__(self, records):
+        self.records = records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def evaluate(self):
+        return self.records[0][0] if self.records else None
+
+    def stats(self):
+        return {}
+
+
+class Graph(object):
+    """Answers the statements of the bulk writes from a dict of node ids,
+    recording every statement
+    """
+
+    name = 'neo4j'
+
+    def __init__(self, **kwargs):
+        # (label, primary key value) -> node id
+        self.nodes = {}
+        self.statements = []
+        self.parameters = []
+
+    def auto(self):
+        return self
+
+    def run(self, statement, parameters=None):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+        if statement.startswith('MATCH (n) RETURN id(n)'):
+            return Cursor([(node_id,) for node_id in self.nodes.values()])
+
+        m = re.match(r"MATCH \(n:(\w+)\) WHERE", statement)
+        if m:
+            return Cursor([
+                (value, node_id)
+                for (label, value), node_id in self.nodes.items()
+                if label == m[1]])
+
+        m = NODE_KEY_PATTERN.search(statement)
+        if m:
+            label = re.search(r"\(_:(\w+)", statement)[1]
+            records = []
+            for row in parameters['data']:
+                node_id = self.nodes.setdefault(
+                    (label, row[m[1]]), len(self.nodes))
+                records.append({'key': row[m[1]], 'id': node_id})
+            return Cursor(records)
+
+        return Cursor([])
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(neo4j, 'Graph', Graph)
+    db = Neo4j()
+    yield db
+    db.close()
+
+
+def test_fresh_nodes(db):
+    """Ensure an empty database is loaded with CREATE, and merged into once
+    the import completed
+    """
+
+    assert db.set_fresh() is True
+
+    db.add_nodes([KSATRecord(id='K0001', labels=('Knowledge',))])
+    assert db.graph.statements[-1] == (
+        "UNWIND $data AS r\nCREATE (_:KSAT:Knowledge)\nSET _ += r\n"
+        "RETURN _.id AS key, id(_) AS id")
+
+    # Created once, written again in the same load
+    db.add_nodes([KSATRecord(id='K0001', labels=('Knowledge',))])
+    assert db.graph.statements[-1].startswith(
+        "UNWIND $data AS r\nMERGE (_:KSAT {id:r['id']})")
+
+    db.import_completed()
+    db.add_nodes([KSATRecord(id='K0002', labels=('Knowledge',))])
+    assert db.graph.statements[-1].startswith(
+        "UNWIND $data AS r\nMERGE (_:KSAT {id:r['id']})")
+    assert db.set_fresh() is False
+
+
+def test_relationships_by_node_id(db):
+    """Ensure relationship endpoints with known ids are matched by node id
+    and the others by primary key
+    """
+
+    db.graph.nodes[('NICEWorkrole', 'SP-RSK-001')] = 7
+    db.add_nodes([KSATRecord(id='K0001', labels=('Knowledge',))])
+
+    db.add_relationships([
+        (KSATRecord.ref('K0001'), 'NICE_WORKROLE',
+         NICEWorkroleRecord.ref('SP-RSK-001')),
+        (KSATRecord.ref('K0001'), 'NICE_WORKROLE',
+         NICEWorkroleRecord.ref('SP-XXX-999'))])
+
+    # The ids of both endpoint labels are fetched once
+    assert [statement for statement in db.graph.statements
+            if statement.startswith('MATCH (n:')] == [
+        "MATCH (n:KSAT) WHERE n.id IS NOT NULL RETURN n.id, id(n)",
+        "MATCH (n:NICEWorkrole) WHERE n.id IS NOT NULL RETURN n.id, id(n)"]
+    assert db.graph.statements[-2:] == [
+        "UNWIND $data AS r\nMATCH (a) WHERE id(a) = r[0]\n"
+        "MATCH (b) WHERE id(b) = r[2]\nMERGE (a)-[_:NICE_WORKROLE]->(b)\n"
+        "SET _ += r[1]",
+        "UNWIND $data AS r\nMATCH (a:KSAT {id:r[0]})\n"
+        "MATCH (b:NICEWorkrole {id:r[2]})\n"
+        "MERGE (a)-[_:NICE_WORKROLE]->(b)\nSET _ += r[1]"]
+    assert db.graph.parameters[-2:] == [
+        {'data': [(1, {}, 7)]},
+        {'data': [('K0001', {}, 'SP-XXX-999')]}]
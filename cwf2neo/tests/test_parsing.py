@@ -0,0 +1,57 @@
+from cwf2neo.parsing import (NIST_CATEGORY_PATTERN, classify_ksats,
+                             find_ksats, ksat_type, parse_ksat_sheet)
+
+
+def test_find_ksats():
+    """Ensure KSATs are found without raising for cells without any"""
+
+    assert find_ksats("K0012, s1234\nA9876 K123") == [
+        'K0012', 's1234', 'A9876']
+    assert find_ksats("KSA ID") == []
+    assert find_ksats(None) == []
+    assert find_ksats(12.0) == []
+
+
+def test_classify_ksats():
+    """Ensure a column of cells is classified in one call"""
+
+    column = ['KSA ID', 'K0001', 'T0145 ', '', 's0034', None]
+
+    assert classify_ksats(column) == [
+        None,
+        ('K0001', 'Knowledge'),
+        ('T0145', 'Task'),
+        None,
+        ('s0034', 'Skill'),
+        None]
+
+
+def test_ksat_type():
+    """Ensure KSAT types are looked up from the ID prefix"""
+
+    assert ksat_type('A0028') == 'Ability'
+    assert ksat_type('X0001') is None
+    assert ksat_type('') is None
+
+
+def test_nist_category_pattern():
+    """Ensure NIST categories are split into title, id and description"""
+
+    m = NIST_CATEGORY_PATTERN.match(
+        "Asset Management (ID.AM): The data, personnel")
+
+    assert m.groups() == ('Asset Management', 'ID.AM', 'The data, personnel')
+
+
+def test_parse_ksat_sheet():
+    """Test parsing the KSATs of a work role sheet"""
+
+    rows = [
+        ['KSA ID', 'Description'],
+        ['K0001 ', 'Knowledge of networks'],
+        ['', ''],
+        ['t0001', 'Assess risk']]
+
+    assert parse_ksat_sheet(rows) == [
+        ('K0001', 'Knowledge', 'Knowledge of networks'),
+        ('t0001', 'Task', 'Assess risk')]
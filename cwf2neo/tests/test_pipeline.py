@@ -0,0 +1,61 @@
+from cwf2neo.graph_objects import (KSAT, KSATRecord, NICECompetencyRecord,
+                                   NICEWorkrole, NICEWorkroleRecord,
+                                   Relationship)
+from cwf2neo.pipeline import BatchWriter, group_relationships
+
+
+def test_batch_writer():
+    """Ensure records are written in bounded batches with all nodes written
+    before the relationships that depend on them
+    """
+    writes = []
+
+    def add_nodes(nodes):
+        writes.append(('nodes', [n.id for n in nodes]))
+
+    def add_relationships(relationships):
+        writes.append(('relationships', [r[0].id for r in relationships]))
+
+    def records():
+        workrole = NICEWorkrole()
+        workrole.id = 'SP-RSK-001'
+        yield workrole
+        for i in range(5):
+            ksat = KSAT()
+            ksat.id = 'K000{}'.format(i)
+            yield ksat
+            yield (ksat, 'NICE_WORKROLE', workrole)
+
+    with BatchWriter(add_nodes, add_relationships, batch_size=2) as writer:
+        writer.write(records())
+
+    assert writes == [
+        ('nodes', ['K0000', 'K0001']),
+        ('nodes', ['SP-RSK-001']),
+        ('relationships', ['K0000', 'K0001']),
+        ('nodes', ['K0002', 'K0003']),
+        ('relationships', ['K0002', 'K0003']),
+        ('nodes', ['K0004']),
+        ('relationships', ['K0004'])]
+
+
+def test_group_relationships():
+    """Ensure mixed relationships are grouped by type and endpoint labels,
+    with full groups returned before the stream ends
+    """
+
+    ksat = KSATRecord.ref('K0001')
+    workrole = NICEWorkroleRecord.ref('SP-RSK-001')
+    competency = NICECompetencyRecord.ref('C001')
+
+    groups = list(group_relationships([
+        (ksat, 'NICE_WORKROLE', workrole),
+        (ksat, 'NICE_COMPETENCY', competency, {'weight': 1}),
+        Relationship(ksat, 'NICE_WORKROLE', workrole),
+        (ksat, 'NICE_COMPETENCY', competency)], batch_size=2))
+
+    assert [(group, len(batch)) for group, batch in groups] == [
+        (('NICE_WORKROLE', ('KSAT', 'id'), ('NICEWorkrole', 'id')), 2),
+        (('NICE_COMPETENCY', ('KSAT', 'id'), ('NICECompetency', 'id')), 2)]
+    assert groups[1][1][0].properties == {'weight': 1}
+    assert groups[1][1][1].properties is None
@@ -0,0 +1,92 @@
+from cwf2neo.queries import KSATS_FOR_WORKROLES, FrameworkQueries, QueryCache
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Result(object):
+    def __init__(self, records):
+        self.records = records
+
+    def data(self):
+        return self.records
+
+
+class Graph(object):
+    """Answers the KSAT lookup from a dict, recording every query"""
+
+    def __init__(self, ksats):
+        self.ksats = ksats
+        self.runs = []
+
+    def run(self, statement, **parameters):
+        self.runs.append((statement, parameters))
+        assert statement == KSATS_FOR_WORKROLES
+        return Result([
+            {'workrole_id': workrole_id, 'ksats': self.ksats[workrole_id]}
+            for workrole_id in parameters['ids']
+            if workrole_id in self.ksats])
+
+
+class Database(object):
+    def __init__(self, ksats):
+        self.graph = Graph(ksats)
+        self.generation = 0
+
+
+def test_query_cache():
+    """Test least recently used eviction and expiry of cached results"""
+
+    clock = Clock()
+    cache = QueryCache(size=2, ttl=10, clock=clock)
+
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == (True, 1)
+
+    # 'b' is the least recently used result
+    cache.put('c', 3)
+    assert cache.get('b') == (False, None)
+    assert len(cache) == 2
+
+    clock.now = 10
+    assert cache.get('a') == (False, None)
+    assert cache.get('c') == (False, None)
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_ksats_for_workroles():
+    """Test that many work roles are answered in one round trip and cached
+    until an import completes
+    """
+
+    ksats = {
+        'SP-RSK-001': [{'id': 'K0001', 'description': 'Networks',
+                        'type': 'Knowledge'}],
+        'SP-RSK-002': [{'id': 'T0001', 'description': 'Assess risk',
+                        'type': 'Task'}]}
+    db = Database(ksats)
+    queries = FrameworkQueries(db)
+
+    result = queries.ksats_for_workroles(
+        ['SP-RSK-001', 'SP-RSK-002', 'SP-XXX-999'])
+    assert list(result) == ['SP-RSK-001', 'SP-RSK-002', 'SP-XXX-999']
+    assert result['SP-RSK-002'] == ksats['SP-RSK-002']
+    assert result['SP-XXX-999'] == []
+    assert len(db.graph.runs) == 1
+
+    # Only the work role that isn't cached yet is fetched
+    assert queries.ksats_for_workrole('SP-RSK-001') == ksats['SP-RSK-001']
+    queries.ksats_for_workroles(['SP-RSK-001', 'SP-RSK-003'])
+    assert len(db.graph.runs) == 2
+    assert db.graph.runs[-1][1] == {'ids': ['SP-RSK-003']}
+
+    db.generation += 1
+    queries.ksats_for_workrole('SP-RSK-001')
+    assert len(db.graph.runs) == 3
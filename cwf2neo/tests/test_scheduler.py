@@ -0,0 +1,112 @@
+import pytest
+
+from cwf2neo.scheduler import StageScheduler
+
+
+def parse(count):
+    return list(range(count))
+
+
+def sum_shards(shards):
+    return [value for shard in shards for value in shard]
+
+
+def test_scheduler_order():
+    """Test that writes run after the writes they depend on"""
+
+    written = []
+    scheduler = StageScheduler()
+    scheduler.add('nodes', written.append, parse=parse, args=(2,))
+    scheduler.add('relationships', written.append, parse=parse, args=(3,),
+                  depends=('nodes',))
+    scheduler.add('index', lambda parsed: written.append('index'),
+                  depends=('relationships',))
+    scheduler.run()
+
+    assert written == [[0, 1], [0, 1, 2], 'index']
+
+    path, total = scheduler.critical_path()
+    assert [name for name, _, _ in path] == ['nodes', 'relationships', 'index']
+    assert total >= 0
+
+    with pytest.raises(ValueError):
+        scheduler.add('competencies', written.append, depends=('ksats',))
+
+
+def test_scheduler_processes():
+    """Test parsing the stages in worker processes"""
+
+    written = {}
+    scheduler = StageScheduler(processes=2)
+    scheduler.add('a', lambda parsed: written.setdefault('a', parsed),
+                  parse=parse, args=(2,))
+    scheduler.add('b', lambda parsed: written.setdefault('b', parsed),
+                  parse=parse, args=(3,))
+    scheduler.add('c', lambda parsed: written.setdefault('c', parsed),
+                  parse=parse, args=(1,), depends=('a', 'b'))
+    scheduler.run()
+
+    assert written == {'a': [0, 1], 'b': [0, 1, 2], 'c': [0]}
+    assert list(written)[-1] == 'c'
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_scheduler_shards(processes):
+    """Test merging the shards of a stage in the order of the shards"""
+
+    written = []
+    scheduler = StageScheduler(processes=processes)
+    scheduler.add('ksats', written.append, parse=parse,
+                  shards=[(3,), (1,), (2,)], merge=sum_shards)
+    scheduler.run()
+
+    assert written == [[0, 1, 2, 0, 0, 1]]
+
+    with pytest.raises(ValueError):
+        scheduler.add('competencies', written.append, parse=parse,
+                      shards=[(1,)])
+
+
+def test_critical_path():
+    """Test finding the steps the stages waited on"""
+
+    scheduler = StageScheduler()
+    scheduler.add('nist', None, parse=parse)
+    scheduler.add('workroles', None, parse=parse)
+    scheduler.add('ksats', None, parse=parse, depends=('workroles',))
+    scheduler.start = 0.0
+
+    # (parse start, parse end, write start, write end)
+    timings = {
+        'nist': (0.0, 1.0, 1.0, 2.0),
+        'workroles': (0.0, 3.0, 3.0, 4.0),
+        'ksats': (0.0, 2.0, 4.0, 6.0)
+    }
+    for name, times in timings.items():
+        stage = scheduler.stages[name]
+        (stage.parse_start, stage.parse_end,
+         stage.write_start, stage.write_end) = times
+
+    path, total = scheduler.critical_path()
+    assert path == [('workroles', 'parse', 3.0), ('workroles', 'write', 1.0),
+                    ('ksats', 'write', 2.0)]
+    assert total == 6.0
+
+
+def test_merge_ksat_shards():
+    """Test merging the parsed work role KSAT sheets"""
+
+    from cwf2neo.cwf2neo import ParsedStage, merge_ksat_shards
+
+    knowledge = ('K0001', 'Knowledge', 'Knowledge of networks')
+    task = ('T0001', 'Task', 'Assess risk')
+    merged = merge_ksat_shards([
+        ParsedStage([('SP-RSK-001', [knowledge, task, knowledge])], 3),
+        ParsedStage([('SP-RSK-002', [knowledge])], 1)])
+
+    assert merged.rows == 4
+    assert [
+        record.id if hasattr(record, 'id') else
+        (record.start.id, record.end.id) for record in merged.records] == [
+        'K0001', ('K0001', 'SP-RSK-001'), 'T0001', ('T0001', 'SP-RSK-001'),
+        ('K0001', 'SP-RSK-002')]
@@ -0,0 +1,149 @@
+import json
+
+import pytest
+from cwf2neo.graph_objects import (KSAT, KSATRecord, NICEWorkroleRecord,
+                                   Relationship)
+from cwf2neo.sinks import (CypherScriptSink, FanoutSink, JSONLinesSink,
+                           MemorySink, Sink)
+from py2neo.ogm import GraphObject
+
+
+def records():
+    nodes = [
+        KSATRecord(id='K0001', description='Knowledge of networks',
+                   labels=('Knowledge',)),
+        KSATRecord(id='K0002', description="Knowledge of 'risk'",
+                   labels=('Knowledge',))]
+    relationships = [
+        Relationship(NICEWorkroleRecord.ref('SP-RSK-001'), 'NICE_WORKROLE',
+                     KSATRecord.ref('K0001')),
+        Relationship(NICEWorkroleRecord.ref('SP-RSK-001'), 'NICE_WORKROLE',
+                     KSATRecord.ref('K0002'))]
+    return nodes, relationships
+
+
+def test_memory_sink():
+    """Test building the graph in memory"""
+
+    nodes, relationships = records()
+    sink = MemorySink()
+    sink.add_nodes(nodes)
+    sink.add_nodes([NICEWorkroleRecord(id='SP-RSK-001', title='Risk')])
+    sink.add_relationships(relationships)
+    sink.add_relationships([
+        Relationship(NICEWorkroleRecord.ref('SP-RSK-999'), 'NICE_WORKROLE',
+                     KSATRecord.ref('K0001'))])
+
+    assert sink.nodes[('KSAT', 'K0001')]['labels'] == {'KSAT', 'Knowledge'}
+    assert sorted(sink.relationships()) == [
+        (('NICEWorkrole', 'SP-RSK-001'), 'NICE_WORKROLE', ('KSAT', 'K0001')),
+        (('NICEWorkrole', 'SP-RSK-001'), 'NICE_WORKROLE', ('KSAT', 'K0002'))]
+    assert list(sink.incoming[('KSAT', 'K0001')]['NICE_WORKROLE']) == [
+        ('NICEWorkrole', 'SP-RSK-001')]
+
+    assert sink.bulk_set(
+        ('KSAT', 'id'), [('K0001', {'title': 'Networks'}), ('K9', {})]) == (
+        ['K0001'], ['K9'])
+    assert sink.nodes[('KSAT', 'K0001')]['properties']['title'] == 'Networks'
+
+
+def test_cypher_script_sink(tmp_path):
+    """Test writing the graph as a Cypher script of UNWIND batches"""
+
+    path = str(tmp_path / 'cwf.cypher')
+    nodes, relationships = records()
+    sink = CypherScriptSink(path, batch_size=1)
+    sink.create_schema([KSAT])
+    sink.add_nodes(nodes)
+    sink.add_relationships(relationships)
+    sink.close()
+
+    with open(path) as f:
+        script = f.read()
+
+    statements = [s for s in script.split(';\n') if s]
+    assert len(statements) == 5
+    assert statements[0].startswith('CREATE CONSTRAINT ksat_id_unique')
+    assert statements[1] == (
+        "UNWIND [{id: 'K0001', description: 'Knowledge of networks'}] AS r\n"
+        "MERGE (n:KSAT {id: r.id}) SET n += r SET n:Knowledge")
+    assert '"Knowledge of \'risk\'"' in statements[2]
+    assert statements[3].endswith(
+        "MATCH (a:NICEWorkrole {id: r[0]}) MATCH (b:KSAT {id: r[2]}) "
+        "MERGE (a)-[x:NICE_WORKROLE]->(b) SET x += r[1]")
+
+
+def test_cypher_script_sink_keyless(tmp_path):
+    """Ensure a node class without a primary key isn't silently left
+    without an index
+    """
+
+    class Keyless(GraphObject):
+        pass
+
+    sink = CypherScriptSink(str(tmp_path / 'cwf.cypher'))
+    with pytest.raises(ValueError):
+        sink.create_schema([KSAT, Keyless])
+    sink.close()
+
+
+def test_jsonl_sink(tmp_path):
+    """Test writing the graph as JSON lines"""
+
+    path = str(tmp_path / 'cwf.jsonl')
+    nodes, relationships = records()
+    sink = JSONLinesSink(path)
+    sink.add_nodes(nodes)
+    sink.add_relationships(relationships[:1])
+    sink.close()
+
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+
+    assert [line['type'] for line in lines] == [
+        'node', 'node', 'relationship']
+    assert lines[0]['labels'] == ['KSAT', 'Knowledge']
+    assert lines[2]['start'] == ['NICEWorkrole', 'SP-RSK-001']
+
+
+class FailingSink(Sink):
+    def add_nodes(self, nodes):
+        raise ConnectionError("database unavailable")
+
+
+def test_fanout_sink():
+    """Test writing to several targets with one failing target"""
+
+    nodes, relationships = records()
+    first, second = MemorySink(), MemorySink()
+    sink = FanoutSink([
+        ('first', first), ('broken', FailingSink()), ('second', second)])
+
+    # Generators are shared between the targets
+    sink.add_nodes(node for node in nodes)
+    sink.add_nodes([NICEWorkroleRecord(id='SP-RSK-001', title='Risk')])
+    sink.add_relationships(iter(relationships))
+    matched, unmatched = sink.bulk_set(
+        ('KSAT', 'id'), [('K0001', {'core': True}), ('K9999', {})])
+    sink.close()
+
+    assert sink.healthy == ['first', 'second']
+    assert list(sink.failed) == ['broken']
+    assert sink.progress == {'first': 7, 'broken': 0, 'second': 7}
+    assert matched == ['K0001'] and unmatched == ['K9999']
+    for target in (first, second):
+        assert len(target.nodes) == 3
+        assert len(list(target.relationships())) == 2
+
+
+def test_fanout_sink_every_target_failed():
+    """Test that the import stops once every target failed"""
+
+    sink = FanoutSink([('broken', FailingSink())])
+
+    try:
+        sink.add_nodes([])
+    except RuntimeError as err:
+        assert 'broken' in str(err)
+    else:
+        assert False, "RuntimeError not raised"
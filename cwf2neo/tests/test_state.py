@@ -0,0 +1,36 @@
+from cwf2neo.state import ImportState, file_fingerprint, node_fingerprint
+
+
+def test_state_round_trip(tmp_path):
+    """Ensure the import state is persisted and loaded per target
+    """
+    state = ImportState.for_target(str(tmp_path), 'neo4j:7687')
+    assert not state.exists
+
+    state.sources = {'cf.xlsx': 'abc'}
+    state.nodes = {('KSAT', 'K0001'): {'123'}}
+    state.relationships = {
+        (('KSAT', 'K0001'), 'NICE_WORKROLE', ('NICEWorkrole', 'SP-RSK-001'))}
+    state.save()
+
+    loaded = ImportState.for_target(str(tmp_path), 'neo4j:7687')
+
+    assert loaded.exists
+    assert loaded.sources == state.sources
+    assert loaded.nodes == state.nodes
+    assert loaded.relationships == state.relationships
+    assert not ImportState.for_target(str(tmp_path), 'other:7687').exists
+
+
+def test_fingerprints(tmp_path):
+    """Ensure fingerprints only change when the content changes
+    """
+    path = tmp_path / 'source.xlsx'
+    path.write_bytes(b'contents')
+
+    assert file_fingerprint(str(path)) == file_fingerprint(str(path))
+
+    assert node_fingerprint({'id': 'K0001', 'type': 'Knowledge'}, ['b', 'a']) \
+        == node_fingerprint({'type': 'Knowledge', 'id': 'K0001'}, ['a', 'b'])
+    assert node_fingerprint({'id': 'K0001'}, []) != \
+        node_fingerprint({'id': 'K0002'}, [])
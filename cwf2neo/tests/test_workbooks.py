@@ -0,0 +1,122 @@
+import zipfile
+
+import pytest
+from cwf2neo.workbooks import WorkbookRegistry
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+CT_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+CT = 'application/vnd.openxmlformats-officedocument.spreadsheetml.'
+
+SHARED_STRINGS = [
+    '<si><t>Framework Core</t></si>',
+    '<si><t>KSA ID</t></si>',
+    '<si><t>Description</t></si>',
+    '<si><r><t xml:space="preserve">Knowledge of </t></r>'
+    '<r><rPr><b/></rPr><t>networks</t></r></si>',
+    '<si><t>Count</t></si>',
+]
+
+SHEET = (
+    '<row r="1"><c r="A1" t="s"><v>0</v></c></row>'
+    '<row r="2"><c r="A2" t="s"><v>1</v></c><c r="B2" t="s"><v>2</v></c>'
+    '<c r="C2" t="s"><v>4</v></c></row>'
+    '<row r="3"><c r="A3" t="inlineStr"><is><t>K0001</t></is></c>'
+    '<c r="B3" t="s"><v>3</v></c><c r="C3"><v>42</v></c></row>'
+    '<row r="5"><c r="A5" t="str"><f>A3</f><v>K0001</v></c>'
+    '<c r="B5" t="b"><v>1</v></c><c r="C5" t="e"><v>#REF!</v></c></row>'
+    '<row r="6"><c r="A6" s="1"/><c r="B6" t="inlineStr"><is><t>S0001</t>'
+    '</is></c></row>'
+    '<row r="7"><c r="A7" s="1"/></row>'
+)
+
+
+def write_workbook(path):
+    with zipfile.ZipFile(path, 'w') as z:
+        z.writestr(
+            '[Content_Types].xml',
+            '<Types xmlns="{0}"><Default Extension="rels" ContentType='
+            '"application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType='
+            '"{1}sheet.main+xml"/><Override PartName="/xl/worksheets/'
+            'sheet1.xml" ContentType="{1}worksheet+xml"/><Override PartName='
+            '"/xl/sharedStrings.xml" ContentType="{1}sharedStrings+xml"/>'
+            '</Types>'.format(CT_NS, CT))
+        z.writestr(
+            '_rels/.rels',
+            '<Relationships xmlns="{0}"><Relationship Id="rId1" Type="{1}/'
+            'officeDocument" Target="xl/workbook.xml"/></Relationships>'
+            .format(PKG_NS, REL_NS))
+        z.writestr(
+            'xl/workbook.xml',
+            '<workbook xmlns="{0}" xmlns:r="{1}"><sheets><sheet name="Sheet1"'
+            ' sheetId="1" r:id="rId1"/></sheets></workbook>'.format(
+                MAIN_NS, REL_NS))
+        z.writestr(
+            'xl/_rels/workbook.xml.rels',
+            '<Relationships xmlns="{0}"><Relationship Id="rId1" Type="{1}/'
+            'worksheet" Target="worksheets/sheet1.xml"/><Relationship '
+            'Id="rId2" Type="{1}/sharedStrings" Target="sharedStrings.xml"/>'
+            '</Relationships>'.format(PKG_NS, REL_NS))
+        z.writestr(
+            'xl/sharedStrings.xml',
+            '<sst xmlns="{}">{}</sst>'.format(
+                MAIN_NS, ''.join(SHARED_STRINGS)))
+        z.writestr(
+            'xl/worksheets/sheet1.xml',
+            '<worksheet xmlns="{}"><sheetData>{}</sheetData></worksheet>'
+            .format(MAIN_NS, SHEET))
+
+
+def test_stream_reader_matches_xlrd(tmp_path):
+    """Ensure streamed xlsx rows are identical to the rows xlrd reads"""
+
+    write_workbook(str(tmp_path / 'test.xlsx'))
+
+    stream = WorkbookRegistry(str(tmp_path), reader='stream')
+    xlrd = WorkbookRegistry(str(tmp_path), reader='xlrd')
+
+    values = list(stream.values('test.xlsx', 'Sheet1'))
+
+    # Rows before the widest row are only padded to the width so far
+    assert values == [
+        ['Framework Core'],
+        ['KSA ID', 'Description', 'Count'],
+        ['K0001', 'Knowledge of networks', 42.0],
+        ['', '', ''],
+        ['K0001', 1, 0x17],
+        ['', 'S0001', '']]
+    assert [['Framework Core', '', '']] + values[1:] == \
+        list(xlrd.values('test.xlsx', 'Sheet1'))
+
+    # Recorded while the rows were read
+    assert stream.workbook('test.xlsx').dimensions('Sheet1') == \
+        xlrd.workbook('test.xlsx').dimensions('Sheet1') == (6, 3, 1)
+
+    assert stream.row_count('test.xlsx', 'Sheet1') == \
+        xlrd.row_count('test.xlsx', 'Sheet1') == 4
+    assert list(stream.rows('test.xlsx', 'Sheet1')) == \
+        list(xlrd.rows('test.xlsx', 'Sheet1'))
+    assert next(stream.rows('test.xlsx', 'Sheet1')) == {
+        'KSA ID': 'K0001', 'Description': 'Knowledge of networks',
+        'Count': 42.0}
+
+    stream.close()
+    xlrd.close()
+
+
+def test_stream_reader_fallback(tmp_path):
+    """Ensure workbooks that aren't xlsx fall back to xlrd, or fail when
+    streaming is required
+    """
+
+    (tmp_path / 'test.xls').write_bytes(b'not a zip file')
+
+    with pytest.raises(Exception) as err:
+        WorkbookRegistry(str(tmp_path)).workbook('test.xls')
+    assert 'xlrd' in type(err.value).__module__
+
+    with pytest.raises(zipfile.BadZipFile):
+        WorkbookRegistry(str(tmp_path), reader='stream').workbook('test.xls')
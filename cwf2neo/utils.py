@@ -1,8 +1,9 @@
 import os
-import re
 import urllib
 import urllib.request
 
+from cwf2neo.parsing import find_ksats, ksat_type
+
 
 def file_download(source_url, local_dir, local_filename):
     urllib.request.urlretrieve(
@@ -14,8 +15,7 @@ def list2dict(list_in):
 
 
 def parse_ksats(data_input):
-    ksats = re.findall(
-        r"((?:K|S|A|T)[0-9]{4})", data_input, re.IGNORECASE | re.MULTILINE)
+    ksats = find_ksats(data_input)
     if not ksats:
         raise Exception("No KSATs found: %s" % data_input)
     return list(ksats)
@@ -23,17 +23,10 @@ def parse_ksats(data_input):
 
 def ksat_id_to_type(ksat_id):
 
-    ksat_types_map = {
-        'K': 'Knowledge',
-        'S': 'Skill',
-        'A': 'Ability',
-        'T': 'Task'
-    }
-
-    ksat_prefix = ksat_id[0].upper()
+    type_name = ksat_type(ksat_id)
 
-    if ksat_prefix not in ksat_types_map.keys():
+    if type_name is None:
         raise Exception(
             "'{}' is not a valid KSAT ID".format(ksat_id))
 
-    return ksat_types_map[ksat_prefix]
+    return type_name
@@ -0,0 +1,199 @@
+import logging
+import os
+import zipfile
+
+import xlrd
+from cwf2neo.xlsx import XLSXWorkbook
+
+log = logging.getLogger(__name__)
+
+READERS = ('auto', 'stream', 'xlrd')
+
+
+class XLRDWorkbook(object):
+    """Workbook read with xlrd, loading each sheet fully into memory. Used
+    for workbooks the streaming reader can't read, such as .xls files.
+    """
+
+    def __init__(self, path):
+        """Constructor for initial setup
+
+        :param path: path of the workbook
+        :type path: str
+        """
+        self.path = path
+        self.book = xlrd.open_workbook(filename=path, on_demand=True)
+
+    def sheet_names(self):
+        """Get the names of all sheets, in workbook order"""
+        return self.book.sheet_names()
+
+    def __sheet(self, sheet_name):
+        if not self.book.on_demand and not self.book.sheet_loaded(sheet_name):
+            # Workbooks that don't support on demand loading (xlsx) can only
+            # load a released sheet again by opening the workbook again
+            self.book.release_resources()
+            self.book = xlrd.open_workbook(filename=self.path, on_demand=True)
+        return self.book.sheet_by_name(sheet_name)
+
+    def dimensions(self, sheet_name):
+        """Get the number of rows and columns of a sheet, and the index of
+        its header row
+        """
+        sheet = self.__sheet(sheet_name)
+        # The header row of the framework tables is the first row without
+        # empty cells
+        header_rowx = next((
+            rowx for rowx in range(sheet.nrows)
+            if '' not in sheet.row_values(rowx)), 0)
+        return (sheet.nrows, sheet.ncols, header_rowx)
+
+    def values(self, sheet_name):
+        """Iterate over every row of a sheet as a list of cell values"""
+        sheet = self.__sheet(sheet_name)
+        for rowx in range(sheet.nrows):
+            yield sheet.row_values(rowx)
+
+    def release(self, sheet_name):
+        """Unload a sheet"""
+        self.book.unload_sheet(sheet_name)
+
+    def close(self):
+        """Release the workbook"""
+        self.book.release_resources()
+
+
+class WorkbookRegistry(object):
+    """Registry of the data source workbooks, opening each workbook only once
+    and sharing its sheets between every import stage that reads them.
+    """
+
+    def __init__(self, directory, reader='auto'):
+        """Constructor for initial setup
+
+        :param directory: directory the workbooks are stored in
+        :type directory: str
+        :param reader: 'stream' to stream xlsx rows from the workbook XML,
+         'xlrd' to load sheets with xlrd, or 'auto' to stream xlsx workbooks
+         and fall back to xlrd for anything else, defaults to 'auto'
+        :type reader: str, optional
+        """
+        if reader not in READERS:
+            raise ValueError("Unknown workbook reader {}, expected one of "
+                             "{}".format(reader, ', '.join(READERS)))
+        self.directory = directory
+        self.reader = reader
+        self.__workbooks = {}
+
+    def workbook(self, filename):
+        """Get a workbook, opening it on first use
+
+        :param filename: workbook filename within the registry directory
+        :type filename: str
+        :return: the opened workbook
+        :rtype: class 'cwf2neo.xlsx.XLSXWorkbook' or
+         class 'cwf2neo.workbooks.XLRDWorkbook'
+        """
+
+        if filename not in self.__workbooks:
+            log.info("Opening workbook {}".format(filename))
+            self.__workbooks[filename] = self.__open(
+                os.path.join(self.directory, filename))
+        return self.__workbooks[filename]
+
+    def __open(self, path):
+        if self.reader == 'xlrd':
+            return XLRDWorkbook(path)
+        try:
+            return XLSXWorkbook(path)
+        except (zipfile.BadZipFile, KeyError) as err:
+            if self.reader == 'stream':
+                raise
+            log.info("Unable to stream {} ({}), reading it with "
+                     "xlrd".format(path, err))
+            return XLRDWorkbook(path)
+
+    def sheet_names(self, filename):
+        """Get the names of all sheets in a workbook without loading them
+
+        :param filename: workbook filename within the registry directory
+        :type filename: str
+        :return: list of sheet names
+        :rtype: list
+        """
+
+        return self.workbook(filename).sheet_names()
+
+    def row_count(self, filename, sheet_name):
+        """Get the number of data rows below the header row of a sheet
+
+        :param filename: workbook filename within the registry directory
+        :type filename: str
+        :param sheet_name: name of the sheet
+        :type sheet_name: str
+        :return: number of data rows
+        :rtype: int
+        """
+
+        nrows, _, header_rowx = \
+            self.workbook(filename).dimensions(sheet_name)
+        return max(nrows - header_rowx - 1, 0)
+
+    def values(self, filename, sheet_name):
+        """Iterate over every row of a sheet as a list of cell values
+
+        :param filename: workbook filename within the registry directory
+        :type filename: str
+        :param sheet_name: name of the sheet
+        :type sheet_name: str
+        :return: generator of lists of cell values
+        :rtype: generator
+        """
+
+        yield from self.workbook(filename).values(sheet_name)
+
+    def rows(self, filename, sheet_name):
+        """Iterate over the rows of a sheet as dicts keyed by the header row,
+        the first row without empty cells, the same mapping `utils.list2dict`
+        produces
+
+        :param filename: workbook filename within the registry directory
+        :type filename: str
+        :param sheet_name: name of the sheet
+        :type sheet_name: str
+        :return: generator of dicts
+        :rtype: generator
+        """
+
+        _, _, header_rowx = self.workbook(filename).dimensions(sheet_name)
+        header = None
+        for rowx, row in enumerate(self.values(filename, sheet_name)):
+            if rowx == header_rowx:
+                header = row
+            elif rowx > header_rowx:
+                yield dict(zip(header, row))
+
+    def release(self, filename, sheet_name=None):
+        """Release a sheet once no import stage needs it anymore, or the whole
+        workbook if no sheet is given
+
+        :param filename: workbook filename within the registry directory
+        :type filename: str
+        :param sheet_name: name of the sheet, defaults to None
+        :type sheet_name: str, optional
+        """
+
+        if filename not in self.__workbooks:
+            return
+
+        if sheet_name is None:
+            self.__workbooks.pop(filename).close()
+        else:
+            self.__workbooks[filename].release(sheet_name)
+
+    def close(self):
+        """Release every open workbook
+        """
+
+        for filename in list(self.__workbooks):
+            self.release(filename)
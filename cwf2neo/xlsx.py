@@ -0,0 +1,301 @@
+import logging
+import posixpath
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+log = logging.getLogger(__name__)
+
+NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = (
+    '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}')
+PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+ROW_TAG = NS + 'row'
+CELL_TAG = NS + 'c'
+VALUE_TAG = NS + 'v'
+INLINE_STRING_TAG = NS + 'is'
+TEXT_TAG = NS + 't'
+RICH_TEXT_TAG = NS + 'r'
+STRING_ITEM_TAG = NS + 'si'
+SHEET_DATA_TAG = NS + 'sheetData'
+XML_SPACE_ATTR = '{http://www.w3.org/XML/1998/namespace}space'
+XML_WHITESPACE = '\t\n \r'
+
+# Characters that can't be stored in XML are escaped as _xHHHH_
+ESCAPED_CHARACTER_PATTERN = re.compile(r"_x[0-9A-Fa-f]{4}_")
+
+# Cell error values, as the error codes xlrd returns for them
+ERROR_CODES = {
+    '#NULL!': 0x00, '#DIV/0!': 0x07, '#VALUE!': 0x0F, '#REF!': 0x17,
+    '#NAME?': 0x1D, '#NUM!': 0x24, '#N/A': 0x2A
+}
+
+
+def column_index(cell_name):
+    """Get the zero based column index of a cell name, e.g. 'AB12' -> 27
+
+    :param cell_name: cell name
+    :type cell_name: str
+    :return: column index
+    :rtype: int
+    """
+
+    index = 0
+    for c in cell_name:
+        if c == '$':
+            continue
+        if not c.isalpha():
+            break
+        index = index * 26 + ord(c.upper()) - 64
+    return index - 1
+
+
+def cooked_text(elem):
+    """Get the text of a text or value element, stripping whitespace unless
+    it is preserved and unescaping characters the same way xlrd does
+
+    :param elem: 't' or 'v' element
+    :return: text
+    :rtype: str
+    """
+
+    text = elem.text
+    if text is None:
+        return ''
+    if elem.get(XML_SPACE_ATTR) != 'preserve':
+        text = text.strip(XML_WHITESPACE)
+    if '_' in text:
+        text = ESCAPED_CHARACTER_PATTERN.sub(
+            lambda m: chr(int(m[0][2:6], 16)), text)
+    return text
+
+
+def element_text(elem):
+    """Get the text of a shared or inline string, ignoring phonetic runs
+
+    :param elem: 'si' or 'is' element
+    :return: text
+    :rtype: str
+    """
+
+    text = []
+    for child in elem:
+        if child.tag == TEXT_TAG:
+            text.append(cooked_text(child))
+        elif child.tag == RICH_TEXT_TAG:
+            for run in child:
+                if run.tag == TEXT_TAG:
+                    text.append(cooked_text(run))
+    return ''.join(text)
+
+
+class XLSXWorkbook(object):
+    """Read only xlsx workbook streaming the rows of a sheet straight from
+    its XML, so memory use doesn't grow with the size of the sheet.
+
+    Rows are returned the way xlrd returns them, except that they are only
+    padded to the width of the widest row so far: numbers and dates as
+    floats, booleans as ints, errors as xlrd error codes and empty cells
+    as ''.
+    """
+
+    def __init__(self, path):
+        """Constructor for initial setup
+
+        :param path: path of the xlsx workbook
+        :type path: str
+        """
+        self.path = path
+        self.zip = zipfile.ZipFile(path)
+        self.__sheets = self.__read_sheets()
+        self.__shared_strings = None
+        # sheet name -> (number of rows, number of columns, header row)
+        self.__dimensions = {}
+
+    def __rels(self, part):
+        directory, name = posixpath.split(part)
+        rels_part = posixpath.join(directory, '_rels', name + '.rels')
+        rels = {}
+        if rels_part not in self.zip.namelist():
+            return rels
+        with self.zip.open(rels_part) as f:
+            for _, elem in iterparse(f):
+                if elem.tag == PKG_REL_NS + 'Relationship':
+                    target = elem.get('Target')
+                    if target.startswith('/'):
+                        target = target[1:]
+                    else:
+                        target = posixpath.normpath(
+                            posixpath.join(directory, target))
+                    rels[elem.get('Id')] = (elem.get('Type'), target)
+        return rels
+
+    def __read_sheets(self):
+        rels = self.__rels('xl/workbook.xml')
+        self.__shared_strings_part = next((
+            target for rel_type, target in rels.values()
+            if rel_type.endswith('/sharedStrings')), None)
+
+        sheets = {}
+        with self.zip.open('xl/workbook.xml') as f:
+            for _, elem in iterparse(f):
+                if elem.tag == NS + 'sheet':
+                    sheets[elem.get('name')] = rels[elem.get(REL_NS + 'id')][1]
+        return sheets
+
+    def __strings(self):
+        if self.__shared_strings is None:
+            self.__shared_strings = []
+            if self.__shared_strings_part in self.zip.namelist():
+                with self.zip.open(self.__shared_strings_part) as f:
+                    for _, elem in iterparse(f):
+                        if elem.tag == STRING_ITEM_TAG:
+                            self.__shared_strings.append(element_text(elem))
+                            elem.clear()
+        return self.__shared_strings
+
+    def sheet_names(self):
+        """Get the names of all sheets, in workbook order
+
+        :return: list of sheet names
+        :rtype: list
+        """
+
+        return list(self.__sheets)
+
+    def __cell_value(self, cell):
+        cell_type = cell.get('t', 'n')
+        value = None
+
+        for child in cell:
+            if child.tag == VALUE_TAG:
+                value = cooked_text(child) if cell_type == 'str' \
+                    else child.text
+            elif child.tag == INLINE_STRING_TAG:
+                value = element_text(child)
+
+        if cell_type == 'n':
+            return float(value) if value else None
+        if cell_type == 's':
+            return self.__strings()[int(value)] if value else None
+        if cell_type == 'str':
+            return value or ''
+        if cell_type == 'b':
+            return int(value == '1' or value == 'true')
+        if cell_type == 'e':
+            return ERROR_CODES.get(value or '#N/A', ERROR_CODES['#N/A'])
+        if cell_type == 'inlineStr':
+            return value or None
+        raise ValueError("Unknown cell type {}".format(cell_type))
+
+    def __iter_cells(self, sheet_name):
+        """Iterate over the rows of a sheet as (row index, {column: value})
+        tuples of the cells with a value
+        """
+
+        if sheet_name not in self.__sheets:
+            raise KeyError("No sheet named {}".format(sheet_name))
+
+        with self.zip.open(self.__sheets[sheet_name]) as f:
+            sheet_data = None
+            rowx = -1
+            for event, elem in iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == SHEET_DATA_TAG:
+                        sheet_data = elem
+                    continue
+                if elem.tag != ROW_TAG:
+                    continue
+
+                rowx = int(elem.get('r')) - 1 if elem.get('r') else rowx + 1
+                cells = {}
+                colx = -1
+                for cell in elem:
+                    if cell.tag != CELL_TAG:
+                        continue
+                    colx = column_index(cell.get('r')) \
+                        if cell.get('r') else colx + 1
+                    value = self.__cell_value(cell)
+                    if value is not None:
+                        cells[colx] = value
+
+                # Keep only the rows not processed yet in memory
+                if sheet_data is not None:
+                    sheet_data.clear()
+                else:
+                    elem.clear()
+
+                yield rowx, cells
+
+    def dimensions(self, sheet_name):
+        """Get the number of rows and columns of a sheet, and the index of its
+        header row: the first row without empty cells.
+
+        Recorded while the rows of the sheet are read, or by streaming
+        through the sheet once without keeping any rows.
+
+        :param sheet_name: name of the sheet
+        :type sheet_name: str
+        :return: tuple of (number of rows, number of columns, header row)
+        :rtype: tuple
+        """
+
+        if sheet_name not in self.__dimensions:
+            for _ in self.values(sheet_name):
+                pass
+        return self.__dimensions[sheet_name]
+
+    def values(self, sheet_name):
+        """Iterate over every row of a sheet as a list of cell values, padded
+        to the width of the widest row so far. The dimensions of the sheet
+        are recorded in the same pass.
+
+        :param sheet_name: name of the sheet
+        :type sheet_name: str
+        :return: generator of lists of cell values
+        :rtype: generator
+        """
+
+        nrows = 0
+        ncols = 0
+        header_rowx = None
+
+        for rowx, cells in self.__iter_cells(sheet_name):
+            if not cells:
+                continue
+
+            # Rows without any values are missing from the XML
+            while nrows < rowx:
+                yield [''] * ncols
+                nrows += 1
+
+            if max(cells) >= ncols:
+                # Rows narrower than the sheet have empty cells
+                ncols = max(cells) + 1
+                header_rowx = None
+            row = [''] * ncols
+            for colx, value in cells.items():
+                row[colx] = value
+            if header_rowx is None and '' not in row:
+                header_rowx = rowx
+
+            yield row
+            nrows = rowx + 1
+
+        self.__dimensions[sheet_name] = (nrows, ncols, header_rowx or 0)
+
+    def release(self, sheet_name):
+        """Forget what is known about a sheet, rows are never kept
+
+        :param sheet_name: name of the sheet
+        :type sheet_name: str
+        """
+
+        self.__dimensions.pop(sheet_name, None)
+
+    def close(self):
+        """Close the workbook file"""
+
+        self.__shared_strings = None
+        self.zip.close()
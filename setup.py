@@ -19,6 +19,9 @@ setup(
     ' the NICE Cybersecurity Workforce Framework into a Neo4j graphing'
     ' database, which can be used to run complex queries against.',
     author_email='ckoroscil@circadence.com',
+    entry_points={
+        'console_scripts': ['cwf2neo=cwf2neo.__main__:main']
+    },
     install_requires=[
         'confuse',
         'progress',